@@ -0,0 +1,81 @@
+from __future__ import annotations
+import argparse, json, shutil, sqlite3, time
+from pathlib import Path
+import numpy as np
+from shared.utils import ensure_dir, utcnow_iso
+from vector_store import LAYOUTS, VectorIndex, store_vectors, write_sidecar, dir_bytes
+import hashing
+
+def sample_queries(texts: list[str], n: int, words_per_query: int = 6, seed: int = 7) -> list[str]:
+    # Queries: short word windows sampled from the corpus itself
+    rng = np.random.default_rng(seed)
+    queries = []
+    for i in rng.integers(0, len(texts), size=n):
+        words = texts[i].split()
+        start = int(rng.integers(0, max(1, len(words) - words_per_query)))
+        queries.append(" ".join(words[start:start + words_per_query]))
+    return queries
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--queries", type=int, default=50)
+    ap.add_argument("--topk", type=int, default=5)
+    args = ap.parse_args()
+
+    cfg = json.loads(Path("config/config.json").read_text())
+    index_path = Path(cfg["index_path"])
+    out_dir = ensure_dir(Path("outputs"))
+    bench_dir = ensure_dir(index_path.parent / "bench")
+
+    con = sqlite3.connect(str(index_path))
+    chunks = con.execute("SELECT chunk_id, text FROM chunks ORDER BY chunk_id").fetchall()
+    con.close()
+    texts = [t for _, t in chunks]
+
+    queries = sample_queries(texts, args.queries)
+    Q = hashing.transform_dense(queries)
+
+    results = []
+    for layout in LAYOUTS:
+        db = bench_dir / f"{layout}.sqlite"
+        matrix_dir = bench_dir / f"{layout}_matrix"
+        shutil.copy(index_path, db)
+        con = sqlite3.connect(str(db))
+        con.execute("DELETE FROM vectors")
+        con.commit()
+
+        t0 = time.perf_counter()
+        X = hashing.transform(texts)
+        store_vectors(con.cursor(), [cid for cid, _ in chunks], X, layout)
+        con.commit()
+        write_sidecar(con, matrix_dir, layout, reuse=False)
+        con.commit()
+        build_s = time.perf_counter() - t0
+
+        payload = con.execute("SELECT SUM(length(vec) + COALESCE(length(idx), 0)) FROM vectors").fetchone()[0]
+        con.execute("VACUUM")
+        con.close()
+
+        index = VectorIndex(matrix_dir)
+        lat = []
+        for qv in Q:
+            t1 = time.perf_counter()
+            index.search(qv, args.topk)
+            lat.append((time.perf_counter() - t1) * 1000)
+
+        results.append({
+            "layout": layout,
+            "build_seconds": round(build_s, 4),
+            "vector_payload_bytes": int(payload or 0),
+            "sqlite_bytes": dir_bytes(db),
+            "sidecar_bytes": dir_bytes(matrix_dir),
+            "query_ms_p50": round(float(np.percentile(lat, 50)), 4),
+            "query_ms_p99": round(float(np.percentile(lat, 99)), 4),
+        })
+
+    report = {"run_at": utcnow_iso(), "chunks": len(chunks), "queries": len(queries), "layouts": results}
+    (out_dir / "layout_benchmark.json").write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
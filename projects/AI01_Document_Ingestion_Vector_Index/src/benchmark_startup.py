@@ -0,0 +1,43 @@
+from __future__ import annotations
+import argparse, json, os, subprocess, sys, time
+from pathlib import Path
+import numpy as np
+from shared.utils import ensure_dir, utcnow_iso
+
+# Each measurement is a fresh interpreter, so module import costs are paid every time like a CLI call
+PROBES = {
+    "import_hashing": "import hashing",
+    "import_sklearn_hashing_vectorizer": "from sklearn.feature_extraction.text import HashingVectorizer",
+    "import_search": "import search, sys; assert 'sklearn' not in sys.modules, 'search path loaded sklearn'",
+}
+
+def wall_ms(argv: list[str], env: dict) -> float:
+    t0 = time.perf_counter()
+    subprocess.run(argv, check=True, env=env, stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - t0) * 1000
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--query", default="refund policy")
+    args = ap.parse_args()
+
+    out_dir = ensure_dir(Path("outputs"))
+    src = str(Path(__file__).resolve().parent)
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [src, os.environ.get("PYTHONPATH")]))}
+
+    results = {}
+    runs = {name: [sys.executable, "-c", code] for name, code in PROBES.items()}
+    runs["baseline_interpreter"] = [sys.executable, "-c", "pass"]
+    runs["search_cli_end_to_end"] = [sys.executable, str(Path(src) / "search.py"), "--query", args.query]
+    for name, argv in runs.items():
+        wall_ms(argv, env)  # warm the OS page cache
+        lat = [wall_ms(argv, env) for _ in range(args.repeats)]
+        results[name] = {"ms_p50": round(float(np.percentile(lat, 50)), 1), "ms_min": round(min(lat), 1)}
+
+    report = {"run_at": utcnow_iso(), "repeats": args.repeats, "results": results}
+    (out_dir / "startup_benchmark.json").write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,48 @@
 from __future__ import annotations
-import json, sqlite3, math
+import argparse, json, os, resource, sqlite3, math, time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
+from typing import Iterable, Iterator
 from datetime import datetime, timezone
-from sklearn.feature_extraction.text import HashingVectorizer
-import numpy as np
-from shared.utils import ensure_dir, utcnow_iso
+from shared.utils import ensure_dir, sha256_file, utcnow_iso
+from vector_store import store_vectors, write_sidecar, dir_bytes
+import hashing
+
+def iter_words(path: Path) -> Iterator[str]:
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            yield from line.split()
+
+def iter_chunks(words: Iterable[str], chunk_size: int, overlap: int) -> Iterator[str]:
+    # Sliding window over a word stream; only chunk_size words are held at a time
+    step = max(1, chunk_size - overlap)
+    window: list[str] = []
+    for w in words:
+        window.append(w)
+        if len(window) == chunk_size:
+            yield " ".join(window)
+            window = window[step:]
+    while window:
+        yield " ".join(window)
+        window = window[step:]
 
 def chunk_text(text: str, chunk_size: int, overlap: int) -> list[str]:
-    text = text.replace("\r\n", "\n")
-    words = text.split()
-    chunks = []
-    i = 0
-    while i < len(words):
-        chunk = words[i:i+chunk_size]
-        chunks.append(" ".join(chunk))
-        i += max(1, chunk_size - overlap)
-    return chunks
+    return list(iter_chunks(text.split(), chunk_size, overlap))
+
+def vectorize_batch(texts: list[str]):
+    # Runs in worker processes; the hashing vectorizer is stateless, so any worker can take any batch
+    return hashing.transform(texts)
 
 DDL = [
 """CREATE TABLE IF NOT EXISTS documents(
   doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
   filename TEXT UNIQUE,
-  added_at TEXT
+  added_at TEXT,
+  content_sha256 TEXT,
+  mtime_ns INTEGER,
+  size_bytes INTEGER,
+  updated_at TEXT
 );""",
 """CREATE TABLE IF NOT EXISTS chunks(
   chunk_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -33,59 +54,203 @@ DDL = [
 """CREATE TABLE IF NOT EXISTS vectors(
   chunk_id INTEGER PRIMARY KEY,
   dim INTEGER,
+  nnz INTEGER,
+  idx BLOB,
   vec BLOB,
   l2norm REAL,
   FOREIGN KEY(chunk_id) REFERENCES chunks(chunk_id)
-);"""
+);""",
+"""CREATE TABLE IF NOT EXISTS doc_tags(
+  doc_id INTEGER,
+  tag TEXT,
+  PRIMARY KEY(doc_id, tag),
+  FOREIGN KEY(doc_id) REFERENCES documents(doc_id)
+);""",
+"CREATE INDEX IF NOT EXISTS ix_chunks_doc ON chunks(doc_id, chunk_index);",
+"CREATE INDEX IF NOT EXISTS ix_doc_tags_tag ON doc_tags(tag, doc_id);",
+"CREATE INDEX IF NOT EXISTS ix_documents_added ON documents(added_at);"
 ]
 
+MIGRATIONS = {
+    "documents": (("content_sha256", "TEXT"), ("mtime_ns", "INTEGER"), ("size_bytes", "INTEGER"),
+                  ("updated_at", "TEXT")),
+    "vectors": (("nnz", "INTEGER"), ("idx", "BLOB")),
+}
+
+def migrate(cur: sqlite3.Cursor) -> None:
+    for table, columns in MIGRATIONS.items():
+        existing = {r[1] for r in cur.execute(f"PRAGMA table_info({table})")}
+        for col, typ in columns:
+            if col not in existing:
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN {col} {typ}")
+
+def drop_doc_chunks(cur: sqlite3.Cursor, doc_ids: list[int]) -> None:
+    rows = [(d,) for d in doc_ids]
+    cur.executemany("""DELETE FROM vectors
+                       WHERE chunk_id IN (SELECT chunk_id FROM chunks WHERE doc_id = ?)""", rows)
+    cur.executemany("DELETE FROM chunks WHERE doc_id = ?", rows)
+
+def sync_tags(cur: sqlite3.Cursor, tags_path: Path) -> int:
+    # {"filename": ["tag", ...]}; tags live only in SQLite, so retagging never touches chunks or vectors
+    tags = json.loads(tags_path.read_text()) if tags_path.exists() else {}
+    cur.execute("DELETE FROM doc_tags")
+    cur.executemany("""INSERT OR IGNORE INTO doc_tags(doc_id, tag)
+                       SELECT doc_id, ? FROM documents WHERE filename = ?""",
+                    [(str(t), fn) for fn, ts in tags.items() for t in ts])
+    return cur.execute("SELECT COUNT(*) FROM doc_tags").fetchone()[0]
+
+def iter_batches(docs: list[tuple[int, Path]], chunk_size: int, overlap: int,
+                 batch_size: int) -> Iterator[list[tuple[int, int, str]]]:
+    batch = []
+    for doc_id, path in docs:
+        for idx, text in enumerate(iter_chunks(iter_words(path), chunk_size, overlap)):
+            batch.append((doc_id, idx, text))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def ingest(cur: sqlite3.Cursor, docs: list[tuple[int, Path]], cfg: dict, layout: str, workers: int,
+           batch_size: int) -> int:
+    # Streams chunks in fixed-size batches: workers vectorize, this process is the only SQLite writer.
+    # At most 2 * workers batches are in flight, so memory is bounded by batch_size, not corpus size.
+    seq = cur.execute("SELECT seq FROM sqlite_sequence WHERE name = 'chunks'").fetchone()
+    max_id = cur.execute("SELECT COALESCE(MAX(chunk_id), 0) FROM chunks").fetchone()[0]
+    next_id = max(seq[0] if seq else 0, max_id) + 1
+    in_flight: deque[tuple[list[int], Future]] = deque()
+    done = 0
+
+    def drain(limit: int) -> None:
+        nonlocal done
+        while len(in_flight) > limit:
+            ids, fut = in_flight.popleft()
+            store_vectors(cur, ids, fut.result(), layout)
+            done += len(ids)
+
+    pool = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        for batch in iter_batches(docs, int(cfg["chunk_size"]), int(cfg["chunk_overlap"]), batch_size):
+            ids = list(range(next_id, next_id + len(batch)))
+            next_id += len(batch)
+            cur.executemany("INSERT INTO chunks(chunk_id, doc_id, chunk_index, text) VALUES (?,?,?,?)",
+                            [(cid, *row) for cid, row in zip(ids, batch)])
+            texts = [t for _, _, t in batch]
+            if pool is None:
+                fut = Future()
+                fut.set_result(vectorize_batch(texts))
+            else:
+                fut = pool.submit(vectorize_batch, texts)
+            in_flight.append((ids, fut))
+            drain(2 * workers - 1)
+        drain(0)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return done
+
 def main() -> None:
+    t0 = time.perf_counter()
     cfg = json.loads(Path("config/config.json").read_text())
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ivf-lists", type=int, default=int(cfg.get("ivf_lists", 0)),
+                    help="build an IVF index with this many k-means lists (0 = off)")
+    ap.add_argument("--quantization", choices=["none", "int8", "pq"], default=cfg.get("quantization", "none"),
+                    help="also store compressed codes for two-stage (approximate + exact rescore) search")
+    ap.add_argument("--workers", type=int, default=int(cfg.get("ingest_workers", 0)),
+                    help="vectorizer processes (0 = one per CPU, 1 = in-process)")
+    ap.add_argument("--batch-size", type=int, default=int(cfg.get("ingest_batch_size", 256)),
+                    help="chunks per vectorize/insert batch")
+    args = ap.parse_args()
+    workers = args.workers or os.cpu_count() or 1
+    layout = cfg.get("vector_layout", "sparse")
     docs_dir = Path(cfg["docs_dir"])
     index_path = Path(cfg["index_path"])
+    matrix_dir = Path(cfg["matrix_dir"])
     ensure_dir(index_path.parent)
 
     con = sqlite3.connect(str(index_path))
     cur = con.cursor()
     for ddl in DDL:
         cur.execute(ddl)
+    migrate(cur)
+    con.commit()
 
-    vectorizer = HashingVectorizer(n_features=2**12, alternate_sign=False, norm=None)
-
-    # Ingest docs
+    known = {fn: (doc_id, sha, mtime, size) for doc_id, fn, sha, mtime, size in
+             cur.execute("SELECT doc_id, filename, content_sha256, mtime_ns, size_bytes FROM documents")}
     files = sorted(docs_dir.glob("*.md")) + sorted(docs_dir.glob("*.txt"))
-    for f in files:
-        cur.execute("INSERT OR IGNORE INTO documents(filename, added_at) VALUES (?,?)", (f.name, utcnow_iso()))
-        con.commit()
-
-    # Build chunks + vectors
-    cur.execute("SELECT doc_id, filename FROM documents")
-    docs = cur.fetchall()
-
-    total_chunks = 0
-    for doc_id, filename in docs:
-        text = (docs_dir / filename).read_text(encoding="utf-8")
-        chunks = chunk_text(text, int(cfg["chunk_size"]), int(cfg["chunk_overlap"]))
-        for idx, ch in enumerate(chunks):
-            cur.execute("INSERT INTO chunks(doc_id, chunk_index, text) VALUES (?,?,?)", (doc_id, idx, ch))
-        con.commit()
-
-    cur.execute("SELECT chunk_id, text FROM chunks")
-    all_chunks = cur.fetchall()
-    texts = [t for _, t in all_chunks]
-    X = vectorizer.transform(texts)  # sparse
-    X = X.astype(np.float32)
-
-    # Store as bytes (dense) for simple cosine search
-    for (chunk_id, _), row in zip(all_chunks, X):
-        dense = row.toarray().ravel()
-        norm = float(np.linalg.norm(dense) + 1e-9)
-        cur.execute("INSERT OR REPLACE INTO vectors(chunk_id, dim, vec, l2norm) VALUES (?,?,?,?)",
-                    (chunk_id, dense.size, dense.tobytes(), norm))
-    con.commit()
+    stats = {"new": 0, "changed": 0, "unchanged": 0, "removed": 0}
+    pending = []  # (doc_id, path) to re-chunk + vectorize
+
+    # One transaction for the whole build, sidecar included: a failed run leaves the previous index intact
+    with con:
+        now = utcnow_iso()
+        for f in files:
+            st = f.stat()
+            rec = known.pop(f.name, None)
+            # Cheap stat check first; only hash when mtime/size moved
+            if rec and rec[2] == st.st_mtime_ns and rec[3] == st.st_size:
+                stats["unchanged"] += 1
+                continue
+            sha = sha256_file(f)
+            if rec and rec[1] == sha:
+                cur.execute("UPDATE documents SET mtime_ns = ?, size_bytes = ? WHERE doc_id = ?",
+                            (st.st_mtime_ns, st.st_size, rec[0]))
+                stats["unchanged"] += 1
+                continue
+            if rec:
+                drop_doc_chunks(cur, [rec[0]])
+                cur.execute("""UPDATE documents
+                               SET content_sha256 = ?, mtime_ns = ?, size_bytes = ?, updated_at = ?
+                               WHERE doc_id = ?""", (sha, st.st_mtime_ns, st.st_size, now, rec[0]))
+                doc_id = rec[0]
+                stats["changed"] += 1
+            else:
+                cur.execute("""INSERT INTO documents(filename, added_at, content_sha256, mtime_ns, size_bytes,
+                                                     updated_at)
+                               VALUES (?,?,?,?,?,?)""", (f.name, now, sha, st.st_mtime_ns, st.st_size, now))
+                doc_id = cur.lastrowid
+                stats["new"] += 1
+            pending.append((doc_id, f))
+
+        # Files that disappeared from docs_dir
+        removed = [rec[0] for rec in known.values()]
+        drop_doc_chunks(cur, removed)
+        cur.executemany("DELETE FROM documents WHERE doc_id = ?", [(d,) for d in removed])
+        stats["removed"] = len(removed)
+        tagged = sync_tags(cur, Path(cfg.get("doc_tags_path", docs_dir.parent / "doc_tags.json")))
+
+        # Chunk + vectorize only the new/changed documents.
+        # Sparse layout stores (bucket ids, values) per chunk; dense keeps the full 4096-float blob
+        vectorized = ingest(cur, pending, cfg, layout, workers, args.batch_size)
+
+        # Contiguous memory-mapped matrix (CSR or dense) for vectorized search; unchanged rows are copied
+        # over. Built inside the transaction: if it fails, the ingest rolls back and the next run redoes both.
+        meta_path = matrix_dir / "meta.json"
+        meta = json.loads(meta_path.read_text()) if meta_path.exists() else {}
+        live = cur.execute("""SELECT COUNT(*) FROM vectors v
+                              JOIN chunks c ON c.chunk_id = v.chunk_id""").fetchone()[0]
+        stale = meta.get("layout") != layout or (layout == "sparse" and "postings" not in meta)
+        stale = stale or "doc_ranges" not in meta
+        stale = stale or meta.get("rows") != live  # e.g. a sidecar left behind by an older, interrupted build
+        stale = stale or meta.get("ivf_lists", 0) != args.ivf_lists
+        stale = stale or meta.get("quantization", "none") != args.quantization
+        if pending or removed or stale:
+            meta = write_sidecar(con, matrix_dir, layout, ivf_lists=args.ivf_lists,
+                                 quantization=args.quantization,
+                                 pq_subspaces=int(cfg.get("pq_subspaces", 64)))
 
-    total_chunks = len(all_chunks)
-    print(json.dumps({"docs": len(files), "chunks": total_chunks, "dim": 2**12, "index": str(index_path)}, indent=2))
+    total_chunks = cur.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+    print(json.dumps({"docs": len(files), **stats, "chunks": total_chunks, "doc_tags": tagged,
+                      "chunks_vectorized": vectorized,
+                      "dim": hashing.N_FEATURES, "index": str(index_path), "matrix": str(matrix_dir),
+                      "layout": layout,
+                      "nnz": meta["nnz"], "ivf_lists": meta.get("ivf_lists", 0),
+                      "quantization": meta.get("quantization", "none"),
+                      "index_bytes": dir_bytes(index_path) + dir_bytes(matrix_dir),
+                      "workers": workers, "batch_size": args.batch_size,
+                      "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                      "build_seconds": round(time.perf_counter() - t0, 3)}, indent=2))
     con.close()
 
 if __name__ == "__main__":
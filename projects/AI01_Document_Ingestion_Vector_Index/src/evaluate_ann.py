@@ -0,0 +1,76 @@
+from __future__ import annotations
+import argparse, json, sqlite3, time
+from pathlib import Path
+import numpy as np
+from shared.utils import ensure_dir, utcnow_iso
+from vector_store import VectorIndex
+from benchmark_layouts import sample_queries
+from hashing import transform_dense
+
+def recall_at_k(exact: list[list[int]], approx: list[list[int]]) -> float:
+    hits = sum(len(set(e) & set(a)) for e, a in zip(exact, approx))
+    total = sum(len(e) for e in exact)
+    return hits / total if total else 1.0
+
+def timed(fn, queries) -> tuple[list[list[int]], list[float]]:
+    ids, lat = [], []
+    for qv in queries:
+        t0 = time.perf_counter()
+        hits = fn(qv)
+        lat.append((time.perf_counter() - t0) * 1000)
+        ids.append([cid for _, cid in hits])
+    return ids, lat
+
+def summarize(name: str, exact: list[list[int]], ids: list[list[int]], lat: list[float], **extra) -> dict:
+    return {"strategy": name, **extra, "recall_at_k": round(recall_at_k(exact, ids), 4),
+            "query_ms_p50": round(float(np.percentile(lat, 50)), 4),
+            "query_ms_p99": round(float(np.percentile(lat, 99)), 4)}
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--topk", type=int, default=10)
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    ap.add_argument("--rescore", type=int, nargs="+", default=[1, 2, 5, 10, 20])
+    args = ap.parse_args()
+
+    cfg = json.loads(Path("config/config.json").read_text())
+    out_dir = ensure_dir(Path("outputs"))
+    index = VectorIndex(Path(cfg["matrix_dir"]), cfg.get("bm25"))
+    if index.ivf is None and index.quant is None:
+        raise SystemExit("No IVF lists or quantized codes in the index; run build_index.py with "
+                         "--ivf-lists N and/or --quantization int8|pq first.")
+
+    con = sqlite3.connect(cfg["index_path"])
+    texts = [t for (t,) in con.execute("SELECT text FROM chunks")]
+    con.close()
+    Q = transform_dense(sample_queries(texts, args.queries))
+
+    # Ground truth: exact brute-force scan
+    exact, lat = timed(lambda qv: index.search(qv, args.topk, retrieval="scan"), Q)
+    matrix = index.matrix
+    float_bytes = int(matrix.nbytes if isinstance(matrix, np.ndarray)
+                      else matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes)
+    results = [summarize("scan", exact, exact, lat, resident_bytes=float_bytes)]
+    if index.ivf is not None:
+        for nprobe in args.nprobe:
+            ids, lat = timed(lambda qv: index.search(qv, args.topk, retrieval="ivf", nprobe=nprobe), Q)
+            results.append(summarize("ivf", exact, ids, lat, nprobe=nprobe))
+    if index.quant is not None:
+        # Resident = the codes scanned per query; the float32 matrix is only paged in for the shortlist
+        resident = index.quant.resident_bytes()
+        for rescore in args.rescore:
+            ids, lat = timed(lambda qv: index.search(qv, args.topk, retrieval="quantized",
+                                                     rescore=rescore), Q)
+            results.append(summarize(index.quant.kind, exact, ids, lat, rescore=rescore,
+                                     resident_bytes=resident,
+                                     compression=round(float_bytes / max(1, resident), 2)))
+
+    report = {"run_at": utcnow_iso(), "rows": len(index), "ivf_lists": index.meta.get("ivf_lists"),
+              "quantization": index.meta.get("quantization", "none"),
+              "queries": len(Q), "topk": args.topk, "results": results}
+    (out_dir / "ann_eval.json").write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+from __future__ import annotations
+import argparse, sqlite3
+from pathlib import Path
+import numpy as np
+
+# Per-document row ranges in the sidecar: every document's chunks occupy one contiguous run of rows
+#   doc_ids.npy int64 [runs], doc_indptr.npy int64 [runs + 1]
+#   (rows doc_indptr[i]:doc_indptr[i+1] belong to doc_ids[i])
+# Filters are resolved to document ids in SQLite, then to row ranges here, before anything is scored.
+
+FILTER_KEYS = ("filename", "added_from", "added_to", "tag")
+
+def write_doc_ranges(con: sqlite3.Connection, matrix_dir: Path) -> dict:
+    chunk_ids = np.load(matrix_dir / "chunk_ids.npy")
+    pairs = np.array(con.execute("SELECT chunk_id, doc_id FROM chunks ORDER BY chunk_id").fetchall(),
+                     dtype=np.int64).reshape(-1, 2)
+    row_doc = pairs[np.searchsorted(pairs[:, 0], chunk_ids), 1] if chunk_ids.size else chunk_ids
+    starts = np.flatnonzero(np.r_[True, row_doc[1:] != row_doc[:-1]]) if row_doc.size else row_doc
+    np.save(matrix_dir / "doc_ids.npy", row_doc[starts].astype(np.int64))
+    np.save(matrix_dir / "doc_indptr.npy", np.r_[starts, row_doc.size].astype(np.int64))
+    return {"doc_ranges": int(starts.size)}
+
+class DocRanges:
+    def __init__(self, matrix_dir: Path):
+        self.doc_ids = np.load(matrix_dir / "doc_ids.npy")
+        self.indptr = np.load(matrix_dir / "doc_indptr.npy")
+
+    def rows_for(self, doc_ids: list[int]) -> np.ndarray:
+        runs = np.flatnonzero(np.isin(self.doc_ids, np.asarray(doc_ids, dtype=np.int64)))
+        if runs.size == 0:
+            return np.empty(0, dtype=np.int64)
+        lo, hi = self.indptr[runs], self.indptr[runs + 1]
+        # Concatenated aranges, ascending because runs are in row order
+        lens = hi - lo
+        return np.repeat(lo - np.cumsum(np.r_[0, lens[:-1]]), lens) + np.arange(lens.sum())
+
+def add_filter_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--filename", help="only documents whose filename matches this glob, e.g. '*policy*'")
+    ap.add_argument("--added-from", help="only documents added at or after this ISO date/time")
+    ap.add_argument("--added-to",
+                    help="only documents added at or before this ISO date/time (inclusive prefix)")
+    ap.add_argument("--tag", help="only documents carrying this tag (see doc_tags_path)")
+
+def filter_options(args: argparse.Namespace | dict) -> dict:
+    src = args if isinstance(args, dict) else vars(args)
+    return {k: str(src[k]) for k in FILTER_KEYS if src.get(k)}
+
+def matching_docs(con: sqlite3.Connection, filters: dict) -> list[int]:
+    where, params = [], []
+    if "filename" in filters:
+        where.append("d.filename GLOB ?")
+        params.append(filters["filename"])
+    if "added_from" in filters:
+        where.append("d.added_at >= ?")
+        params.append(filters["added_from"])
+    if "added_to" in filters:
+        # Compare on the bound's own length so '2026-10-18' includes the whole day
+        where.append("substr(d.added_at, 1, length(?)) <= ?")
+        params += [filters["added_to"]] * 2
+    if "tag" in filters:
+        where.append("EXISTS (SELECT 1 FROM doc_tags t WHERE t.doc_id = d.doc_id AND t.tag = ?)")
+        params.append(filters["tag"])
+    sql = "SELECT d.doc_id FROM documents d" + (" WHERE " + " AND ".join(where) if where else "")
+    return [r[0] for r in con.execute(sql, params)]
+
+def resolve_rows(con: sqlite3.Connection, ranges: DocRanges | None, filters: dict) -> np.ndarray | None:
+    if not filters:
+        return None
+    if ranges is None:
+        raise ValueError("Index has no document ranges; re-run build_index.py to enable filters")
+    return ranges.rows_for(matching_docs(con, filters))
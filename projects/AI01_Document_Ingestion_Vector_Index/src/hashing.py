@@ -0,0 +1,84 @@
+from __future__ import annotations
+import re
+import numpy as np
+
+# Drop-in for sklearn's HashingVectorizer(n_features=2**12, alternate_sign=False, norm=None):
+# same token pattern, lowercasing, MurmurHash3 (x86, 32-bit, seed 0) and abs(h) % n_features buckets,
+# so indexes built with either stay compatible. Importing this costs NumPy only.
+
+N_FEATURES = 2**12
+TOKEN_RE = re.compile(r"(?u)\b\w\w+\b")
+C1, C2 = np.uint32(0xCC9E2D51), np.uint32(0x1B873593)
+
+def _rotl(x: np.ndarray, r: int) -> np.ndarray:
+    return (x << np.uint32(r)) | (x >> np.uint32(32 - r))
+
+def _fmix(h: np.ndarray) -> np.ndarray:
+    h ^= h >> np.uint32(16)
+    h *= np.uint32(0x85EBCA6B)
+    h ^= h >> np.uint32(13)
+    h *= np.uint32(0xC2B2AE35)
+    h ^= h >> np.uint32(16)
+    return h
+
+def murmurhash3_32(keys: list[bytes], seed: int = 0) -> np.ndarray:
+    # Vectorized over keys: pad every key into a [n, blocks] uint32 matrix and mix block by block
+    n = len(keys)
+    lens = np.fromiter(map(len, keys), dtype=np.int64, count=n)
+    width = max(1, -(-int(lens.max(initial=0)) // 4))
+    buf = np.zeros((n, width * 4), dtype=np.uint8)
+    flat = np.frombuffer(b"".join(keys), dtype=np.uint8)
+    starts = np.cumsum(lens) - lens
+    rows = np.repeat(np.arange(n), lens)
+    buf[rows, np.arange(flat.size) - np.repeat(starts, lens)] = flat
+    words = buf.view("<u4").astype(np.uint32)
+
+    nblocks = lens // 4
+    h = np.full(n, seed, dtype=np.uint32)
+    with np.errstate(over="ignore"):
+        for j in range(width):
+            live = nblocks > j
+            if not live.any():
+                break
+            k = _rotl(words[live, j] * C1, 15) * C2
+            hj = _rotl(h[live] ^ k, 13)
+            h[live] = hj * np.uint32(5) + np.uint32(0xE6546B64)
+        # Tail bytes are zero-padded in buf, so the little-endian word is the tail as murmur reads it
+        tail = (lens % 4) > 0
+        if tail.any():
+            k = words[np.flatnonzero(tail), nblocks[tail]]
+            h[tail] ^= _rotl(k * C1, 15) * C2
+        h ^= lens.astype(np.uint32)
+        h = _fmix(h)
+    return h.view(np.int32)
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(text.lower())
+
+def bucket_ids(tokens: list[str], n_features: int = N_FEATURES) -> np.ndarray:
+    # Hash each distinct token once
+    vocab = list(dict.fromkeys(tokens))
+    if not vocab:
+        return np.zeros(0, dtype=np.int32)
+    hashed = np.abs(murmurhash3_32([t.encode("utf-8") for t in vocab]).astype(np.int64)) % n_features
+    lookup = dict(zip(vocab, hashed.astype(np.int32).tolist()))
+    return np.fromiter((lookup[t] for t in tokens), dtype=np.int32, count=len(tokens))
+
+def transform(texts: list[str], n_features: int = N_FEATURES):
+    # CSR float32 of raw bucket counts, canonical (sorted, duplicates summed) like sklearn's output
+    import scipy.sparse as sp
+    docs = [tokenize(t) for t in texts]
+    lens = np.fromiter(map(len, docs), dtype=np.int64, count=len(docs))
+    indptr = np.concatenate([[0], np.cumsum(lens)])
+    indices = bucket_ids([t for d in docs for t in d], n_features)
+    X = sp.csr_matrix((np.ones(indices.size, dtype=np.float32), indices, indptr),
+                      shape=(len(texts), n_features))
+    X.sum_duplicates()
+    return X
+
+def transform_dense(texts: list[str], n_features: int = N_FEATURES) -> np.ndarray:
+    # Query path: a few short strings, so count straight into a dense block without scipy
+    out = np.zeros((len(texts), n_features), dtype=np.float32)
+    for i, text in enumerate(texts):
+        np.add.at(out[i], bucket_ids(tokenize(text), n_features), 1.0)
+    return out
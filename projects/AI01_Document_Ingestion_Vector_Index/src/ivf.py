@@ -0,0 +1,75 @@
+from __future__ import annotations
+from pathlib import Path
+import numpy as np
+import scipy.sparse as sp
+
+# IVF (inverted file) lists, written next to the sidecar matrix:
+#   ivf_centroids.npy float32 [nlist, dim]   unit-norm centroids (spherical k-means)
+#   ivf_indptr.npy    int64   [nlist+1]      list c owns ivf_rows[ivf_indptr[c]:ivf_indptr[c+1]]
+#   ivf_rows.npy      int32   [rows]         sidecar rows grouped by nearest centroid
+
+BLOCK_ROWS = 65536
+
+def _unit_rows(X, inv_norm: np.ndarray):
+    if sp.issparse(X):
+        return sp.diags(np.asarray(inv_norm, dtype=np.float32)) @ X
+    return np.asarray(X) * np.asarray(inv_norm)[:, None]
+
+def assign(X, centroids: np.ndarray) -> np.ndarray:
+    # Row norms do not change the argmax, so raw rows are fine here
+    labels = np.empty(X.shape[0], dtype=np.int32)
+    for b in range(0, X.shape[0], BLOCK_ROWS):
+        sims = X[b:b + BLOCK_ROWS] @ centroids.T
+        labels[b:b + BLOCK_ROWS] = np.asarray(sims).argmax(axis=1)
+    return labels
+
+def train_centroids(X, inv_norm: np.ndarray, nlist: int, iters: int = 10, sample: int = 100_000,
+                    seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    n = X.shape[0]
+    idx = np.sort(rng.choice(n, size=min(n, sample), replace=False))
+    Xs = _unit_rows(X[idx], inv_norm[idx])
+    nlist = min(nlist, idx.size)
+    seeds = rng.choice(idx.size, size=nlist, replace=False)
+    C = Xs[seeds].toarray() if sp.issparse(Xs) else np.array(Xs[seeds])
+    for _ in range(iters):
+        labels = np.asarray(Xs @ C.T).argmax(axis=1)
+        onehot = sp.csr_matrix((np.ones(labels.size, dtype=np.float32), (labels, np.arange(labels.size))),
+                               shape=(nlist, labels.size))
+        sums = onehot @ Xs
+        sums = sums.toarray() if sp.issparse(sums) else np.asarray(sums)
+        norms = np.linalg.norm(sums, axis=1)
+        # Empty clusters keep their previous centroid
+        live = norms > 0
+        C[live] = sums[live] / norms[live, None]
+    return C.astype(np.float32)
+
+def write_ivf(matrix_dir: Path, X, inv_norm: np.ndarray, nlist: int, previous: Path | None = None) -> dict:
+    # Reuse trained centroids from the previous sidecar so incremental builds only re-assign rows
+    prev = previous / "ivf_centroids.npy" if previous is not None else None
+    retrained = True
+    if prev is not None and prev.exists():
+        C = np.load(prev)
+        if C.shape == (nlist, X.shape[1]):
+            retrained = False
+    if retrained:
+        C = train_centroids(X, inv_norm, nlist)
+    labels = assign(X, C)
+    order = np.argsort(labels, kind="stable").astype(np.int32)
+    np.save(matrix_dir / "ivf_centroids.npy", C)
+    np.save(matrix_dir / "ivf_indptr.npy",
+            np.concatenate(([0], np.cumsum(np.bincount(labels, minlength=C.shape[0])))).astype(np.int64))
+    np.save(matrix_dir / "ivf_rows.npy", order)
+    return {"ivf_lists": int(nlist), "ivf_centroids": int(C.shape[0]), "ivf_retrained": retrained}
+
+class IVFIndex:
+    def __init__(self, matrix_dir: Path):
+        self.centroids = np.load(matrix_dir / "ivf_centroids.npy", mmap_mode="r")
+        self.indptr = np.load(matrix_dir / "ivf_indptr.npy", mmap_mode="r")
+        self.rows = np.load(matrix_dir / "ivf_rows.npy", mmap_mode="r")
+
+    def probe(self, qv: np.ndarray, nprobe: int) -> np.ndarray:
+        nprobe = max(1, min(nprobe, self.centroids.shape[0]))
+        sims = self.centroids @ qv
+        lists = np.argpartition(-sims, nprobe - 1)[:nprobe]
+        return np.sort(np.concatenate([self.rows[self.indptr[c]:self.indptr[c + 1]] for c in lists]))
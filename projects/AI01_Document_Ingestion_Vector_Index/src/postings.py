@@ -0,0 +1,66 @@
+from __future__ import annotations
+import json
+from pathlib import Path
+import numpy as np
+
+# Inverted postings over hash buckets, written next to the CSR sidecar:
+#   post_indptr.npy int64 [dim+1]   bucket b owns entries post_indptr[b]:post_indptr[b+1]
+#   post_rows.npy   int32 [nnz]     sidecar row of each entry
+#   post_tf.npy     float32 [nnz]   raw term count (HashingVectorizer, norm=None)
+#   doc_len.npy     float32 [rows]  hashed token count per chunk (BM25 length norm)
+
+MODES = ("cosine", "bm25")
+
+def write_postings(matrix_dir: Path) -> dict:
+    meta = json.loads((matrix_dir / "meta.json").read_text())
+    rows, dim = int(meta["rows"]), int(meta["dim"])
+    indptr = np.load(matrix_dir / "indptr.npy")
+    indices = np.load(matrix_dir / "indices.npy", mmap_mode="r")
+    data = np.load(matrix_dir / "data.npy", mmap_mode="r")
+
+    row_of = np.repeat(np.arange(rows, dtype=np.int32), np.diff(indptr))
+    # Bucket ids fit in 16 bits, which lets numpy use a linear-time radix sort
+    keys = indices.astype(np.uint16) if dim <= 2**16 else np.asarray(indices)
+    order = np.argsort(keys, kind="stable")
+
+    np.save(matrix_dir / "post_indptr.npy",
+            np.concatenate(([0], np.cumsum(np.bincount(indices, minlength=dim)))).astype(np.int64))
+    np.save(matrix_dir / "post_rows.npy", row_of[order])
+    np.save(matrix_dir / "post_tf.npy", np.asarray(data)[order])
+    np.save(matrix_dir / "doc_len.npy", np.bincount(row_of, weights=data, minlength=rows).astype(np.float32))
+    return {"postings": int(order.size)}
+
+class PostingsIndex:
+    def __init__(self, matrix_dir: Path, inv_norm: np.ndarray, k1: float = 1.2, b: float = 0.75):
+        self.indptr = np.load(matrix_dir / "post_indptr.npy", mmap_mode="r")
+        self.rows = np.load(matrix_dir / "post_rows.npy", mmap_mode="r")
+        self.tf = np.load(matrix_dir / "post_tf.npy", mmap_mode="r")
+        self.doc_len = np.load(matrix_dir / "doc_len.npy", mmap_mode="r")
+        self.inv_norm = inv_norm
+        self.k1, self.b = k1, b
+        self.n = int(self.doc_len.size)
+        self.avg_len = float(self.doc_len.mean()) if self.n else 0.0
+
+    def candidates(self, qv: np.ndarray, mode: str = "cosine") -> tuple[np.ndarray, np.ndarray]:
+        if mode not in MODES:
+            raise ValueError(f"Unknown scoring mode: {mode}")
+        buckets = np.flatnonzero(qv)
+        if buckets.size == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        lo, hi = self.indptr[buckets], self.indptr[buckets + 1]
+        # Only the query's posting lists are read: work is proportional to their total length
+        span = np.concatenate([np.arange(a, z) for a, z in zip(lo, hi)])
+        rows = self.rows[span]
+        tf = self.tf[span]
+        qw = np.repeat(qv[buckets], hi - lo)
+
+        if mode == "cosine":
+            w = qw * tf * self.inv_norm[rows] / float(np.linalg.norm(qv) + 1e-9)
+        else:
+            df = (hi - lo).astype(np.float64)
+            idf = np.repeat(np.log(1.0 + (self.n - df + 0.5) / (df + 0.5)), hi - lo)
+            norm = self.k1 * (1.0 - self.b + self.b * self.doc_len[rows] / (self.avg_len or 1.0))
+            w = qw * idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+        cand, inv = np.unique(rows, return_inverse=True)
+        return cand, np.bincount(inv, weights=w).astype(np.float32)
@@ -0,0 +1,124 @@
+from __future__ import annotations
+import json
+from pathlib import Path
+import numpy as np
+import scipy.sparse as sp
+
+# Compressed copies of the unit-normalized chunk vectors, written next to the CSR sidecar:
+#   int8: q8_indices.npy uint16 [nnz], q8_codes.npy int8 [nnz], q8_scale.npy float32 [rows]
+#         (reuses indptr.npy)
+#   pq:   pq_codebooks.npy float32 [m, 256, dim/m], pq_codes.npy uint8 [rows, m]
+# Search scores the codes first and rescores a shortlist exactly against the float32 matrix.
+
+QUANTIZATIONS = ("none", "int8", "pq")
+BLOCK_ROWS = 16384
+
+def _unit_block(X, inv_norm: np.ndarray, lo: int, hi: int) -> np.ndarray:
+    block = X[lo:hi]
+    block = block.toarray() if sp.issparse(block) else np.asarray(block, dtype=np.float32)
+    return block * np.asarray(inv_norm[lo:hi])[:, None]
+
+def _segment_sums(values: np.ndarray, indptr: np.ndarray) -> np.ndarray:
+    # reduceat over non-empty rows only; empty rows stay 0
+    starts = np.asarray(indptr[:-1], dtype=np.intp)
+    out = np.zeros(starts.size, dtype=np.float32)
+    nonempty = np.asarray(indptr[1:]) > starts
+    if values.size:
+        out[nonempty] = np.add.reduceat(values, starts[nonempty])
+    return out
+
+def _nearest(X: np.ndarray, C: np.ndarray) -> np.ndarray:
+    return ((C * C).sum(axis=1)[None, :] - 2.0 * (X @ C.T)).argmin(axis=1)
+
+def _kmeans(X: np.ndarray, k: int, iters: int, rng: np.random.Generator) -> np.ndarray:
+    C = np.zeros((k, X.shape[1]), dtype=np.float32)
+    seeds = rng.choice(len(X), size=min(k, len(X)), replace=False)
+    C[:seeds.size] = X[seeds]
+    for _ in range(iters):
+        labels = _nearest(X, C)
+        onehot = sp.csr_matrix((np.ones(labels.size, dtype=np.float32), (labels, np.arange(labels.size))),
+                               shape=(k, labels.size))
+        counts = np.bincount(labels, minlength=k)
+        live = counts > 0
+        C[live] = np.asarray(onehot @ X)[live] / counts[live, None]
+    return C
+
+def write_int8(matrix_dir: Path, X: sp.csr_matrix, inv_norm: np.ndarray) -> dict:
+    rows, dim = X.shape
+    lens = np.diff(X.indptr)
+    unit = X.data * np.repeat(np.asarray(inv_norm), lens)
+    # Per-row symmetric scale: the largest |value| of each row maps to 127
+    row_max = np.zeros(rows, dtype=np.float32)
+    np.maximum.at(row_max, np.repeat(np.arange(rows), lens), np.abs(unit))
+    scale = np.where(row_max > 0, row_max / 127.0, 1.0).astype(np.float32)
+    codes = np.rint(unit / np.repeat(scale, lens)).astype(np.int8)
+    np.save(matrix_dir / "q8_indices.npy", X.indices.astype(np.uint16 if dim <= 2**16 else np.int32))
+    np.save(matrix_dir / "q8_codes.npy", codes)
+    np.save(matrix_dir / "q8_scale.npy", scale)
+    return {"quantization": "int8"}
+
+def write_pq(matrix_dir: Path, X, inv_norm: np.ndarray, m: int, previous: Path | None = None,
+             sample: int = 20_000, iters: int = 8, seed: int = 0) -> dict:
+    rows, dim = X.shape
+    if dim % m:
+        raise ValueError(f"pq_subspaces={m} must divide dim={dim}")
+    ds = dim // m
+    prev = previous / "pq_codebooks.npy" if previous is not None else None
+    retrained = not (prev is not None and prev.exists()
+                     and np.load(prev, mmap_mode="r").shape == (m, 256, ds))
+    if retrained:
+        rng = np.random.default_rng(seed)
+        idx = np.sort(rng.choice(rows, size=min(rows, sample), replace=False))
+        Xs = (X[idx].toarray() if sp.issparse(X) else np.asarray(X[idx])) * np.asarray(inv_norm[idx])[:, None]
+        codebooks = np.stack([_kmeans(Xs[:, j * ds:(j + 1) * ds], 256, iters, rng) for j in range(m)])
+    else:
+        codebooks = np.load(prev)
+
+    codes = np.lib.format.open_memmap(matrix_dir / "pq_codes.npy", mode="w+", dtype=np.uint8, shape=(rows, m))
+    for lo in range(0, rows, BLOCK_ROWS):
+        hi = min(rows, lo + BLOCK_ROWS)
+        block = _unit_block(X, inv_norm, lo, hi)
+        for j in range(m):
+            codes[lo:hi, j] = _nearest(block[:, j * ds:(j + 1) * ds], codebooks[j])
+    codes.flush()
+    del codes
+    np.save(matrix_dir / "pq_codebooks.npy", codebooks.astype(np.float32))
+    return {"quantization": "pq", "pq_subspaces": m, "pq_retrained": retrained}
+
+class QuantizedIndex:
+    def __init__(self, matrix_dir: Path):
+        meta = json.loads((matrix_dir / "meta.json").read_text())
+        self.kind = meta["quantization"]
+        if self.kind == "int8":
+            self.indptr = np.load(matrix_dir / "indptr.npy", mmap_mode="r")
+            self.indices = np.load(matrix_dir / "q8_indices.npy", mmap_mode="r")
+            self.codes = np.load(matrix_dir / "q8_codes.npy", mmap_mode="r")
+            self.scale = np.load(matrix_dir / "q8_scale.npy", mmap_mode="r")
+            self.arrays = (self.indptr, self.indices, self.codes, self.scale)
+        else:
+            self.codebooks = np.load(matrix_dir / "pq_codebooks.npy", mmap_mode="r")
+            self.codes = np.load(matrix_dir / "pq_codes.npy", mmap_mode="r")
+            self.arrays = (self.codebooks, self.codes)
+
+    def resident_bytes(self) -> int:
+        return int(sum(a.nbytes for a in self.arrays))
+
+    def approx_scores(self, qv: np.ndarray) -> np.ndarray:
+        q = qv / float(np.linalg.norm(qv) + 1e-9)
+        rows = self.codes.shape[0] if self.kind == "pq" else self.scale.size
+        out = np.empty(rows, dtype=np.float32)
+        if self.kind == "int8":
+            for lo in range(0, rows, BLOCK_ROWS):
+                hi = min(rows, lo + BLOCK_ROWS)
+                a, z = self.indptr[lo], self.indptr[hi]
+                contrib = self.codes[a:z] * q[self.indices[a:z]]
+                out[lo:hi] = _segment_sums(contrib, self.indptr[lo:hi + 1] - a) * self.scale[lo:hi]
+        else:
+            # Asymmetric distance: one lookup table of <q_j, centroid> per subspace
+            m, k, ds = self.codebooks.shape
+            table = np.einsum("mkd,md->mk", self.codebooks, q.reshape(m, ds))
+            cols = np.arange(m)[None, :]
+            for lo in range(0, rows, BLOCK_ROWS):
+                hi = min(rows, lo + BLOCK_ROWS)
+                out[lo:hi] = table[cols, self.codes[lo:hi]].sum(axis=1)
+        return out
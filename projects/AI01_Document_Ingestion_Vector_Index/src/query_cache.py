@@ -0,0 +1,100 @@
+from __future__ import annotations
+import json, sqlite3, time
+from collections import OrderedDict
+from pathlib import Path
+from hashing import tokenize
+
+# Result caches keyed on (normalized query, topk, search options). Both are bound to one index generation
+# (meta.json "generation", bumped by every sidecar publish); sync() drops everything from other generations.
+
+def cache_key(query: str, topk: int, opts: dict) -> str:
+    # Queries that hash to the same tokens score identically, so normalize to the token sequence
+    return json.dumps([" ".join(tokenize(query)), int(topk), sorted(opts.items())])
+
+class LRUCache:
+    # In-memory cache for the resident server
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max(1, int(max_entries))
+        self.entries: OrderedDict[str, list] = OrderedDict()
+        self.generation = None
+        self.hits = self.misses = 0
+
+    def sync(self, generation: int) -> None:
+        if generation != self.generation:
+            self.entries.clear()
+            self.generation = generation
+
+    def get_many(self, keys: list[str]) -> list[list | None]:
+        found = []
+        for key in keys:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            found.append(value)
+        self._count(found)
+        return found
+
+    def put_many(self, items: list[tuple[str, list]]) -> None:
+        for key, value in items:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _count(self, found: list) -> None:
+        hits = sum(v is not None for v in found)
+        self.hits += hits
+        self.misses += len(found) - hits
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries),
+                "max_entries": self.max_entries, "generation": self.generation}
+
+class SQLiteCache(LRUCache):
+    # On-disk cache next to the index so repeated CLI invocations share results
+    def __init__(self, path: Path, max_entries: int = 10_000):
+        super().__init__(max_entries)
+        self.con = sqlite3.connect(str(path))
+        self.con.execute("""CREATE TABLE IF NOT EXISTS query_cache(
+                              key TEXT PRIMARY KEY,
+                              generation INTEGER,
+                              results TEXT,
+                              last_used REAL)""")
+        self.con.execute("CREATE INDEX IF NOT EXISTS ix_query_cache_lru ON query_cache(last_used)")
+
+    def sync(self, generation: int) -> None:
+        self.generation = generation
+        with self.con:
+            self.con.execute("DELETE FROM query_cache WHERE generation != ?", (generation,))
+
+    def get_many(self, keys: list[str]) -> list[list | None]:
+        rows = {}
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            marks = ",".join("?" * len(part))
+            rows.update(self.con.execute(f"SELECT key, results FROM query_cache WHERE key IN ({marks})",
+                                         part))
+        now = time.time()
+        with self.con:
+            self.con.executemany("UPDATE query_cache SET last_used = ? WHERE key = ?",
+                                 [(now, k) for k in rows])
+        found = [json.loads(rows[k]) if k in rows else None for k in keys]
+        self._count(found)
+        return found
+
+    def put_many(self, items: list[tuple[str, list]]) -> None:
+        now = time.time()
+        with self.con:
+            self.con.executemany("""INSERT OR REPLACE INTO query_cache(key, generation, results, last_used)
+                                    VALUES (?,?,?,?)""",
+                                 [(k, self.generation, json.dumps(v), now) for k, v in items])
+            self.con.execute("""DELETE FROM query_cache WHERE key IN (
+                                  SELECT key FROM query_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)""",
+                             (self.max_entries,))
+
+    def stats(self) -> dict:
+        entries = self.con.execute("SELECT COUNT(*) FROM query_cache").fetchone()[0]
+        return {**super().stats(), "entries": entries}
+
+    def close(self) -> None:
+        self.con.close()
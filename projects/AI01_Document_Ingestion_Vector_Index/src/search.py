@@ -1,46 +1,121 @@
 from __future__ import annotations
-import argparse, json, sqlite3
+import argparse, hashlib, json, sqlite3
 from pathlib import Path
 import numpy as np
-from sklearn.feature_extraction.text import HashingVectorizer
 from shared.utils import ensure_dir, utcnow_iso
+from vector_store import VectorIndex, fetch_chunks
+from hashing import transform_dense
+from query_cache import LRUCache, SQLiteCache, cache_key
+from filters import add_filter_args, filter_options, resolve_rows
+
+def add_search_args(ap: argparse.ArgumentParser) -> None:
+    ap.add_argument("--topk", type=int, default=5)
+    ap.add_argument("--mode", choices=["cosine", "bm25"], default="cosine")
+    ap.add_argument("--retrieval", choices=["auto", "postings", "scan", "ivf", "quantized"], default="auto",
+                    help="postings: only the query's posting lists are read; scan: score every chunk; "
+                         "ivf: score only the --nprobe nearest k-means lists; "
+                         "quantized: score int8/PQ codes, then rescore a shortlist exactly")
+    ap.add_argument("--nprobe", type=int, default=None, help="IVF lists to scan (implies --retrieval ivf)")
+    ap.add_argument("--rescore", type=int, default=None,
+                    help="quantized shortlist size as a multiple of --topk")
+
+def search_options(args: argparse.Namespace, cfg: dict) -> dict:
+    return {
+        "mode": args.mode,
+        "retrieval": "ivf" if args.nprobe and args.retrieval == "auto" else args.retrieval,
+        "nprobe": args.nprobe or int(cfg.get("ivf_nprobe", 8)),
+        "rescore": args.rescore or int(cfg.get("rescore_factor", 10)),
+    }
+
+def vectorize(queries: list[str]) -> np.ndarray:
+    return transform_dense(queries)
+
+def run_queries(index: VectorIndex, con: sqlite3.Connection, queries: list[str], topk: int,
+                opts: dict, rows: np.ndarray | None = None) -> list[list[dict]]:
+    # Shared by --query, --queries-file and search_server.py: one batched scoring call per query list.
+    # SQLite is only touched for the winners. A build publishes its sidecar just before the ingest transaction
+    # commits, and a server reloads it some time after, so a hit's chunk can be briefly missing from SQLite
+    # (new but uncommitted, or deleted). Such hits are skipped and those queries re-scored deeper until they
+    # have topk hits or the index runs out.
+    Q = vectorize(queries)
+    texts: dict[int, tuple[str, str]] = {}
+    found: list[list[tuple[float, int]]] = [[] for _ in queries]
+    pending, k = list(range(len(queries))), topk
+    while pending:
+        hits = index.search_batch(Q[pending], k, **opts, rows=rows)
+        texts.update(fetch_chunks(con, sorted({cid for h in hits for _, cid in h} - texts.keys())))
+        short = []
+        for i, h in zip(pending, hits):
+            found[i] = [(s, cid) for s, cid in h if cid in texts][:topk]
+            if len(found[i]) < topk and len(h) == k:
+                short.append(i)
+        k += max((topk - len(found[i]) for i in short), default=0)
+        pending = short
+    return [[{"score": s, "chunk_id": cid, "filename": texts[cid][0], "text": texts[cid][1][:600]}
+             for s, cid in h] for h in found]
+
+def cached_queries(index: VectorIndex, con: sqlite3.Connection, queries: list[str], topk: int, opts: dict,
+                   cache: LRUCache | None, rows: np.ndarray | None = None) -> list[list[dict]]:
+    # Only cache misses are scored; the cache is keyed on the index generation, so a rebuild invalidates it
+    if cache is None:
+        return run_queries(index, con, queries, topk, opts, rows)
+    cache.sync(int(index.meta.get("generation", 0)))
+    # Filtered searches are keyed on the resolved row set, so retagging can never serve stale hits
+    key_opts = opts if rows is None else {**opts, "rows": hashlib.sha1(rows.tobytes()).hexdigest()}
+    keys = [cache_key(q, topk, key_opts) for q in queries]
+    results = cache.get_many(keys)
+    missing = list(dict.fromkeys(k for k, r in zip(keys, results) if r is None))
+    if missing:
+        first = {k: q for q, k in zip(queries, keys)}
+        scored = dict(zip(missing, run_queries(index, con, [first[k] for k in missing], topk, opts, rows)))
+        cache.put_many(list(scored.items()))
+        results = [scored[k] if r is None else r for k, r in zip(keys, results)]
+    return results
 
 def main() -> None:
     ap = argparse.ArgumentParser()
-    ap.add_argument("--query", required=True)
-    ap.add_argument("--topk", type=int, default=5)
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--query")
+    src.add_argument("--queries-file", help="one query per line; all queries are scored in one batch")
+    ap.add_argument("--no-cache", action="store_true", help="bypass the on-disk query result cache")
+    add_search_args(ap)
+    add_filter_args(ap)
     args = ap.parse_args()
 
     cfg = json.loads(Path("config/config.json").read_text())
     index_path = Path(cfg["index_path"])
     out_dir = ensure_dir(Path("outputs"))
 
-    con = sqlite3.connect(str(index_path))
-    cur = con.cursor()
-
-    vec = HashingVectorizer(n_features=2**12, alternate_sign=False, norm=None)
-    qv = vec.transform([args.query]).toarray().astype(np.float32).ravel()
-    qn = float(np.linalg.norm(qv) + 1e-9)
-
-    cur.execute("""SELECT v.chunk_id, v.dim, v.vec, v.l2norm, c.text, d.filename
-                   FROM vectors v
-                   JOIN chunks c ON c.chunk_id = v.chunk_id
-                   JOIN documents d ON d.doc_id = c.doc_id""")
-    rows = cur.fetchall()
-
-    scored = []
-    for chunk_id, dim, blob, l2, text, filename in rows:
-        dv = np.frombuffer(blob, dtype=np.float32, count=dim)
-        score = float(np.dot(qv, dv) / (qn * float(l2)))
-        scored.append((score, chunk_id, filename, text))
+    # Postings accumulate scores over the query's buckets only; scan is one matrix product per batch.
+    # Either way top-k is a partial selection over the memory-mapped sidecar.
+    index = VectorIndex(Path(cfg["matrix_dir"]), cfg.get("bm25"))
+    opts = search_options(args, cfg)
+    queries = [args.query] if args.query else \
+        [q.strip() for q in Path(args.queries_file).read_text(encoding="utf-8").splitlines() if q.strip()]
 
-    scored.sort(reverse=True, key=lambda x: x[0])
-    top = [{"score": s, "chunk_id": cid, "filename": fn, "text": txt[:600]} for s, cid, fn, txt in scored[:args.topk]]
+    cache_path = Path(cfg.get("query_cache_path", "index/query_cache.sqlite"))
+    cache = None if args.no_cache else SQLiteCache(cache_path, int(cfg.get("query_cache_size", 10_000)))
+    con = sqlite3.connect(str(index_path))
+    # Filters become a sorted row set (contiguous per-document ranges) before any scoring
+    filters = filter_options(args)
+    rows = resolve_rows(con, index.ranges, filters)
+    results = cached_queries(index, con, queries, args.topk, opts, cache, rows)
+    con.close()
+    cache_stats = cache.stats() if cache else None
+    if cache:
+        cache.close()
 
-    result = {"run_at": utcnow_iso(), "query": args.query, "topk": args.topk, "results": top}
+    if args.query:
+        result = {"run_at": utcnow_iso(), "query": args.query, "topk": args.topk, "mode": args.mode,
+                  "filters": filters, "rows_eligible": len(index) if rows is None else int(rows.size),
+                  "cache": cache_stats, "results": results[0]}
+    else:
+        result = {"run_at": utcnow_iso(), "queries_file": args.queries_file, "topk": args.topk,
+                  "mode": args.mode, "filters": filters,
+                  "rows_eligible": len(index) if rows is None else int(rows.size), "cache": cache_stats,
+                  "queries": [{"query": q, "results": r} for q, r in zip(queries, results)]}
     (out_dir / "search_results.json").write_text(json.dumps(result, indent=2))
     print(json.dumps(result, indent=2))
-    con.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,115 @@
+from __future__ import annotations
+import argparse, asyncio, json, sqlite3, threading
+from pathlib import Path
+from shared.serving import MicroBatcher, serve_json
+from shared.utils import ensure_dir, utcnow_iso
+from vector_store import VectorIndex
+from search import add_search_args, search_options, cached_queries
+from query_cache import LRUCache
+from filters import filter_options, resolve_rows
+
+class SearchService:
+    # Holds the warm index; build_index.py publishes a new sidecar directory and we swap it in
+    def __init__(self, cfg: dict, opts: dict, cache_size: int = 10_000):
+        self.cfg, self.opts = cfg, opts
+        self.cache = LRUCache(cache_size) if cache_size > 0 else None
+        self.matrix_dir = Path(cfg["matrix_dir"])
+        ensure_dir(Path(cfg["index_path"]).parent)
+        self.con = sqlite3.connect(cfg["index_path"], check_same_thread=False)
+        self.lock = threading.Lock()
+        self.index: VectorIndex | None = None
+        self.version = None
+        self.reloads = 0
+        self.maybe_reload()
+
+    def maybe_reload(self) -> bool:
+        try:
+            meta_path = self.matrix_dir / "meta.json"
+            version = (meta_path.stat().st_mtime_ns, json.loads(meta_path.read_text()).get("built_at"))
+            if version == self.version:
+                return False
+            index = VectorIndex(self.matrix_dir, self.cfg.get("bm25"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False  # mid-publish; try again on the next poll
+        with self.lock:
+            self.index, self.version = index, version
+            self.reloads += 1
+        return True
+
+    def current(self) -> VectorIndex:
+        with self.lock:
+            index = self.index
+        if index is None:
+            raise ValueError(f"no index at {self.matrix_dir}; run build_index.py")
+        return index
+
+    def run_batch(self, items: list[dict]) -> list[list[dict]]:
+        index = self.current()
+        # One scoring call per distinct (topk, filters) so cache entries match what a lone request would get
+        groups: dict[tuple, list[int]] = {}
+        for pos, item in enumerate(items):
+            key = (int(item.get("topk", 5)), tuple(sorted(item["filters"].items())))
+            groups.setdefault(key, []).append(pos)
+        out: list[list[dict]] = [[] for _ in items]
+        for (topk, filters), positions in groups.items():
+            rows = resolve_rows(self.con, index.ranges, dict(filters))
+            queries = [str(items[pos]["query"]) for pos in positions]
+            results = cached_queries(index, self.con, queries, topk, self.opts, self.cache, rows)
+            for pos, res in zip(positions, results):
+                out[pos] = res
+        return out
+
+async def serve(args: argparse.Namespace, cfg: dict) -> None:
+    service = SearchService(cfg, search_options(args, cfg), args.cache_size)
+    batcher = MicroBatcher(service.run_batch, args.max_batch, args.linger_ms)
+
+    async def search(body: dict) -> dict:
+        if not body.get("query"):
+            raise ValueError("'query' is required")
+        filters = filter_options(body)
+        results = await batcher.submit({"query": body["query"], "topk": int(body.get("topk", args.topk)),
+                                        "filters": filters})
+        return {"run_at": utcnow_iso(), "query": body["query"], "filters": filters, "results": results}
+
+    async def health(_: dict) -> dict:
+        index = service.current()
+        return {"rows": len(index), "built_at": index.meta.get("built_at"),
+                "reloads": service.reloads, "generation": index.meta.get("generation"),
+                "cache": service.cache.stats() if service.cache else None, **batcher.metrics()}
+
+    async def watch() -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(args.reload_interval)
+            if await loop.run_in_executor(None, service.maybe_reload):
+                print(json.dumps({"reloaded_at": utcnow_iso(), "rows": len(service.index)}))
+
+    server = await serve_json({("POST", "/search"): search, ("GET", "/health"): health},
+                              args.host, args.port, args.unix)
+    # Without an index yet, requests get a 400 until the first build is published and picked up
+    print(json.dumps({"listening": args.unix or f"http://{args.host}:{args.port}",
+                      "rows": len(service.index) if service.index is not None else "no index",
+                      "max_batch": args.max_batch, "linger_ms": args.linger_ms}))
+    async with server:
+        await asyncio.gather(server.serve_forever(), batcher.run(), watch())
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--unix", default=None, help="serve on a Unix socket instead of TCP")
+    ap.add_argument("--max-batch", type=int, default=64, help="max concurrent queries coalesced per batch")
+    ap.add_argument("--linger-ms", type=float, default=2.0, help="how long a batch waits for more queries")
+    ap.add_argument("--reload-interval", type=float, default=2.0, help="seconds between index version checks")
+    ap.add_argument("--cache-size", type=int, default=None,
+                    help="in-memory LRU result cache entries (0 = off)")
+    add_search_args(ap)
+    args = ap.parse_args()
+
+    cfg = json.loads(Path("config/config.json").read_text())
+    if args.cache_size is None:
+        args.cache_size = int(cfg.get("query_cache_size", 10_000))
+    asyncio.run(serve(args, cfg))
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from __future__ import annotations
+import json
 from pathlib import Path
 from shared.utils import ensure_dir
 
@@ -19,10 +20,17 @@ Trials last 14 days and convert automatically unless canceled.
 """
 }
 
+TAGS = {
+  "refund_policy.md": ["policy", "billing"],
+  "device_telemetry_spec.md": ["spec", "iot"],
+  "billing_faq.md": ["faq", "billing"],
+}
+
 def main() -> None:
     docs_dir = ensure_dir(Path("data/docs"))
     for name, content in DOCS.items():
         (docs_dir / name).write_text(content, encoding="utf-8")
+    (docs_dir.parent / "doc_tags.json").write_text(json.dumps(TAGS, indent=2))
     print(f"Seeded {len(DOCS)} documents in {docs_dir.resolve()}")
 
 if __name__ == "__main__":
@@ -0,0 +1,326 @@
+from __future__ import annotations
+import json, shutil, sqlite3
+from pathlib import Path
+import numpy as np
+import scipy.sparse as sp
+from shared.utils import ensure_dir, utcnow_iso
+from postings import PostingsIndex, write_postings
+from ivf import IVFIndex, write_ivf
+from quantize import QUANTIZATIONS, QuantizedIndex, write_int8, write_pq
+from filters import DocRanges, write_doc_ranges
+
+LAYOUTS = ("sparse", "dense")
+
+# Sidecar layout (next to the SQLite index):
+#   sparse: indptr.npy int64 [rows+1], indices.npy int32 [nnz], data.npy float32 [nnz]  (CSR)
+#   dense:  vectors.npy float32 [rows, dim]
+#   both:   inv_norm.npy float32 [rows], chunk_ids.npy int64 [rows], meta.json
+#   sparse layout also carries the inverted postings (see postings.py)
+#   optional IVF lists when ivf_lists > 0 (see ivf.py)
+#   optional int8 / PQ codes when quantization != "none" (see quantize.py)
+# Every array is memory-mapped at query time.
+
+def store_vectors(cur: sqlite3.Cursor, chunk_ids: list[int], X: sp.csr_matrix, layout: str) -> None:
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown vector layout: {layout}")
+    X = sp.csr_matrix(X, dtype=np.float32)
+    X.sort_indices()
+    dim = X.shape[1]
+
+    def rows():
+        for i, chunk_id in enumerate(chunk_ids):
+            lo, hi = X.indptr[i], X.indptr[i + 1]
+            idx = X.indices[lo:hi].astype(np.int32)
+            val = X.data[lo:hi]
+            norm = float(np.linalg.norm(val) + 1e-9)
+            if layout == "sparse":
+                yield chunk_id, dim, int(idx.size), idx.tobytes(), val.tobytes(), norm
+            else:
+                dense = np.zeros(dim, dtype=np.float32)
+                dense[idx] = val
+                yield chunk_id, dim, int(idx.size), None, dense.tobytes(), norm
+
+    cur.executemany("""INSERT OR REPLACE INTO vectors(chunk_id, dim, nnz, idx, vec, l2norm)
+                       VALUES (?,?,?,?,?,?)""", rows())
+
+def decode_vector(dim: int, idx: bytes | None, vec: bytes) -> tuple[np.ndarray, np.ndarray]:
+    if idx is None:
+        dense = np.frombuffer(vec, dtype=np.float32, count=dim)
+        nz = np.flatnonzero(dense).astype(np.int32)
+        return nz, dense[nz]
+    return np.frombuffer(idx, dtype=np.int32), np.frombuffer(vec, dtype=np.float32)
+
+BLOCK_ROWS = 65536
+
+class _SidecarWriter:
+    def __init__(self, out_dir: Path, layout: str, rows: int, dim: int, nnz: int):
+        self.out_dir, self.layout, self.rows, self.dim, self.nnz = out_dir, layout, rows, dim, nnz
+        self.inv_norm = np.empty(rows, dtype=np.float32)
+        self.chunk_ids = np.empty(rows, dtype=np.int64)
+        self.row = self.pos = 0
+        if layout == "sparse":
+            self.indptr = np.zeros(rows + 1, dtype=np.int64)
+            self.indices = np.lib.format.open_memmap(out_dir / "indices.npy", mode="w+", dtype=np.int32,
+                                                     shape=(nnz,))
+            self.data = np.lib.format.open_memmap(out_dir / "data.npy", mode="w+", dtype=np.float32,
+                                                  shape=(nnz,))
+        else:
+            self.mat = np.lib.format.open_memmap(out_dir / "vectors.npy", mode="w+", dtype=np.float32,
+                                                 shape=(rows, dim))
+
+    def add_block(self, block, inv_norm: np.ndarray, chunk_ids: np.ndarray) -> None:
+        n, r = len(chunk_ids), self.row
+        if self.layout == "sparse":
+            block = sp.csr_matrix(block)
+            self.indices[self.pos:self.pos + block.nnz] = block.indices
+            self.data[self.pos:self.pos + block.nnz] = block.data
+            self.indptr[r + 1:r + n + 1] = self.pos + block.indptr[1:]
+            self.pos += block.nnz
+        else:
+            self.mat[r:r + n] = block
+        self.inv_norm[r:r + n] = inv_norm
+        self.chunk_ids[r:r + n] = chunk_ids
+        self.row += n
+
+    def add_row(self, nz: np.ndarray, val: np.ndarray, inv_norm: float, chunk_id: int) -> None:
+        r = self.row
+        if self.layout == "sparse":
+            self.indices[self.pos:self.pos + nz.size] = nz
+            self.data[self.pos:self.pos + nz.size] = val
+            self.pos += nz.size
+            self.indptr[r + 1] = self.pos
+        else:
+            self.mat[r, nz] = val
+        self.inv_norm[r] = inv_norm
+        self.chunk_ids[r] = chunk_id
+        self.row += 1
+
+    def close(self) -> dict:
+        if self.layout == "sparse":
+            self.indices.flush()
+            self.data.flush()
+            del self.indices, self.data
+            np.save(self.out_dir / "indptr.npy", self.indptr)
+        else:
+            self.mat.flush()
+            del self.mat
+        np.save(self.out_dir / "inv_norm.npy", self.inv_norm)
+        np.save(self.out_dir / "chunk_ids.npy", self.chunk_ids)
+        meta = {"layout": self.layout, "rows": int(self.rows), "dim": int(self.dim), "nnz": int(self.pos),
+                "built_at": utcnow_iso()}
+        (self.out_dir / "meta.json").write_text(json.dumps(meta, indent=2))
+        return meta
+
+def _publish(tmp: Path, matrix_dir: Path) -> None:
+    old = matrix_dir.with_name(matrix_dir.name + ".old")
+    shutil.rmtree(old, ignore_errors=True)
+    if matrix_dir.exists():
+        matrix_dir.rename(old)
+    tmp.rename(matrix_dir)
+    shutil.rmtree(old, ignore_errors=True)
+
+def write_sidecar(con: sqlite3.Connection, matrix_dir: Path, layout: str = "sparse", reuse: bool = True,
+                  ivf_lists: int = 0, quantization: str = "none", pq_subspaces: int = 64) -> dict:
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown vector layout: {layout}")
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization: {quantization}")
+    if quantization != "none" and layout != "sparse":
+        raise ValueError("Quantized codes are built from the sparse layout")
+    cur = con.cursor()
+    dim = cur.execute("SELECT COALESCE(MAX(dim), 0) FROM vectors").fetchone()[0]
+    # Rows ordered by document so each document occupies a contiguous slice
+    live = np.array([r[0] for r in cur.execute("""SELECT v.chunk_id
+                                                  FROM vectors v
+                                                  JOIN chunks c ON c.chunk_id = v.chunk_id
+                                                  ORDER BY c.doc_id, c.chunk_index""")], dtype=np.int64)
+
+    # Chunk ids are never reused, so rows already in the previous sidecar are still valid:
+    # copy them over in blocks and only decode the new chunks from SQLite.
+    old = None
+    if reuse and (matrix_dir / "meta.json").exists():
+        old = VectorIndex(matrix_dir)
+        if old.meta.get("layout") != layout or int(old.meta["dim"]) != dim:
+            old = None
+    if old is not None:
+        keep = np.flatnonzero(np.isin(old.chunk_ids, live))
+        fresh = live[~np.isin(live, old.chunk_ids)]
+        kept_nnz = int(np.diff(old.matrix.indptr)[keep].sum()) if layout == "sparse" else 0
+    else:
+        keep, fresh, kept_nnz = np.empty(0, dtype=np.int64), live, 0
+
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS sidecar_fresh(chunk_id INTEGER PRIMARY KEY)")
+    cur.execute("DELETE FROM sidecar_fresh")
+    cur.executemany("INSERT INTO sidecar_fresh(chunk_id) VALUES (?)", ((int(c),) for c in fresh))
+    fresh_nnz = cur.execute("""SELECT COALESCE(SUM(v.nnz), 0)
+                               FROM vectors v
+                               JOIN sidecar_fresh f ON f.chunk_id = v.chunk_id""").fetchone()[0]
+
+    tmp = matrix_dir.with_name(matrix_dir.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    ensure_dir(tmp)
+    writer = _SidecarWriter(tmp, layout, int(live.size), int(dim), kept_nnz + int(fresh_nnz))
+    for b in range(0, keep.size, BLOCK_ROWS):
+        sel = keep[b:b + BLOCK_ROWS]
+        writer.add_block(old.matrix[sel], old.inv_norm[sel], old.chunk_ids[sel])
+    cur.execute("""SELECT v.chunk_id, v.dim, v.idx, v.vec, v.l2norm
+                   FROM vectors v
+                   JOIN sidecar_fresh f ON f.chunk_id = v.chunk_id
+                   JOIN chunks c ON c.chunk_id = v.chunk_id
+                   ORDER BY c.doc_id, c.chunk_index""")
+    for chunk_id, d, idx, vec, l2 in cur:
+        nz, val = decode_vector(d, idx, vec)
+        writer.add_row(nz, val, 1.0 / float(l2), chunk_id)
+    meta = writer.close()
+    meta.update(write_doc_ranges(con, tmp))
+    if layout == "sparse":
+        meta.update(write_postings(tmp))
+    previous = matrix_dir if matrix_dir.exists() else None
+    if (ivf_lists > 0 or quantization != "none") and meta["rows"] > 0:
+        built = VectorIndex(tmp)
+        if ivf_lists > 0:
+            meta.update(write_ivf(tmp, built.matrix, built.inv_norm, ivf_lists, previous))
+        if quantization == "int8":
+            meta.update(write_int8(tmp, built.matrix, built.inv_norm))
+        elif quantization == "pq":
+            meta.update(write_pq(tmp, built.matrix, built.inv_norm, pq_subspaces, previous))
+        del built
+    # Monotonic index version: result caches keyed on it drop their entries when a new sidecar is published
+    prev_meta = matrix_dir / "meta.json"
+    previous_generation = json.loads(prev_meta.read_text()).get("generation", 0) if prev_meta.exists() else 0
+    meta["generation"] = previous_generation + 1
+    (tmp / "meta.json").write_text(json.dumps(meta, indent=2))
+    meta["reused_rows"], meta["fresh_rows"] = int(keep.size), int(fresh.size)
+    cur.execute("DELETE FROM sidecar_fresh")
+
+    del old
+    _publish(tmp, matrix_dir)
+    return meta
+
+class VectorIndex:
+    def __init__(self, matrix_dir: Path, bm25: dict | None = None):
+        self.meta = json.loads((matrix_dir / "meta.json").read_text())
+        rows, dim = int(self.meta["rows"]), int(self.meta["dim"])
+        if self.meta.get("layout", "dense") == "sparse":
+            # CSR over the memory-mapped arrays (indices/data are not copied)
+            self.matrix = sp.csr_matrix((np.load(matrix_dir / "data.npy", mmap_mode="r"),
+                                         np.load(matrix_dir / "indices.npy", mmap_mode="r"),
+                                         np.load(matrix_dir / "indptr.npy", mmap_mode="r")),
+                                        shape=(rows, dim))
+        else:
+            self.matrix = np.load(matrix_dir / "vectors.npy", mmap_mode="r")
+        self.inv_norm = np.load(matrix_dir / "inv_norm.npy", mmap_mode="r")
+        self.chunk_ids = np.load(matrix_dir / "chunk_ids.npy", mmap_mode="r")
+        self.postings = None
+        if (matrix_dir / "post_indptr.npy").exists():
+            self.postings = PostingsIndex(matrix_dir, self.inv_norm, **(bm25 or {}))
+        self.ivf = IVFIndex(matrix_dir) if (matrix_dir / "ivf_centroids.npy").exists() else None
+        self.quant = QuantizedIndex(matrix_dir) if self.meta.get("quantization", "none") != "none" else None
+        self.ranges = DocRanges(matrix_dir) if (matrix_dir / "doc_ids.npy").exists() else None
+
+    def __len__(self) -> int:
+        return int(self.meta["rows"])
+
+    def scores(self, qv: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        qn = float(np.linalg.norm(qv) + 1e-9)
+        if rows is None:
+            return np.asarray(self.matrix @ qv).ravel() * self.inv_norm / qn
+        return np.asarray(self.matrix[rows] @ qv).ravel() * self.inv_norm[rows] / qn
+
+    def search(self, qv: np.ndarray, topk: int, mode: str = "cosine", retrieval: str = "auto",
+               nprobe: int = 8, rescore: int = 10, rows: np.ndarray | None = None) -> list[tuple[float, int]]:
+        # rows: optional sorted pre-filter (see filters.py); only those rows are scored
+        if retrieval == "auto":
+            scan_slice = rows is not None and mode == "cosine"
+            retrieval = "postings" if self.postings is not None and not scan_slice else "scan"
+        if retrieval == "postings":
+            if self.postings is None:
+                raise ValueError("Index has no postings; rebuild it with vector_layout=sparse")
+            cand, scores = self.postings.candidates(qv, mode)
+            if rows is not None:
+                keep = np.isin(cand, rows, assume_unique=True)
+                cand, scores = cand[keep], scores[keep]
+            if cand.size < topk:
+                # Rows sharing no term with the query score exactly 0; fill up to k with them, as a scan would
+                pool = np.arange(len(self)) if rows is None else rows
+                extra = pool[~np.isin(pool, cand)][:topk - cand.size]
+                cand = np.concatenate([cand, extra])
+                scores = np.concatenate([scores, np.zeros(extra.size, dtype=scores.dtype)])
+            return top_k(scores, self.chunk_ids[cand], topk)
+        if retrieval not in ("scan", "ivf", "quantized"):
+            raise ValueError(f"Unknown retrieval: {retrieval}")
+        if mode != "cosine":
+            raise ValueError("BM25 scoring needs postings retrieval")
+        if retrieval == "ivf":
+            if self.ivf is None:
+                raise ValueError("Index has no IVF lists; rebuild it with ivf_lists > 0")
+            # Exact scores, but only for rows in the nprobe nearest lists
+            probed = self.ivf.probe(qv, nprobe)
+            probed = probed if rows is None else np.intersect1d(probed, rows, assume_unique=True)
+            return top_k(self.scores(qv, probed), self.chunk_ids[probed], topk)
+        if retrieval == "quantized":
+            if self.quant is None:
+                raise ValueError("Index has no quantized codes; rebuild it with quantization int8 or pq")
+            # Score the compact codes, then rescore topk * rescore candidates exactly
+            approx = self.quant.approx_scores(qv)
+            pool = np.arange(approx.size) if rows is None else rows
+            approx = approx[pool]
+            n = min(approx.size, topk * max(1, rescore))
+            if n <= 0:
+                return []
+            short = np.sort(pool[np.argpartition(-approx, n - 1)[:n]])
+            return top_k(self.scores(qv, short), self.chunk_ids[short], topk)
+        if rows is not None:
+            return top_k(self.scores(qv, rows), self.chunk_ids[rows], topk)
+        return top_k(self.scores(qv), self.chunk_ids, topk)
+
+    def search_batch(self, Q: np.ndarray, topk: int, mode: str = "cosine", retrieval: str = "auto",
+                     nprobe: int = 8, rescore: int = 10,
+                     rows: np.ndarray | None = None) -> list[list[tuple[float, int]]]:
+        Q = np.atleast_2d(np.asarray(Q, dtype=np.float32))
+        if retrieval == "auto" and (self.postings is None or (rows is not None and mode == "cosine")):
+            retrieval = "scan"
+        if retrieval != "scan" or mode != "cosine":
+            return [self.search(qv, topk, mode, retrieval, nprobe, rescore, rows) for qv in Q]
+        # All queries in one sparse-dense matrix product per row block; keep only each block's top-k
+        n = len(self) if rows is None else int(rows.size)
+        k = min(topk, n)
+        if k <= 0 or len(Q) == 0:
+            return [[] for _ in Q]
+        qn = np.linalg.norm(Q, axis=1) + 1e-9
+        best_s, best_r = [], []
+        for lo in range(0, n, BLOCK_ROWS):
+            hi = min(n, lo + BLOCK_ROWS)
+            sel = slice(lo, hi) if rows is None else rows[lo:hi]
+            S = np.asarray(self.matrix[sel] @ Q.T) * np.asarray(self.inv_norm[sel])[:, None] / qn[None, :]
+            part = np.argpartition(-S, min(k, hi - lo) - 1, axis=0)[:k]
+            best_s.append(np.take_along_axis(S, part, axis=0))
+            best_r.append(part + lo)
+        S, R = np.vstack(best_s), np.vstack(best_r)
+        if rows is not None:
+            R = rows[R]
+        return [top_k(S[:, j], self.chunk_ids[R[:, j]], k) for j in range(len(Q))]
+
+def top_k(scores: np.ndarray, chunk_ids: np.ndarray, topk: int) -> list[tuple[float, int]]:
+    k = min(topk, scores.size)
+    if k <= 0:
+        return []
+    # argpartition is O(N); only the k winners get sorted
+    idx = np.argpartition(-scores, k - 1)[:k]
+    idx = idx[np.argsort(-scores[idx], kind="stable")]
+    return [(float(scores[i]), int(chunk_ids[i])) for i in idx]
+
+def fetch_chunks(con: sqlite3.Connection, chunk_ids: list[int]) -> dict[int, tuple[str, str]]:
+    if not chunk_ids:
+        return {}
+    marks = ",".join("?" * len(chunk_ids))
+    rows = con.execute(f"""SELECT c.chunk_id, d.filename, c.text
+                           FROM chunks c
+                           JOIN documents d ON d.doc_id = c.doc_id
+                           WHERE c.chunk_id IN ({marks})""", chunk_ids).fetchall()
+    return {cid: (fn, txt) for cid, fn, txt in rows}
+
+def dir_bytes(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
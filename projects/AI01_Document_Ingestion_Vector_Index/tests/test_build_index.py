@@ -0,0 +1,85 @@
+import json, sqlite3, sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+import build_index  # noqa: E402
+from query_cache import SQLiteCache  # noqa: E402
+from search import cached_queries  # noqa: E402
+from vector_store import VectorIndex  # noqa: E402
+
+CONFIG = {"docs_dir": "docs", "index_path": "index/vector_index.sqlite", "matrix_dir": "index/matrix",
+          "vector_layout": "sparse", "chunk_size": 20, "chunk_overlap": 5}
+
+def write_docs(root: Path, docs: dict[str, str]) -> None:
+    (root / "config").mkdir(exist_ok=True)
+    (root / "config" / "config.json").write_text(json.dumps(CONFIG))
+    (root / "docs").mkdir(exist_ok=True)
+    for name, text in docs.items():
+        (root / "docs" / name).write_text(text)
+
+def build(root: Path, monkeypatch, capsys) -> dict:
+    monkeypatch.chdir(root)
+    monkeypatch.setattr(sys, "argv", ["build_index.py", "--workers", "1"])
+    build_index.main()
+    return json.loads(capsys.readouterr().out)
+
+def doc_chunks(root: Path) -> dict[str, list[int]]:
+    con = sqlite3.connect(str(root / CONFIG["index_path"]))
+    rows = con.execute("""SELECT d.filename, c.chunk_id FROM chunks c JOIN documents d USING (doc_id)
+                          ORDER BY c.chunk_id""").fetchall()
+    con.close()
+    out: dict[str, list[int]] = {}
+    for name, cid in rows:
+        out.setdefault(name, []).append(cid)
+    return out
+
+def generation(root: Path) -> int:
+    return json.loads((root / CONFIG["matrix_dir"] / "meta.json").read_text())["generation"]
+
+def words(prefix: str, n: int) -> str:
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+def test_rebuild_revectorizes_only_the_changed_doc(tmp_path, monkeypatch, capsys):
+    write_docs(tmp_path, {"a.md": words("alpha", 60), "b.md": words("beta", 60), "c.md": words("gamma", 60)})
+    first = build(tmp_path, monkeypatch, capsys)
+    before = doc_chunks(tmp_path)
+    assert first["new"] == 3 and first["chunks_vectorized"] == first["chunks"] > 3
+    assert generation(tmp_path) == 1
+
+    write_docs(tmp_path, {"b.md": words("delta", 45)})
+    second = build(tmp_path, monkeypatch, capsys)
+    after = doc_chunks(tmp_path)
+    assert (second["changed"], second["unchanged"]) == (1, 2)
+    assert second["chunks_vectorized"] == len(after["b.md"])
+    assert after["a.md"] == before["a.md"] and after["c.md"] == before["c.md"]
+    assert min(after["b.md"]) > max(max(ids) for ids in before.values())
+    assert generation(tmp_path) == 2
+
+    # nothing changed: no chunk is vectorized and the sidecar is not republished
+    third = build(tmp_path, monkeypatch, capsys)
+    assert (third["unchanged"], third["chunks_vectorized"]) == (3, 0)
+    assert generation(tmp_path) == 2
+
+def test_rebuild_invalidates_cached_results(tmp_path, monkeypatch, capsys):
+    write_docs(tmp_path, {"a.md": words("alpha", 60), "b.md": words("beta", 60)})
+    build(tmp_path, monkeypatch, capsys)
+    cache = SQLiteCache(tmp_path / "cache.sqlite")
+    opts = {"mode": "cosine", "retrieval": "scan", "nprobe": 0, "rescore": 0}
+
+    def search() -> list[dict]:
+        con = sqlite3.connect(CONFIG["index_path"])
+        index = VectorIndex(Path(CONFIG["matrix_dir"]))
+        hits = cached_queries(index, con, ["beta3 zeta3 zeta4"], 1, opts, cache)[0]
+        con.close()
+        return hits
+
+    first = search()
+    assert search() == first and (cache.hits, cache.misses) == (1, 1)
+    assert first[0]["filename"] == "b.md"
+
+    write_docs(tmp_path, {"a.md": words("zeta", 60)})
+    build(tmp_path, monkeypatch, capsys)
+    # the cached hit is from the previous generation: it is dropped and the query scored again
+    assert search()[0]["filename"] == "a.md"
+    assert (cache.hits, cache.misses) == (1, 2) and cache.stats()["generation"] == 2
+    cache.close()
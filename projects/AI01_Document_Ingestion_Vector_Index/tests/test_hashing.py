@@ -0,0 +1,31 @@
+import sys
+from pathlib import Path
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.utils import murmurhash3_32 as sk_murmurhash3_32
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+import hashing  # noqa: E402
+
+TEXTS = [
+    "Refund policy: refunds are issued within 30 days of purchase.",
+    "Café naïve ÉCOLE straße 中文字符 snake_case x y zz 42 7 -- ...",
+    "",
+    "a",
+    "The the THE tHe repeated repeated tokens",
+]
+
+def test_murmurhash_matches_sklearn():
+    rng = np.random.default_rng(0)
+    keys = [rng.integers(0, 256, size=n, dtype=np.uint8).tobytes() for n in rng.integers(0, 24, size=2000)]
+    expected = np.array([sk_murmurhash3_32(k, seed=0) for k in keys], dtype=np.int32)
+    assert np.array_equal(hashing.murmurhash3_32(keys), expected)
+
+def test_transform_matches_hashing_vectorizer():
+    ref = HashingVectorizer(n_features=hashing.N_FEATURES, alternate_sign=False, norm=None).transform(TEXTS)
+    got = hashing.transform(TEXTS)
+    assert got.dtype == np.float32
+    assert np.array_equal(got.indptr, ref.indptr)
+    assert np.array_equal(got.indices, ref.indices)
+    assert np.array_equal(got.data, ref.data.astype(np.float32))
+    assert np.array_equal(hashing.transform_dense(TEXTS), ref.toarray().astype(np.float32))
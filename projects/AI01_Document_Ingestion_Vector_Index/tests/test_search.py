@@ -0,0 +1,103 @@
+import sqlite3, sys
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+import hashing  # noqa: E402
+from build_index import DDL  # noqa: E402
+from filters import resolve_rows  # noqa: E402
+from search import run_queries  # noqa: E402
+from vector_store import VectorIndex, store_vectors, write_sidecar  # noqa: E402
+
+TEXTS = ["Refunds are issued within 30 days of purchase.",
+         "Shipping takes five business days.",
+         "Passwords must be rotated every quarter."]
+
+def corpus(docs: int, per_doc: int) -> list[str]:
+    # Chunks of Zipf-distributed words: queries share terms with many rows and term counts vary
+    rng = np.random.default_rng(0)
+    p = 1.0 / np.arange(1, 401)
+    vocab = [f"w{i}" for i in range(400)]
+    return [" ".join(rng.choice(vocab, size=40, p=p / p.sum())) for _ in range(docs * per_doc)]
+
+def build(tmp_path: Path, texts: list[str] = TEXTS, per_doc: int = 1,
+          **sidecar) -> tuple[sqlite3.Connection, VectorIndex]:
+    con = sqlite3.connect(":memory:")
+    cur = con.cursor()
+    for stmt in DDL:
+        cur.execute(stmt)
+    for i, text in enumerate(texts):
+        doc_id = i // per_doc + 1
+        if i % per_doc == 0:
+            cur.execute("INSERT INTO documents(doc_id, filename) VALUES (?, ?)", (doc_id, f"doc{doc_id}.md"))
+        cur.execute("INSERT INTO chunks(chunk_id, doc_id, chunk_index, text) VALUES (?, ?, ?, ?)",
+                    (i + 1, doc_id, i % per_doc, text))
+    store_vectors(cur, list(range(1, len(texts) + 1)), hashing.transform(texts), "sparse")
+    write_sidecar(con, tmp_path / "matrix", "sparse", **sidecar)
+    return con, VectorIndex(tmp_path / "matrix")
+
+def test_postings_search_fills_k_like_a_scan(tmp_path):
+    _, index = build(tmp_path)
+    qv = hashing.transform_dense(["refunds policy"])[0]
+    for mode in ("cosine", "bm25"):
+        hits = index.search(qv, 3, mode=mode, retrieval="postings")
+        assert len(hits) == 3 and hits[0][1] == 1 and hits[0][0] > 0
+        assert sorted(c for _, c in hits) == [1, 2, 3] and all(s == 0 for s, _ in hits[1:])
+    scan = index.search(qv, 3, retrieval="scan")
+    assert index.search(qv, 3)[0] == scan[0] and len(index.search(qv, 3)) == len(scan)
+    # a pre-filter bounds the padding to the filtered rows
+    assert len(index.search(qv, 3, mode="bm25", rows=np.array([0, 2]))) == 2
+
+def test_run_queries_refills_hits_missing_from_sqlite(tmp_path):
+    con, index = build(tmp_path)
+    # the sidecar still lists chunk 1 (a build deleted it, or has not committed it yet)
+    con.execute("DELETE FROM chunks WHERE chunk_id = 1")
+    opts = {"mode": "cosine", "retrieval": "scan", "nprobe": 0, "rescore": 0}
+    hits = run_queries(index, con, ["refunds policy", "shipping"], 2, opts)
+    assert [len(h) for h in hits] == [2, 2]
+    assert all(h["chunk_id"] != 1 for q in hits for h in q)
+    assert hits[1][0]["chunk_id"] == 2
+    # when the index runs out the shortfall shows as fewer hits, never a KeyError
+    assert len(run_queries(index, con, ["refunds policy"], 3, opts)[0]) == 2
+
+def same_topk(a: list[tuple[float, int]], b: list[tuple[float, int]]) -> bool:
+    # Same scores, and the same chunks above the k-th score (rows tied with it may be picked in any order)
+    sa, sb = np.array([x for x, _ in a]), np.array([x for x, _ in b])
+    return (sa.shape == sb.shape and np.allclose(sa, sb)
+            and {c for x, c in a if x > sa[-1] + 1e-6} == {c for x, c in b if x > sb[-1] + 1e-6})
+
+def test_quantized_topk_after_rescore_equals_exact(tmp_path):
+    texts = corpus(60, 10)
+    Q = hashing.transform_dense([" ".join(t.split()[:8]) for t in texts[::60]])
+    for quantization in ("int8", "pq"):
+        _, index = build(tmp_path / quantization, texts, quantization=quantization, pq_subspaces=16)
+        # the codes alone are approximate; the rescored shortlist gives the exact top-k
+        assert not np.allclose(index.quant.approx_scores(Q[0]), index.scores(Q[0]), atol=1e-4)
+        for qv in Q:
+            assert same_topk(index.search(qv, 5, retrieval="quantized", rescore=8),
+                             index.search(qv, 5, retrieval="scan"))
+
+def test_ivf_probing_every_list_equals_a_scan(tmp_path):
+    texts = corpus(20, 10)
+    _, index = build(tmp_path, texts, ivf_lists=8)
+    for qv in hashing.transform_dense([" ".join(t.split()[:8]) for t in texts[::25]]):
+        assert len(index.ivf.probe(qv, 1)) < len(index)
+        assert index.search(qv, 10, retrieval="ivf", nprobe=8) == index.search(qv, 10, retrieval="scan")
+
+def test_filtered_results_come_only_from_matching_docs(tmp_path):
+    texts = corpus(30, 4)
+    con, index = build(tmp_path, texts, per_doc=4)
+    rows = resolve_rows(con, index.ranges, {"filename": "doc1*"})  # doc1, doc10 .. doc19
+    allowed = {cid for (cid,) in con.execute("SELECT c.chunk_id FROM chunks c JOIN documents d "
+                                             "USING (doc_id) WHERE d.filename GLOB 'doc1*'")}
+    assert sorted(index.chunk_ids[rows]) == sorted(allowed)
+    Q = hashing.transform_dense([" ".join(t.split()[:8]) for t in texts[::9]])
+    batch = index.search_batch(Q, 5, rows=rows)
+    for qv, hits in zip(Q, batch):
+        scored = zip(index.scores(qv), index.chunk_ids)
+        exact = sorted(((float(x), int(c)) for x, c in scored if c in allowed), key=lambda h: -h[0])[:5]
+        for retrieval, mode in (("scan", "cosine"), ("postings", "cosine"), ("postings", "bm25")):
+            found = index.search(qv, 5, mode=mode, retrieval=retrieval, rows=rows)
+            assert len(found) == 5 and {c for _, c in found} <= allowed
+        assert {c for _, c in hits} <= allowed and same_topk(hits, exact)
+    assert resolve_rows(con, index.ranges, {"filename": "nothing*"}).size == 0
@@ -1,31 +1,132 @@
 from __future__ import annotations
-import json
+import argparse, heapq, json, os, resource, shutil, time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+import numpy as np
 import pandas as pd
-import joblib
+import pyarrow as pa
+import pyarrow.parquet as pq
 from shared.utils import ensure_dir, utcnow_iso
+from compiled_scorer import CompiledScorer
+from sketches import Histogram, merge, read_sketch, sketch, write_sketch
+
+# Streaming batch scorer: tasks are runs of Parquet row groups (~--batch-rows each). Workers read, score and
+# write their own prediction part and return only their local top-N, so peak memory is bounded by
+# batch_rows * in-flight tasks, not by the number of users. Each task also returns drift histograms on the
+# training baseline's bin edges; the merged sketch for the run is all monitor_drift.py needs.
+
+@lru_cache(maxsize=1)
+def load_scorer(path: str) -> CompiledScorer:
+    return CompiledScorer.load(Path(path))
+
+@lru_cache(maxsize=1)
+def load_edges(path: str) -> dict[str, np.ndarray]:
+    return {c: h.edges for c, h in read_sketch(Path(path))[1].items()}
+
+def plan_tasks(pf: pq.ParquetFile, batch_rows: int) -> list[list[int]]:
+    tasks, cur, rows = [], [], 0
+    for rg in range(pf.metadata.num_row_groups):
+        n = pf.metadata.row_group(rg).num_rows
+        if cur and rows + n > batch_rows:
+            tasks.append(cur)
+            cur, rows = [], 0
+        cur.append(rg)
+        rows += n
+    if cur:
+        tasks.append(cur)
+    return tasks
+
+def score_part(feat_path: str, row_groups: list[int], compiled_path: str, baseline_path: str, out_path: str,
+               scored_at: str, top_n: int) -> tuple[int, list[tuple[float, int]], dict[str, Histogram]]:
+    scorer = load_scorer(compiled_path)
+    cols = ["user_id", *scorer.tables, *scorer.numerics]
+    table = pq.ParquetFile(feat_path).read_row_groups(row_groups, columns=cols)
+    risk = scorer.predict_proba(table)
+    user_id = table.column("user_id").to_numpy()
+    pq.write_table(pa.table({"scored_at": pa.array([scored_at] * len(risk), pa.string()),
+                             "user_id": user_id, "churn_risk": risk}), out_path, compression="zstd")
+    edges = load_edges(baseline_path)
+    hists = sketch(table, {c: e for c, e in edges.items() if c != "churn_risk"})
+    if "churn_risk" in edges:
+        hists["churn_risk"] = Histogram(edges["churn_risk"]).update(risk)
+    k = min(top_n, len(risk))
+    top = np.argpartition(-risk, k - 1)[:k] if 0 < k < len(risk) else np.arange(k)
+    return len(risk), [(float(risk[i]), int(user_id[i])) for i in top], hists
 
 def main() -> None:
     cfg = json.loads(Path("config/config.json").read_text())
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=int(cfg.get("score_workers", 0)),
+                    help="scoring processes (0 = one per CPU, 1 = in-process)")
+    ap.add_argument("--batch-rows", type=int, default=int(cfg.get("score_batch_rows", 500_000)),
+                    help="target rows per scoring task (whole row groups)")
+    ap.add_argument("--top-n", type=int, default=int(cfg.get("top_n", 1000)))
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    workers = args.workers or os.cpu_count() or 1
     feat_path = Path(cfg["features_path"])
-    model_path = Path(cfg["model_path"])
-    pred_path = Path(cfg["predictions_path"])
-    ensure_dir(pred_path.parent)
-
-    df = pd.read_parquet(feat_path)
-    artifact = joblib.load(model_path)
-    model = artifact["model"]
-
-    X = df.drop(columns=["churn_30d"])
-    proba = model.predict_proba(X)[:,1]
-    out = pd.DataFrame({
-        "scored_at": utcnow_iso(),
-        "user_id": X["user_id"].astype(int),
-        "churn_risk": proba
-    }).sort_values("churn_risk", ascending=False)
-
-    out.to_csv(pred_path, index=False)
-    print(f"Wrote predictions: {pred_path.resolve()} (top risk={out['churn_risk'].iloc[0]:.3f})")
+    scored_at = utcnow_iso()
+    # One partition per scoring day; a rerun replaces that day's partition atomically
+    part_dir = Path(cfg["predictions_path"]) / f"scored_date={scored_at[:10]}"
+    tmp_dir = part_dir.with_name("." + part_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    ensure_dir(tmp_dir)
+    top_path = Path(cfg["top_risk_path"])
+    ensure_dir(top_path.parent)
+    sketch_path = ensure_dir(Path(cfg["sketch_dir"])) / f"scored_date={scored_at[:10]}.json"
+
+    tasks = plan_tasks(pq.ParquetFile(feat_path), args.batch_rows)
+    heap: list[tuple[float, int]] = []  # min-heap of the top-N (risk, user_id) seen so far
+    in_flight: deque[Future] = deque()
+    hists: dict[str, Histogram] = {}
+    rows = 0
+
+    def drain(limit: int) -> None:
+        nonlocal rows, hists
+        while len(in_flight) > limit:
+            n, top, part_hists = in_flight.popleft().result()
+            rows += n
+            hists = merge([hists, part_hists])
+            for item in top:
+                if len(heap) < args.top_n:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+
+    pool = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        for i, rgs in enumerate(tasks):
+            job = (str(feat_path), rgs, cfg["compiled_model_path"], cfg["drift_baseline_path"],
+                   str(tmp_dir / f"part-{i:05d}.parquet"), scored_at, args.top_n)
+            if pool is None:
+                fut = Future()
+                fut.set_result(score_part(*job))
+            else:
+                fut = pool.submit(score_part, *job)
+            in_flight.append(fut)
+            drain(2 * workers - 1)
+        drain(0)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    shutil.rmtree(part_dir, ignore_errors=True)
+    tmp_dir.rename(part_dir)
+    write_sketch(sketch_path, hists, scored_at=scored_at, rows=rows)
+    top = sorted(heap, reverse=True)
+    pd.DataFrame({"scored_at": scored_at, "user_id": [u for _, u in top],
+                  "churn_risk": [r for r, _ in top]}).to_csv(top_path, index=False)
+
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    print(json.dumps({"predictions": str(part_dir.resolve()), "top_risk_path": str(top_path.resolve()),
+                      "drift_sketch": str(sketch_path.resolve()),
+                      "rows": rows, "tasks": len(tasks), "workers": workers, "batch_rows": args.batch_rows,
+                      "top_risk": top[0][0] if top else None, "peak_rss_mb": round(peak / 1024, 1),
+                      "seconds": round(time.perf_counter() - t0, 3)}, indent=2))
 
 if __name__ == "__main__":
     main()
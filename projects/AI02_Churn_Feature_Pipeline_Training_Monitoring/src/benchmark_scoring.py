@@ -0,0 +1,64 @@
+from __future__ import annotations
+import argparse, json, time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import joblib
+from shared.utils import ensure_dir, utcnow_iso
+from compiled_scorer import CompiledScorer
+
+# Scores N rows in fixed-size chunks resampled from the real features, so 100M rows never sit in memory.
+# The sklearn pipeline is only timed up to --sklearn-max-rows; beyond that it would dominate the run.
+
+def timed(fn, chunk, reps: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        fn(chunk)
+    return time.perf_counter() - t0
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000, 100_000_000])
+    ap.add_argument("--chunk-rows", type=int, default=1_000_000)
+    ap.add_argument("--sklearn-max-rows", type=int, default=10_000_000)
+    args = ap.parse_args()
+
+    cfg = json.loads(Path("config/config.json").read_text())
+    out_dir = ensure_dir(Path("outputs"))
+    model = joblib.load(cfg["model_path"])["model"]
+    scorer = CompiledScorer.load(Path(cfg["compiled_model_path"]))
+
+    feats = pd.read_parquet(cfg["features_path"]).drop(columns=["churn_30d"])
+    idx = np.random.default_rng(0).integers(0, len(feats), size=args.chunk_rows)
+    chunk = feats.iloc[idx].reset_index(drop=True)
+    table = pa.Table.from_pandas(chunk, preserve_index=False)
+
+    reference = model.predict_proba(chunk)[:, 1]
+    max_diff = {"pandas": float(np.abs(scorer.predict_proba(chunk) - reference).max()),
+                "arrow": float(np.abs(scorer.predict_proba(table) - reference).max())}
+
+    results = []
+    for rows in args.rows:
+        reps = -(-rows // args.chunk_rows)
+        res = {"rows": reps * args.chunk_rows}
+        runs = {"compiled_arrow": (scorer.predict_proba, table),
+                "compiled_pandas": (scorer.predict_proba, chunk)}
+        if rows <= args.sklearn_max_rows:
+            runs["sklearn_pipeline"] = (lambda X: model.predict_proba(X)[:, 1], chunk)
+        for name, (fn, data) in runs.items():
+            sec = timed(fn, data, reps)
+            res[name] = {"seconds": round(sec, 3), "rows_per_sec": int(res["rows"] / sec)}
+        if "sklearn_pipeline" in res:
+            res["speedup_vs_sklearn"] = round(res["sklearn_pipeline"]["seconds"]
+                                              / res["compiled_arrow"]["seconds"], 1)
+        results.append(res)
+        print(json.dumps(res))
+
+    report = {"run_at": utcnow_iso(), "chunk_rows": args.chunk_rows, "max_abs_diff_vs_sklearn": max_diff,
+              "results": results}
+    (out_dir / "scoring_benchmark.json").write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
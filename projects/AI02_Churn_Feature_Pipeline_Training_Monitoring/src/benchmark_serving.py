@@ -0,0 +1,84 @@
+from __future__ import annotations
+import argparse, asyncio, itertools, json, tempfile, time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from shared.serving import MicroBatcher, serve_json
+from shared.utils import ensure_dir, utcnow_iso
+from scoring_server import ScoringService, routes
+
+# Sweeps engine x max_batch x linger_ms against an in-process scoring server on a Unix socket, with
+# --concurrency clients each sending one feature row per request, to pick the latency/throughput trade-off.
+
+async def post(sock: str, body: bytes) -> dict:
+    reader, writer = await asyncio.open_unix_connection(sock)
+    writer.write(b"POST /score HTTP/1.1\r\nHost: local\r\nContent-Type: application/json\r\n"
+                 + f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    head, _, payload = raw.partition(b"\r\n\r\n")
+    if not head.startswith(b"HTTP/1.1 200"):
+        raise RuntimeError(payload.decode("utf-8", "replace"))
+    return json.loads(payload)
+
+async def run_one(service: ScoringService, bodies: list[bytes], concurrency: int, max_batch: int,
+                  linger_ms: float, sock: str) -> dict:
+    batcher = MicroBatcher(service.run_batch, max_batch, linger_ms)
+    server = await serve_json(routes(service, batcher), unix_path=sock)
+    worker = asyncio.create_task(batcher.run())
+    queue = iter(bodies)
+    lat: list[float] = []
+
+    async def client() -> None:
+        for body in queue:
+            t0 = time.perf_counter()
+            await post(sock, body)
+            lat.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    worker.cancel()
+    server.close()
+    await server.wait_closed()
+    Path(sock).unlink(missing_ok=True)
+    lat_arr = np.asarray(lat)
+    return {"engine": service.engine, "max_batch": max_batch, "linger_ms": linger_ms,
+            "requests": len(lat), "client_rps": round(len(lat) / wall, 1),
+            "client_ms_p50": round(float(np.percentile(lat_arr, 50)), 3),
+            "client_ms_p99": round(float(np.percentile(lat_arr, 99)), 3),
+            "server": batcher.metrics()}
+
+async def sweep(args: argparse.Namespace, cfg: dict, bodies: list[bytes]) -> list[dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for engine in args.engines:
+            service = ScoringService(cfg, engine)
+            for max_batch, linger in itertools.product(args.max_batch, args.linger_ms):
+                res = await run_one(service, bodies, args.concurrency, max_batch, linger, f"{tmp}/score.sock")
+                print(json.dumps({k: v for k, v in res.items() if k != "server"}))
+                results.append(res)
+    return results
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=64, help="concurrent client connections")
+    ap.add_argument("--max-batch", type=int, nargs="+", default=[1, 32, 256])
+    ap.add_argument("--linger-ms", type=float, nargs="+", default=[0.0, 2.0])
+    ap.add_argument("--engines", nargs="+", choices=["compiled", "sklearn"], default=["compiled", "sklearn"])
+    args = ap.parse_args()
+
+    cfg = json.loads(Path("config/config.json").read_text())
+    out_dir = ensure_dir(Path("outputs"))
+    feats = pd.read_parquet(cfg["features_path"]).drop(columns=["churn_30d"])
+    sample = feats.sample(n=args.requests, replace=True, random_state=0)
+    bodies = [json.dumps({"features": row}).encode("utf-8") for row in sample.to_dict(orient="records")]
+
+    report = {"run_at": utcnow_iso(), "concurrency": args.concurrency,
+              "results": asyncio.run(sweep(args, cfg, bodies))}
+    (out_dir / "serving_benchmark.json").write_text(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
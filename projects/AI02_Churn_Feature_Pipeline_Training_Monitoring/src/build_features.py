@@ -1,33 +1,231 @@
 from __future__ import annotations
-import json
+import argparse, json, time
 from pathlib import Path
-import pandas as pd
+from datetime import date, timedelta
 import duckdb
 from shared.utils import ensure_dir
+from online_store import write_online_store
 
-FEATURE_SQL = '\nWITH base AS (\n  SELECT\n    user_id,\n    plan,\n    country,\n    tenure_days,\n    sessions,\n    support_tickets,\n    usage_minutes,\n    mrr_usd,\n    churn_30d,\n    CAST(event_date AS DATE) AS event_date\n  FROM raw_usage\n),\nanchor AS (\n  SELECT max(event_date) AS max_date FROM base\n),\nlast30 AS (\n  SELECT b.*\n  FROM base b, anchor a\n  WHERE b.event_date >= a.max_date - INTERVAL 29 DAY\n),\nagg AS (\n  SELECT\n    user_id,\n    any_value(plan) AS plan,\n    any_value(country) AS country,\n    max(tenure_days) AS tenure_end,\n    any_value(mrr_usd) AS mrr_usd,\n    any_value(churn_30d) AS churn_30d,\n    sum(sessions) AS sessions_30,\n    sum(support_tickets) AS tickets_30,\n    sum(usage_minutes) AS usage_30,\n    sum(CASE WHEN sessions > 0 OR usage_minutes > 0 THEN 1 ELSE 0 END) AS days_active_30,\n    avg(sessions) AS sessions_avg_daily,\n    avg(usage_minutes) AS usage_avg_daily\n  FROM last30\n  GROUP BY 1\n)\nSELECT\n  user_id,\n  plan,\n  country,\n  tenure_end,\n  mrr_usd,\n  sessions_30,\n  tickets_30,\n  usage_30,\n  days_active_30,\n  sessions_avg_daily,\n  usage_avg_daily,\n  (sessions_30 / NULLIF(days_active_30, 0)) AS sessions_per_active_day,\n  (usage_30 / NULLIF(days_active_30, 0)) AS usage_per_active_day,\n  (tickets_30 / NULLIF(sessions_30, 0)) * 100.0 AS tickets_per_100_sessions,\n  (usage_30 / NULLIF(sessions_30, 0)) AS usage_per_session,\n  churn_30d\nFROM agg;\n'
+WINDOW_DAYS = 30
+
+# Incremental feature store (persistent DuckDB):
+#   daily_user   per-user daily aggregates for the days inside the current window
+#   window_state running 30-day sums per user; each run adds the new days and subtracts the expired ones
+#   partitions   raw partitions already folded in (size/mtime, to detect rewrites)
+# usage is DECIMAL so add/subtract is exact and matches a from-scratch recompute.
+STATE_DDL = [
+"""CREATE TABLE IF NOT EXISTS daily_user(
+  event_date DATE,
+  user_id BIGINT,
+  plan VARCHAR,
+  country VARCHAR,
+  tenure_days BIGINT,
+  mrr_usd DOUBLE,
+  sessions BIGINT,
+  support_tickets BIGINT,
+  usage_minutes DECIMAL(18,1),
+  active_rows BIGINT,
+  n_rows BIGINT
+);""",
+"""CREATE TABLE IF NOT EXISTS window_state(
+  user_id BIGINT,
+  plan VARCHAR,
+  country VARCHAR,
+  tenure_end BIGINT,
+  mrr_usd DOUBLE,
+  sessions_30 BIGINT,
+  tickets_30 BIGINT,
+  usage_30 DECIMAL(18,1),
+  days_active_30 BIGINT,
+  rows_30 BIGINT
+);""",
+"""CREATE TABLE IF NOT EXISTS partitions(
+  event_date DATE,
+  size_bytes BIGINT,
+  mtime_ns BIGINT
+);""",
+]
+
+NEW_DAYS_SQL = """
+CREATE OR REPLACE TEMP TABLE new_days AS
+SELECT
+  CAST(event_date AS DATE) AS event_date,
+  user_id,
+  any_value(CAST(plan AS VARCHAR)) AS plan,
+  any_value(CAST(country AS VARCHAR)) AS country,
+  max(tenure_days) AS tenure_days,
+  any_value(mrr_usd) AS mrr_usd,
+  sum(sessions) AS sessions,
+  sum(support_tickets) AS support_tickets,
+  sum(CAST(usage_minutes AS DECIMAL(18,1))) AS usage_minutes,
+  sum(CASE WHEN sessions > 0 OR usage_minutes > 0 THEN 1 ELSE 0 END) AS active_rows,
+  count(*) AS n_rows
+FROM read_parquet(?, hive_partitioning = true)
+GROUP BY 1, 2
+"""
+
+MERGE_SQL = """
+CREATE OR REPLACE TABLE window_state AS
+WITH moves AS (
+  SELECT 1 AS sign, * FROM new_days
+  UNION ALL
+  SELECT -1 AS sign, * FROM daily_user WHERE event_date < ?
+),
+delta AS (
+  SELECT
+    user_id,
+    sum(sign * sessions) AS sessions,
+    sum(sign * support_tickets) AS tickets,
+    sum(sign * usage_minutes) AS usage,
+    sum(sign * active_rows) AS active_rows,
+    sum(sign * n_rows) AS n_rows
+  FROM moves
+  GROUP BY 1
+),
+latest AS (
+  SELECT
+    user_id,
+    arg_max(plan, event_date) AS plan,
+    arg_max(country, event_date) AS country,
+    max(tenure_days) AS tenure_end,
+    arg_max(mrr_usd, event_date) AS mrr_usd
+  FROM new_days
+  GROUP BY 1
+)
+SELECT
+  COALESCE(s.user_id, d.user_id) AS user_id,
+  COALESCE(l.plan, s.plan) AS plan,
+  COALESCE(l.country, s.country) AS country,
+  COALESCE(l.tenure_end, s.tenure_end) AS tenure_end,
+  COALESCE(l.mrr_usd, s.mrr_usd) AS mrr_usd,
+  CAST(COALESCE(s.sessions_30, 0) + COALESCE(d.sessions, 0) AS BIGINT) AS sessions_30,
+  CAST(COALESCE(s.tickets_30, 0) + COALESCE(d.tickets, 0) AS BIGINT) AS tickets_30,
+  CAST(COALESCE(s.usage_30, 0) + COALESCE(d.usage, 0) AS DECIMAL(18,1)) AS usage_30,
+  CAST(COALESCE(s.days_active_30, 0) + COALESCE(d.active_rows, 0) AS BIGINT) AS days_active_30,
+  CAST(COALESCE(s.rows_30, 0) + COALESCE(d.n_rows, 0) AS BIGINT) AS rows_30
+FROM window_state s
+FULL OUTER JOIN delta d ON d.user_id = s.user_id
+LEFT JOIN latest l ON l.user_id = COALESCE(s.user_id, d.user_id)
+WHERE COALESCE(s.rows_30, 0) + COALESCE(d.n_rows, 0) > 0
+"""
+
+FEATURE_SQL = """
+CREATE OR REPLACE TEMP TABLE features AS
+SELECT
+  s.user_id,
+  s.plan,
+  s.country,
+  s.tenure_end,
+  s.mrr_usd,
+  s.sessions_30,
+  s.tickets_30,
+  CAST(s.usage_30 AS DOUBLE) AS usage_30,
+  s.days_active_30,
+  s.sessions_30 / s.rows_30 AS sessions_avg_daily,
+  CAST(s.usage_30 AS DOUBLE) / s.rows_30 AS usage_avg_daily,
+  (s.sessions_30 / NULLIF(s.days_active_30, 0)) AS sessions_per_active_day,
+  (CAST(s.usage_30 AS DOUBLE) / NULLIF(s.days_active_30, 0)) AS usage_per_active_day,
+  (s.tickets_30 / NULLIF(s.sessions_30, 0)) * 100.0 AS tickets_per_100_sessions,
+  (CAST(s.usage_30 AS DOUBLE) / NULLIF(s.sessions_30, 0)) AS usage_per_session,
+  l.churn_30d
+FROM window_state s
+LEFT JOIN read_parquet(?) l ON l.user_id = s.user_id
+ORDER BY s.user_id
+"""
+
+def raw_partitions(raw_dir: Path) -> dict[date, tuple[list[str], int, int]]:
+    parts: dict[date, tuple[list[str], int, int]] = {}
+    for d in sorted(raw_dir.glob("event_date=*")):
+        files = sorted(d.glob("*.parquet"))
+        if files:
+            st = [f.stat() for f in files]
+            parts[date.fromisoformat(d.name.split("=", 1)[1])] = (
+                [str(f) for f in files], sum(s.st_size for s in st), max(s.st_mtime_ns for s in st))
+    return parts
+
+def check_guardrails(con: duckdb.DuckDBPyConnection) -> dict:
+    # Basic guardrails (engineer-friendly), evaluated in SQL over the incremental output
+    cols = [r[0] for r in con.execute("DESCRIBE features").fetchall()]
+    null_exprs = ", ".join(f"avg(CASE WHEN \"{c}\" IS NULL THEN 1.0 ELSE 0.0 END)" for c in cols)
+    rates = con.execute(f"SELECT {null_exprs}, count(*), count(DISTINCT user_id) FROM features").fetchone()
+    max_null, (rows, users) = max((r or 0.0) for r in rates[:-2]), rates[-2:]
+    if max_null > 0.05:
+        raise ValueError("Feature null rate too high — check feature logic or raw data quality.")
+    if rows != users:
+        raise ValueError("User-level features must be unique per user_id.")
+    return {"max_null_rate": round(float(max_null), 6), "users": int(users)}
 
 def main() -> None:
     cfg = json.loads(Path("config/config.json").read_text())
-    raw_path = Path(cfg["raw_path"])
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--full-refresh", action="store_true", help="drop the store and rebuild the window")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    raw_dir = Path(cfg["raw_path"])
     feat_path = Path(cfg["features_path"])
+    store_path = Path(cfg["feature_store_path"])
     ensure_dir(feat_path.parent)
+    ensure_dir(store_path.parent)
 
-    df = pd.read_csv(raw_path)
+    parts = raw_partitions(raw_dir)
+    if not parts:
+        raise SystemExit(f"No raw partitions under {raw_dir}; run generate_raw_usage_data.py first.")
 
-    con = duckdb.connect(database=":memory:")
-    con.register("raw_usage", df)
+    con = duckdb.connect(str(store_path))
+    for ddl in STATE_DDL:
+        con.execute(ddl)
+    known = {d: (size, mtime) for d, size, mtime in con.execute("SELECT * FROM partitions").fetchall()}
+    window_end = max(known) if known else None
 
-    features = con.execute(FEATURE_SQL).fetchdf()
+    # Anything already folded into the current window that was rewritten, or a backfill inside it,
+    # invalidates the running sums: rebuild from the raw partitions
+    rebuilt = known and window_end is not None and (
+        any(d > window_end - timedelta(days=WINDOW_DAYS) and (d not in parts or parts[d][1:] != sig)
+            for d, sig in known.items())
+        or any(d <= window_end for d in parts if d not in known))
+    full_refresh = bool(args.full_refresh or rebuilt)
+    con.execute("BEGIN")
+    if full_refresh:
+        for table in ("daily_user", "window_state", "partitions"):
+            con.execute(f"DELETE FROM {table}")
+        known, window_end = {}, None
 
-    # Basic guardrails (engineer-friendly)
-    if features.isna().mean().max() > 0.05:
-        raise ValueError("Feature null rate too high — check feature logic or raw data quality.")
-    if features["user_id"].duplicated().any():
-        raise ValueError("User-level features must be unique per user_id.")
+    new_dates = sorted(d for d in parts if d not in known)
+    if new_dates:
+        window_end = max(new_dates)
+    window_start = window_end - timedelta(days=WINDOW_DAYS - 1)
+    # Days that would expire immediately are never read
+    load = [d for d in new_dates if d >= window_start]
+
+    if load:
+        con.execute(NEW_DAYS_SQL, [[f for d in load for f in parts[d][0]]])
+    else:
+        con.execute("CREATE OR REPLACE TEMP TABLE new_days AS SELECT * FROM daily_user LIMIT 0")
+    expired = con.execute("SELECT count(*) FROM daily_user WHERE event_date < ?",
+                          [window_start]).fetchone()[0]
+    if load or expired:
+        con.execute(MERGE_SQL, [window_start])
+        con.execute("DELETE FROM daily_user WHERE event_date < ?", [window_start])
+        con.execute("INSERT INTO daily_user SELECT * FROM new_days")
+    if new_dates:
+        con.executemany("INSERT INTO partitions VALUES (?, ?, ?)",
+                        [(d, parts[d][1], parts[d][2]) for d in new_dates])
+    con.execute("COMMIT")
+
+    con.execute(FEATURE_SQL, [cfg["labels_path"]])
+    guard = check_guardrails(con)
+    con.execute(f"COPY features TO '{feat_path}' (FORMAT PARQUET)")
+    # Keep the online store (latest vector per user) in sync with the batch features
+    online = write_online_store(con, "features", Path(cfg["online_store_path"]), ["plan", "country"])
+    con.close()
 
-    features.to_parquet(feat_path, index=False)
-    print(f"Wrote features: {feat_path.resolve()} ({len(features):,} users)")
+    print(json.dumps({"features_path": str(feat_path.resolve()), "feature_store": str(store_path.resolve()),
+                      "full_refresh": full_refresh, "new_partitions": len(new_dates),
+                      "loaded_days": len(load), "expired_user_days": int(expired),
+                      "window": [window_start.isoformat(), window_end.isoformat()],
+                      **guard, "online_generation": online["generation"],
+                      "seconds": round(time.perf_counter() - t0, 3)}, indent=2))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,79 @@
+from __future__ import annotations
+import json
+from pathlib import Path
+from typing import Any
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Compiled form of the churn Pipeline (OneHotEncoder(handle_unknown="ignore") + passthrough numerics +
+# LogisticRegression): per-categorical {category: coefficient} tables, one weight per numeric column and
+# the intercept. logit = intercept + sum(table[col][value]) + sum(w_j * x_j); unknown categories add 0.
+
+def compile_pipeline(pipe, categoricals: list[str], numerics: list[str]) -> dict:
+    pre, clf = pipe.named_steps["pre"], pipe.named_steps["clf"]
+    coef = clf.coef_[0]
+    cat_coef = coef[pre.output_indices_["cat"]]
+    tables, pos = {}, 0
+    for col, cats in zip(categoricals, pre.named_transformers_["cat"].categories_):
+        tables[col] = {str(c): float(w) for c, w in zip(cats, cat_coef[pos:pos + len(cats)])}
+        pos += len(cats)
+    return {
+        "kind": "logistic_regression",
+        "intercept": float(clf.intercept_[0]),
+        "categoricals": tables,
+        "numerics": {col: float(w) for col, w in zip(numerics, coef[pre.output_indices_["num"]])},
+    }
+
+def _column(data: Any, name: str) -> Any:
+    if isinstance(data, (pa.Table, pa.RecordBatch)):
+        return data.column(name)
+    return data[name]
+
+class CompiledScorer:
+    def __init__(self, compiled: dict):
+        self.compiled = compiled
+        self.intercept = float(compiled["intercept"])
+        self.tables = compiled["categoricals"]
+        self.numerics = list(compiled["numerics"])
+        self.weights = np.array([compiled["numerics"][c] for c in self.numerics], dtype=np.float64)
+
+    @classmethod
+    def load(cls, path: Path) -> "CompiledScorer":
+        return cls(json.loads(Path(path).read_text()))
+
+    def save(self, path: Path) -> None:
+        Path(path).write_text(json.dumps(self.compiled, indent=2))
+
+    def _category_terms(self, values: Any, table: dict[str, float]) -> np.ndarray:
+        # Encode once (hash-based), then one lookup per distinct value and a gather per row
+        if isinstance(values, (pa.Array, pa.ChunkedArray)):
+            arr = values.combine_chunks() if isinstance(values, pa.ChunkedArray) else values
+            if not pa.types.is_dictionary(arr.type):
+                arr = pc.dictionary_encode(arr)
+            uniques = arr.dictionary.to_pylist()
+            codes = arr.indices.fill_null(-1).to_numpy(zero_copy_only=False).astype(np.int64)
+        else:
+            codes, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=True)
+        lut = np.array([table.get(str(u), 0.0) for u in uniques] + [0.0], dtype=np.float64)
+        return lut[codes]  # code -1 (missing) -> trailing 0.0
+
+    def decision_function(self, data: Any) -> np.ndarray:
+        logit = None
+        for col, w in zip(self.numerics, self.weights):
+            x = _column(data, col)
+            if isinstance(x, (pa.Array, pa.ChunkedArray)):
+                x = x.to_numpy(zero_copy_only=False)
+            x = np.asarray(x)
+            term = x.astype(np.float64, copy=False) * w
+            logit = term if logit is None else logit + term
+        for col, table in self.tables.items():
+            term = self._category_terms(_column(data, col), table)
+            logit = term if logit is None else logit + term
+        return logit + self.intercept
+
+    def predict_proba(self, data: Any) -> np.ndarray:
+        # P(churn); same logistic function sklearn applies to the decision function
+        with np.errstate(over="ignore"):
+            return 1.0 / (1.0 + np.exp(-self.decision_function(data)))
@@ -1,81 +1,141 @@
 from __future__ import annotations
-import json
+import argparse, json, os, shutil, time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import date, timedelta
 import numpy as np
-import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import duckdb
 from shared.utils import ensure_dir
 
-def main() -> None:
-    cfg = json.loads(Path("config/config.json").read_text())
-    raw_path = Path(cfg["raw_path"])
-    ensure_dir(raw_path.parent)
+PLANS = ["basic", "pro", "enterprise"]
+COUNTRIES = ["US", "CA", "GB", "AU", "DE", "IN"]
+USER_BLOCK = 1_000_000  # users per row group; also the unit of per-user seeding
+LABEL_SEED = 303
+
+def user_attributes(seed: int, block: int, n: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Same users every day: attributes depend only on (seed, block)
+    rng = np.random.default_rng(np.random.SeedSequence([seed, 0, block]))
+    plan = rng.choice(3, p=[0.72, 0.25, 0.03], size=n).astype(np.int8)
+    tenure_days = rng.integers(1, 900, size=n).astype(np.int32)
+    country = rng.choice(6, p=[0.55, 0.12, 0.10, 0.08, 0.08, 0.07], size=n).astype(np.int8)
+    return plan, tenure_days, country
 
-    rng = np.random.default_rng(202)
-    n_users = 5000
-    user_ids = np.arange(1, n_users+1)
+def day_block(seed: int, d: int, block: int, n_users: int) -> pa.RecordBatch:
+    lo = block * USER_BLOCK
+    n = min(USER_BLOCK, n_users - lo)
+    plan, tenure_days, country = user_attributes(seed, block, n)
+    rng = np.random.default_rng(np.random.SeedSequence([seed, d + 1, block]))
+    active_mask = rng.random(n) < 0.60  # daily activity probability
+    sessions = rng.poisson(lam=2.2, size=n) * active_mask
+    tickets = rng.poisson(lam=0.08, size=n) * active_mask
+    # usage minutes depends on plan
+    base = np.array([18.0, 32.0, 55.0])[plan]
+    usage = (rng.normal(base, 9).clip(0) * active_mask).round(1)
+    # payments
+    mrr = np.array([19.0, 49.0, 199.0])[plan]
+    return pa.RecordBatch.from_arrays([
+        pa.array(np.arange(lo + 1, lo + n + 1, dtype=np.int64)),
+        pa.DictionaryArray.from_arrays(plan, PLANS),
+        pa.DictionaryArray.from_arrays(country, COUNTRIES),
+        pa.array(tenure_days + d),
+        pa.array(sessions.astype(np.int32)),
+        pa.array(tickets.astype(np.int32)),
+        pa.array(usage),
+        pa.array(mrr),
+    ], names=["user_id", "plan", "country", "tenure_days", "sessions", "support_tickets", "usage_minutes",
+              "mrr_usd"])
 
-    start = datetime(2025, 7, 1)
-    days = 120
+def write_day(raw_dir: Path, seed: int, start: date, d: int, n_users: int) -> int:
+    # One Hive partition per event_date, one row group per user block; seeds depend only on (seed, day, block)
+    part = ensure_dir(raw_dir / f"event_date={(start + timedelta(days=d)).isoformat()}")
+    writer = None
+    for block in range(-(-n_users // USER_BLOCK)):
+        batch = day_block(seed, d, block, n_users)
+        if writer is None:
+            writer = pq.ParquetWriter(part / "part-0.parquet", batch.schema, compression="zstd")
+        writer.write_batch(batch)
+    writer.close()
+    return n_users
 
-    # user base attributes
-    plan = rng.choice(["basic","pro","enterprise"], p=[0.72,0.25,0.03], size=n_users)
-    tenure_days = rng.integers(1, 900, size=n_users)
-    country = rng.choice(["US","CA","GB","AU","DE","IN"], p=[0.55,0.12,0.10,0.08,0.08,0.07], size=n_users)
+def write_labels(raw_dir: Path, labels_path: Path, start: date, days: int) -> int:
+    # Label is assigned at user-level based on last 30d behavior; DuckDB streams the aggregate over those
+    # partitions only, so the full table is never materialised
+    last30 = [str(raw_dir / f"event_date={(start + timedelta(days=d)).isoformat()}" / "part-0.parquet")
+              for d in range(max(0, days - 30), days)]
+    con = duckdb.connect()
+    result = con.execute("""
+        SELECT user_id,
+               sum(sessions) AS sessions_30,
+               sum(support_tickets) AS tickets_30,
+               sum(usage_minutes) AS usage_30,
+               max(tenure_days) AS tenure_end,
+               any_value(plan)::VARCHAR AS plan
+        FROM read_parquet(?)
+        GROUP BY user_id
+        ORDER BY user_id""", [last30])
+    # to_arrow_reader on newer DuckDB, fetch_record_batch on older releases
+    reader = getattr(result, "to_arrow_reader", result.fetch_record_batch)(USER_BLOCK)
+    writer, n = None, 0
+    for block, batch in enumerate(reader):
+        agg = {c: batch.column(c).to_numpy(zero_copy_only=False) for c in batch.schema.names}
+        # Churn probability increases with tickets, low usage, short tenure, and basic plan
+        risk = (
+            0.10
+            + 0.04 * (agg["tickets_30"] > 2)
+            + 0.06 * (agg["usage_30"] < 250)
+            + 0.05 * (agg["sessions_30"] < 20)
+            + 0.03 * (agg["tenure_end"] < 90)
+            + 0.03 * (agg["plan"] == "basic")
+            - 0.02 * (agg["plan"] == "enterprise")
+        ).clip(0.02, 0.55)
+        rng = np.random.default_rng(np.random.SeedSequence([LABEL_SEED, block]))
+        churn = (rng.random(risk.size) < risk).astype(np.int8)
+        out = pa.RecordBatch.from_arrays([batch.column("user_id"), pa.array(churn)],
+                                         names=["user_id", "churn_30d"])
+        if writer is None:
+            writer = pq.ParquetWriter(labels_path, out.schema)
+        writer.write_batch(out)
+        n += out.num_rows
+    writer.close()
+    con.close()
+    return n
 
-    rows = []
-    for d in range(days):
-        dt = start + timedelta(days=d)
-        active_mask = rng.random(n_users) < 0.60  # daily activity probability
-        sessions = rng.poisson(lam=2.2, size=n_users) * active_mask
-        tickets = rng.poisson(lam=0.08, size=n_users) * active_mask
-        # usage minutes depends on plan
-        base = np.where(plan=="basic", 18, np.where(plan=="pro", 32, 55))
-        usage = (rng.normal(base, 9, size=n_users).clip(0) * active_mask).round(1)
-        # payments
-        mrr = np.where(plan=="basic", 19.0, np.where(plan=="pro", 49.0, 199.0))
-        rows.append(pd.DataFrame({
-            "event_date": dt.date().isoformat(),
-            "user_id": user_ids,
-            "plan": plan,
-            "country": country,
-            "tenure_days": tenure_days + d,
-            "sessions": sessions,
-            "support_tickets": tickets,
-            "usage_minutes": usage,
-            "mrr_usd": mrr
-        }))
+def positive_int(value: str) -> int:
+    # With no users or no days there is nothing to write: the Parquet writers are never opened
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be >= 1, got {n}")
+    return n
 
-    df = pd.concat(rows, ignore_index=True)
+def main() -> None:
+    cfg = json.loads(Path("config/config.json").read_text())
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=positive_int, default=5000)
+    ap.add_argument("--days", type=positive_int, default=120)
+    ap.add_argument("--start", default="2025-07-01")
+    ap.add_argument("--seed", type=int, default=202)
+    ap.add_argument("--workers", type=int, default=0, help="day-generating processes (0 = one per CPU)")
+    args = ap.parse_args()
 
-    # Create churn label: probability increases with tickets, low usage, short tenure, and basic plan
-    # label is assigned at user-level based on last 30d behavior
-    last30 = df[df["event_date"] >= (start + timedelta(days=days-30)).date().isoformat()]
-    agg = last30.groupby("user_id").agg(
-        sessions_30=("sessions","sum"),
-        tickets_30=("support_tickets","sum"),
-        usage_30=("usage_minutes","sum"),
-        tenure_end=("tenure_days","max"),
-        plan=("plan","last"),
-        mrr=("mrr_usd","last")
-    )
-    rng2 = np.random.default_rng(303)
-    risk = (
-        0.10
-        + 0.04 * (agg["tickets_30"] > 2).astype(float)
-        + 0.06 * (agg["usage_30"] < 250).astype(float)
-        + 0.05 * (agg["sessions_30"] < 20).astype(float)
-        + 0.03 * (agg["tenure_end"] < 90).astype(float)
-        + 0.03 * (agg["plan"] == "basic").astype(float)
-        - 0.02 * (agg["plan"] == "enterprise").astype(float)
-    ).clip(0.02, 0.55)
+    t0 = time.perf_counter()
+    raw_dir = Path(cfg["raw_path"])
+    labels_path = Path(cfg["labels_path"])
+    shutil.rmtree(raw_dir, ignore_errors=True)
+    ensure_dir(raw_dir)
+    ensure_dir(labels_path.parent)
+    start = date.fromisoformat(args.start)
 
-    churn = (rng2.random(len(risk)) < risk).astype(int)
-    churn_df = pd.DataFrame({"user_id": agg.index.values, "churn_30d": churn})
-    df = df.merge(churn_df, on="user_id", how="left")
+    workers = args.workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as pool:
+        rows = sum(pool.map(write_day, [raw_dir] * args.days, [args.seed] * args.days, [start] * args.days,
+                            range(args.days), [args.users] * args.days))
+    labelled = write_labels(raw_dir, labels_path, start, args.days)
 
-    df.to_csv(raw_path, index=False)
-    print(f"Wrote raw usage data: {raw_path.resolve()} ({len(df):,} rows)")
+    print(json.dumps({"raw_path": str(raw_dir.resolve()), "labels_path": str(labels_path.resolve()),
+                      "users": args.users, "days": args.days, "rows": rows, "labelled_users": labelled,
+                      "workers": workers, "seconds": round(time.perf_counter() - t0, 2)}, indent=2))
 
 if __name__ == "__main__":
     main()
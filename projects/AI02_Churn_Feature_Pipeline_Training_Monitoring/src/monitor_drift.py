@@ -1,48 +1,66 @@
 from __future__ import annotations
-import json
+import argparse, json
 from pathlib import Path
 import numpy as np
-import pandas as pd
-import joblib
-from scipy.stats import ks_2samp
+import pyarrow.parquet as pq
 from shared.utils import ensure_dir, utcnow_iso
+from sketches import Histogram, ks, merge, psi, read_sketch, sketch
+
+# Drift is computed from sketches only: the training baseline (artifacts/drift_baseline.json) against the
+# merged histograms that batch_score.py wrote for the last --days scoring runs. Cost is independent of rows.
+
+def shifted_sketch(feat_path: Path, edges: dict[str, np.ndarray]) -> dict[str, Histogram]:
+    # Demo "current" batch: the feature table with a mild behaviour shift, sketched one row group at a time
+    rng = np.random.default_rng(77)
+    pf = pq.ParquetFile(feat_path)
+    parts = []
+    for rg in range(pf.metadata.num_row_groups):
+        cols = pf.read_row_group(rg, columns=[c for c in edges if c in pf.schema_arrow.names])
+        data = {c: cols.column(c).to_numpy(zero_copy_only=False).astype(float) for c in cols.column_names}
+        data["usage_30"] = (data["usage_30"] * rng.normal(0.96, 0.05, size=cols.num_rows)).clip(0)
+        data["tickets_30"] = (data["tickets_30"] + rng.poisson(0.1, size=cols.num_rows)).clip(0)
+        parts.append(sketch(data, {c: edges[c] for c in data}))
+    return merge(parts)
 
 def main() -> None:
     cfg = json.loads(Path("config/config.json").read_text())
-    feat_path = Path(cfg["features_path"])
-    model_path = Path(cfg["model_path"])
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--days", type=int, default=1, help="merge the sketches of the last N scoring days")
+    ap.add_argument("--simulate-shift", action="store_true",
+                    help="compare against a shifted copy of the feature table instead of scoring sketches")
+    args = ap.parse_args()
+
     drift_path = Path(cfg["drift_report_path"])
     ensure_dir(drift_path.parent)
+    base_meta, baseline = read_sketch(Path(cfg["drift_baseline_path"]))
 
-    df = pd.read_parquet(feat_path)
-
-    # Simulate "current" batch by adding mild behavior shift
-    rng = np.random.default_rng(77)
-    current = df.copy()
-    current["usage_30"] = (current["usage_30"] * rng.normal(0.96, 0.05, size=len(current))).clip(0)
-    current["tickets_30"] = (current["tickets_30"] + rng.poisson(0.1, size=len(current))).clip(0)
-
-    baseline = df.sample(frac=0.5, random_state=1)
-    current = current.sample(frac=0.5, random_state=2)
-
-    artifact = joblib.load(model_path)["metadata"]
-    numeric_cols = artifact["numerics"]
+    if args.simulate_shift:
+        sources = [cfg["features_path"] + " (simulated shift)"]
+        current = shifted_sketch(Path(cfg["features_path"]), {c: h.edges for c, h in baseline.items()})
+    else:
+        files = sorted(Path(cfg["sketch_dir"]).glob("scored_date=*.json"))[-args.days:]
+        if not files:
+            raise SystemExit("No drift sketches; run batch_score.py first (or pass --simulate-shift).")
+        sources = [f.name for f in files]
+        current = merge([read_sketch(f)[1] for f in files])
 
     drift = []
-    for col in numeric_cols:
-        a = baseline[col].astype(float).values
-        b = current[col].astype(float).values
-        stat, p = ks_2samp(a, b)
-        drift.append({"feature": col, "ks_stat": float(stat), "p_value": float(p)})
+    for col, base in baseline.items():
+        if col not in current:
+            continue
+        stat, p = ks(base, current[col])
+        drift.append({"feature": col, "ks_stat": stat, "p_value": p, "psi": psi(base, current[col]),
+                      "null_rate": current[col].nulls / max(current[col].n + current[col].nulls, 1)})
 
-    # Rule: flag if KS > 0.12 and p < 0.01
-    flagged = [d for d in drift if d["ks_stat"] > 0.12 and d["p_value"] < 0.01]
+    # Rule: flag if KS > 0.12 and p < 0.01, or PSI > 0.2
+    flagged = [d for d in drift if (d["ks_stat"] > 0.12 and d["p_value"] < 0.01) or d["psi"] > 0.2]
 
     report = {
         "run_at": utcnow_iso(),
-        "baseline_n": int(len(baseline)),
-        "current_n": int(len(current)),
-        "rule": {"ks_stat_gt": 0.12, "p_value_lt": 0.01},
+        "baseline_n": int(base_meta["rows"]),
+        "current_n": max((h.n + h.nulls for h in current.values()), default=0),
+        "current_sketches": sources,
+        "rule": {"ks_stat_gt": 0.12, "p_value_lt": 0.01, "psi_gt": 0.2},
         "flagged_features": flagged,
         "all_features": sorted(drift, key=lambda x: x["ks_stat"], reverse=True)
     }
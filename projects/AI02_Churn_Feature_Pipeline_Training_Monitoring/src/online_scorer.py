@@ -0,0 +1,124 @@
+from __future__ import annotations
+import argparse, json, threading, time
+from pathlib import Path
+import numpy as np
+import joblib
+from shared.utils import ensure_dir, utcnow_iso
+from online_store import OnlineStore
+from compiled_scorer import CompiledScorer
+
+class OnlineScorer:
+    # Resident scorer: the model is loaded once, features come from the memory-mapped online store.
+    # maybe_reload() swaps in a newly published store (build_features.py) without a restart.
+    # With the compiled artifact, scoring is a gather + dot product straight off the store's arrays;
+    # otherwise the sklearn pipeline from model.joblib scores a small DataFrame.
+    def __init__(self, cfg: dict):
+        self.store_dir = Path(cfg["online_store_path"])
+        compiled = Path(cfg.get("compiled_model_path", ""))
+        self.compiled = CompiledScorer.load(compiled) if compiled.is_file() else None
+        self.model = None if self.compiled else joblib.load(cfg["model_path"])["model"]
+        self.plan = None
+        self.lock = threading.Lock()
+        self.store: OnlineStore | None = None
+        self.version = None
+        self.maybe_reload()
+
+    def maybe_reload(self) -> bool:
+        try:
+            meta_path = self.store_dir / "meta.json"
+            version = (meta_path.stat().st_mtime_ns, json.loads(meta_path.read_text()).get("generation"))
+            if version == self.version:
+                return False
+            store = OnlineStore(self.store_dir)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False  # mid-publish; try again on the next poll
+        plan = self._bind(store) if self.compiled else None
+        with self.lock:
+            self.store, self.version, self.plan = store, version, plan
+        return True
+
+    def _bind(self, store: OnlineStore) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+        # Align compiled weights to the store's numeric column order; per-categorical code -> coefficient.
+        # The store must carry exactly the model's columns: a missing or extra one would otherwise score as 0.
+        numerics, tables = self.compiled.compiled["numerics"], self.compiled.tables
+        cols, cats = store.meta["numerics"], store.meta["categoricals"]
+        for kind, model_cols, store_cols in (("numeric", numerics, cols), ("categorical", tables, cats)):
+            if set(model_cols) != set(store_cols):
+                raise ValueError(f"{kind} columns differ between model and store {self.store_dir}: "
+                                 f"model only {sorted(set(model_cols) - set(store_cols))}, "
+                                 f"store only {sorted(set(store_cols) - set(model_cols))}")
+        weights = np.array([numerics[c] for c in cols])
+        # Category levels the model never saw add 0, as OneHotEncoder(handle_unknown="ignore") does
+        luts = {c: np.array([tables[c].get(str(v), 0.0) for v in levels] + [0.0])
+                for c, levels in cats.items()}
+        return weights, luts
+
+    def score_many(self, user_ids) -> np.ndarray:
+        # Churn risk per id; NaN for users not in the store
+        with self.lock:
+            store, plan = self.store, self.plan
+        if plan is None:
+            X, found = store.frame(user_ids)
+            out = np.full(found.size, np.nan)
+            if found.any():
+                out[found] = self.model.predict_proba(X)[:, 1]
+            return out
+        weights, luts = plan
+        pos, found = store.rows(user_ids)
+        pos = pos[found]
+        logit = np.asarray(store.numerics[pos]) @ weights + self.compiled.intercept
+        for c, lut in luts.items():
+            logit += lut[np.asarray(store.codes[c][pos], dtype=np.int64)]
+        out = np.full(found.size, np.nan)
+        out[found] = 1.0 / (1.0 + np.exp(-logit))
+        return out
+
+    def score(self, user_id: int) -> float | None:
+        risk = float(self.score_many([user_id])[0])
+        return None if np.isnan(risk) else risk
+
+def latency(fn, calls: list) -> dict:
+    lat = []
+    for arg in calls:
+        t0 = time.perf_counter()
+        fn(arg)
+        lat.append((time.perf_counter() - t0) * 1000)
+    lat = np.asarray(lat)
+    return {"calls": len(calls), "ms_p50": round(float(np.percentile(lat, 50)), 4),
+            "ms_p99": round(float(np.percentile(lat, 99)), 4), "ms_max": round(float(lat.max()), 4)}
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=2000, help="single-user score() calls in the load test")
+    ap.add_argument("--batch", type=int, default=100, help="ids per score_many() call")
+    ap.add_argument("--user-id", type=int, default=None, help="score one user and exit")
+    args = ap.parse_args()
+
+    cfg = json.loads(Path("config/config.json").read_text())
+    out_dir = ensure_dir(Path("outputs"))
+    t0 = time.perf_counter()
+    scorer = OnlineScorer(cfg)
+    load_ms = (time.perf_counter() - t0) * 1000
+    if scorer.store is None:
+        raise SystemExit("No online store; run build_features.py first.")
+    if args.user_id is not None:
+        print(json.dumps({"user_id": args.user_id, "churn_risk": scorer.score(args.user_id)}))
+        return
+
+    rng = np.random.default_rng(0)
+    ids = np.asarray(scorer.store.user_ids)
+    singles = [int(u) for u in rng.choice(ids, size=args.requests)]
+    batches = [rng.choice(ids, size=args.batch) for _ in range(max(1, args.requests // args.batch))]
+    scorer.score(singles[0])  # warm-up
+    report = {
+        "run_at": utcnow_iso(),
+        "users_in_store": len(scorer.store),
+        "startup_ms": round(load_ms, 1),
+        "score": latency(scorer.score, singles),
+        "score_many": {"batch": args.batch, **latency(scorer.score_many, batches)},
+    }
+    (out_dir / "online_latency.json").write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+from __future__ import annotations
+import json, shutil
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import duckdb
+from shared.utils import ensure_dir, utcnow_iso
+
+# Online feature store: the latest feature vector per user as memory-mapped arrays, row-aligned and sorted
+# by user_id so a lookup is one binary search.
+#   user_ids.npy int64 [rows], numerics.npy float64 [rows, k], <cat>.npy int16 codes [rows], meta.json
+# build_features.py republishes it (tmp dir + rename) after every feature build.
+
+BATCH_ROWS = 1_000_000
+
+def write_online_store(con: duckdb.DuckDBPyConnection, table: str, out_dir: Path,
+                       categoricals: list[str], exclude: tuple[str, ...] = ("churn_30d",)) -> dict:
+    cols = [r[0] for r in con.execute(f"DESCRIBE {table}").fetchall()]
+    numerics = [c for c in cols if c not in categoricals and c != "user_id" and c not in exclude]
+    rows = con.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+    levels = {c: [v for (v,) in con.execute(f"SELECT DISTINCT {c} FROM {table} WHERE {c} IS NOT NULL "
+                                            "ORDER BY 1").fetchall()] for c in categoricals}
+
+    tmp = out_dir.with_name(out_dir.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    ensure_dir(tmp)
+    ids = np.lib.format.open_memmap(tmp / "user_ids.npy", mode="w+", dtype=np.int64, shape=(rows,))
+    num = np.lib.format.open_memmap(tmp / "numerics.npy", mode="w+", dtype=np.float64,
+                                    shape=(rows, len(numerics)))
+    cats = {c: np.lib.format.open_memmap(tmp / f"{c}.npy", mode="w+", dtype=np.int16, shape=(rows,))
+            for c in categoricals}
+    result = con.execute(f"SELECT user_id, {', '.join(categoricals + numerics)} FROM {table} "
+                         "ORDER BY user_id")
+    reader = getattr(result, "to_arrow_reader", result.fetch_record_batch)(BATCH_ROWS)
+    pos = 0
+    for batch in reader:
+        n = batch.num_rows
+        ids[pos:pos + n] = batch.column("user_id").to_numpy()
+        for c in categoricals:
+            codes = pc.index_in(batch.column(c).cast(pa.string()), value_set=pa.array(levels[c], pa.string()))
+            cats[c][pos:pos + n] = codes.fill_null(-1).to_numpy()  # -1 = missing
+        for j, c in enumerate(numerics):
+            num[pos:pos + n, j] = batch.column(c).to_numpy(zero_copy_only=False).astype(np.float64)
+        pos += n
+    for arr in (ids, num, *cats.values()):
+        arr.flush()
+    del ids, num, cats
+
+    previous = out_dir / "meta.json"
+    generation = json.loads(previous.read_text()).get("generation", 0) if previous.exists() else 0
+    meta = {"rows": int(rows), "numerics": numerics, "categoricals": levels, "built_at": utcnow_iso(),
+            "generation": generation + 1}
+    (tmp / "meta.json").write_text(json.dumps(meta, indent=2))
+    old = out_dir.with_name(out_dir.name + ".old")
+    shutil.rmtree(old, ignore_errors=True)
+    if out_dir.exists():
+        out_dir.rename(old)
+    tmp.rename(out_dir)
+    shutil.rmtree(old, ignore_errors=True)
+    return meta
+
+class OnlineStore:
+    def __init__(self, store_dir: Path):
+        self.meta = json.loads((store_dir / "meta.json").read_text())
+        self.user_ids = np.load(store_dir / "user_ids.npy", mmap_mode="r")
+        self.numerics = np.load(store_dir / "numerics.npy", mmap_mode="r")
+        self.codes = {c: np.load(store_dir / f"{c}.npy", mmap_mode="r") for c in self.meta["categoricals"]}
+        self.levels = {c: np.asarray(v + [None], dtype=object) for c, v in self.meta["categoricals"].items()}
+
+    def __len__(self) -> int:
+        return int(self.meta["rows"])
+
+    def rows(self, user_ids) -> tuple[np.ndarray, np.ndarray]:
+        # (row positions, found mask); positions of unknown users are meaningless
+        ids = np.atleast_1d(np.asarray(user_ids, dtype=np.int64))
+        pos = np.searchsorted(self.user_ids, ids).clip(0, max(len(self) - 1, 0))
+        found = (self.user_ids[pos] == ids) if len(self) else np.zeros(ids.size, dtype=bool)
+        return pos, found
+
+    def frame(self, user_ids) -> tuple[pd.DataFrame, np.ndarray]:
+        # Feature frame (the columns the training frame had, minus the label) for the found users + found mask
+        ids = np.atleast_1d(np.asarray(user_ids, dtype=np.int64))
+        pos, found = self.rows(ids)
+        pos = pos[found]
+        data = {"user_id": ids[found]}
+        for c in self.codes:
+            # code -1 (missing) indexes the trailing None
+            data[c] = self.levels[c][np.asarray(self.codes[c][pos], dtype=np.int64)]
+        block = np.asarray(self.numerics[pos])
+        for j, c in enumerate(self.meta["numerics"]):
+            data[c] = block[:, j]
+        return pd.DataFrame(data), found
@@ -0,0 +1,115 @@
+from __future__ import annotations
+import argparse, asyncio, json, threading
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import joblib
+from shared.serving import MicroBatcher, serve_json
+from shared.utils import utcnow_iso
+from compiled_scorer import CompiledScorer
+
+class ScoringService:
+    # Holds the warm model; train_model.py rewrites the artifacts and we swap the new version in
+    def __init__(self, cfg: dict, engine: str = "compiled"):
+        self.engine = engine
+        self.path = Path(cfg["compiled_model_path"] if engine == "compiled" else cfg["model_path"])
+        self.lock = threading.Lock()
+        self.model = None
+        self.categoricals: list[str] = []
+        self.numerics: list[str] = []
+        self.version = None
+        self.reloads = 0
+        self.maybe_reload()
+        if self.model is None:
+            raise SystemExit(f"No model at {self.path}; run train_model.py first.")
+
+    def maybe_reload(self) -> bool:
+        try:
+            version = self.path.stat().st_mtime_ns
+            if version == self.version:
+                return False
+            if self.engine == "compiled":
+                model = CompiledScorer.load(self.path)
+                cats, nums = list(model.tables), model.numerics
+            else:
+                artifact = joblib.load(self.path)
+                model = artifact["model"]
+                cats, nums = artifact["metadata"]["categoricals"], artifact["metadata"]["numerics"]
+        except (FileNotFoundError, json.JSONDecodeError, EOFError):
+            return False  # mid-write; try again on the next poll
+        with self.lock:
+            self.model, self.categoricals, self.numerics, self.version = model, cats, nums, version
+            self.reloads += 1
+        return True
+
+    def validate(self, row: dict) -> dict:
+        # Reject bad payloads per request (400) so they never fail the batch they would have joined
+        if not isinstance(row, dict):
+            raise TypeError("features must be a JSON object")
+        missing = [c for c in self.categoricals + self.numerics if row.get(c) is None]
+        if missing:
+            raise ValueError(f"missing features: {missing}")
+        bad = [c for c in self.numerics if isinstance(row[c], bool) or not isinstance(row[c], (int, float))]
+        if bad:
+            raise ValueError(f"non-numeric features: {bad}")
+        bad = [c for c in self.categoricals if not isinstance(row[c], str)]
+        if bad:
+            raise ValueError(f"non-string categorical features: {bad}")
+        return row
+
+    def run_batch(self, rows: list[dict]) -> list[float]:
+        # One vectorized call per micro-batch, whichever engine is loaded
+        with self.lock:
+            model, cats, nums = self.model, self.categoricals, self.numerics
+        if self.engine == "compiled":
+            data = {c: np.asarray([r[c] for r in rows], dtype=object) for c in cats}
+            data.update({c: np.asarray([r[c] for r in rows], dtype=np.float64) for c in nums})
+            return model.predict_proba(data).tolist()
+        return model.predict_proba(pd.DataFrame(rows, columns=["user_id", *cats, *nums]))[:, 1].tolist()
+
+def routes(service: ScoringService, batcher: MicroBatcher) -> dict:
+    async def score(body: dict) -> dict:
+        row = service.validate(body.get("features", body))
+        risk = await batcher.submit(row)
+        return {"scored_at": utcnow_iso(), "user_id": row.get("user_id"), "churn_risk": risk}
+
+    async def health(_: dict) -> dict:
+        return {"engine": service.engine, "model_path": str(service.path), "model_version": service.version,
+                "reloads": service.reloads, **batcher.metrics()}
+
+    return {("POST", "/score"): score, ("GET", "/health"): health}
+
+async def serve(args: argparse.Namespace, cfg: dict) -> None:
+    service = ScoringService(cfg, args.engine)
+    batcher = MicroBatcher(service.run_batch, args.max_batch, args.linger_ms)
+
+    async def watch() -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(args.reload_interval)
+            if await loop.run_in_executor(None, service.maybe_reload):
+                print(json.dumps({"reloaded_at": utcnow_iso(), "model_path": str(service.path)}))
+
+    server = await serve_json(routes(service, batcher), args.host, args.port, args.unix)
+    print(json.dumps({"listening": args.unix or f"http://{args.host}:{args.port}", "engine": args.engine,
+                      "max_batch": args.max_batch, "linger_ms": args.linger_ms}))
+    async with server:
+        await asyncio.gather(server.serve_forever(), batcher.run(), watch())
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8766)
+    ap.add_argument("--unix", default=None, help="serve on a Unix socket instead of TCP")
+    ap.add_argument("--max-batch", type=int, default=256, help="max concurrent rows coalesced per batch")
+    ap.add_argument("--linger-ms", type=float, default=2.0, help="how long a batch waits for more rows")
+    ap.add_argument("--engine", choices=["compiled", "sklearn"], default="compiled",
+                    help="compiled lookup tables (default) or the sklearn pipeline from model.joblib")
+    ap.add_argument("--reload-interval", type=float, default=2.0, help="seconds between model version checks")
+    args = ap.parse_args()
+
+    cfg = json.loads(Path("config/config.json").read_text())
+    asyncio.run(serve(args, cfg))
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,88 @@
 from __future__ import annotations
-import json
+import argparse, itertools, json, os, time, warnings
 from pathlib import Path
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
+from joblib import Parallel, delayed
+from sklearn.model_selection import StratifiedKFold, train_test_split
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import OneHotEncoder
 from sklearn.pipeline import Pipeline
 from sklearn.linear_model import LogisticRegression
+from sklearn.exceptions import ConvergenceWarning
 from sklearn.metrics import roc_auc_score, accuracy_score, classification_report
 import joblib
 from shared.utils import ensure_dir, utcnow_iso
+from compiled_scorer import CompiledScorer, compile_pipeline
+from sketches import fit_edges, sketch, write_sketch
+
+SEARCH_MAX_ITER = 1000
+
+def fit_candidate(Z: np.ndarray, y: np.ndarray, train_idx: np.ndarray, valid_idx: np.ndarray,
+                  params: dict) -> tuple[float, float, bool]:
+    t0 = time.perf_counter()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", ConvergenceWarning)  # recorded per fold instead
+        clf = LogisticRegression(max_iter=SEARCH_MAX_ITER, **params).fit(Z[train_idx], y[train_idx])
+    fit_seconds = time.perf_counter() - t0
+    auc = float(roc_auc_score(y[valid_idx], clf.predict_proba(Z[valid_idx])[:, 1]))
+    return auc, fit_seconds, bool(clf.n_iter_[0] < SEARCH_MAX_ITER)
+
+def search(pre: ColumnTransformer, X_train: pd.DataFrame, y_train: pd.Series, grid: dict, folds: int,
+           n_jobs: int) -> tuple[LogisticRegression, dict]:
+    # The ColumnTransformer is fitted once and its design matrix shared by every (candidate, fold) fit; the
+    # only train-fold information it carries is the category vocabulary (numerics are passthrough).
+    # joblib memory-maps Z for the worker processes instead of pickling it per task.
+    t0 = time.perf_counter()
+    Z = pre.fit_transform(X_train)
+    Z = np.ascontiguousarray(Z.toarray() if hasattr(Z, "toarray") else Z, dtype=np.float64)
+    y = y_train.to_numpy()
+    prep_seconds = time.perf_counter() - t0
+
+    splits = list(StratifiedKFold(folds, shuffle=True, random_state=42).split(Z, y))
+    candidates = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    t1 = time.perf_counter()
+    results = Parallel(n_jobs=n_jobs)(delayed(fit_candidate)(Z, y, tr, va, params)
+                                      for params in candidates for tr, va in splits)
+    search_seconds = time.perf_counter() - t1
+
+    scored = []
+    for i, params in enumerate(candidates):
+        aucs, secs, converged = zip(*results[i * folds:(i + 1) * folds])
+        scored.append({"params": params, "mean_auc": float(np.mean(aucs)), "std_auc": float(np.std(aucs)),
+                       "fold_auc": [round(a, 6) for a in aucs], "fit_seconds": [round(s, 4) for s in secs],
+                       "total_fit_seconds": round(float(sum(secs)), 4),
+                       "converged_folds": int(sum(converged))})
+    best = max(scored, key=lambda c: c["mean_auc"])
+    t2 = time.perf_counter()
+    clf = LogisticRegression(max_iter=SEARCH_MAX_ITER, **best["params"]).fit(Z, y)
+    return clf, {
+        "folds": folds,
+        "n_jobs": n_jobs,
+        "design_matrix_shape": list(Z.shape),
+        "preprocess_seconds": round(prep_seconds, 4),
+        "search_seconds": round(search_seconds, 4),
+        "refit_seconds": round(time.perf_counter() - t2, 4),
+        "best_params": best["params"],
+        "best_mean_auc": best["mean_auc"],
+        "candidates": sorted(scored, key=lambda c: c["mean_auc"], reverse=True),
+    }
+
+def n_jobs_arg(value: str) -> int:
+    # joblib rejects 0; -1 means all cores
+    n = int(value)
+    if n < 1 and n != -1:
+        raise argparse.ArgumentTypeError(f"must be >= 1 or -1, got {n}")
+    return n
 
 def main() -> None:
     cfg = json.loads(Path("config/config.json").read_text())
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--search", action="store_true",
+                    help="k-fold CV search over search_grid before the final fit")
+    ap.add_argument("--folds", type=int, default=int(cfg.get("search_folds", 5)))
+    ap.add_argument("--n-jobs", type=n_jobs_arg, default=-1, help="parallel CV fits (-1 = all cores)")
+    args = ap.parse_args()
     feat_path = Path(cfg["features_path"])
     model_path = Path(cfg["model_path"])
     ensure_dir(model_path.parent)
@@ -37,10 +106,28 @@ def main() -> None:
 
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.22, random_state=42, stratify=y)
 
-    pipe.fit(X_train, y_train)
+    search_meta = None
+    if args.search:
+        n_jobs = (os.cpu_count() or 1) if args.n_jobs < 0 else args.n_jobs
+        clf, search_meta = search(pre, X_train, y_train, cfg["search_grid"], args.folds, n_jobs)
+        pipe = Pipeline([("pre", pre), ("clf", clf)])  # both steps already fitted on X_train
+    else:
+        pipe.fit(X_train, y_train)
     proba = pipe.predict_proba(X_test)[:,1]
     pred = (proba >= 0.5).astype(int)
 
+    # Lookup-table form of the fitted pipeline for NumPy/Arrow scoring without sklearn overhead
+    compiled = CompiledScorer(compile_pipeline(pipe, cat, num))
+    compiled_diff = float(np.abs(compiled.predict_proba(X_test) - proba).max())
+    if compiled_diff > 1e-9:
+        raise ValueError(f"Compiled scorer diverges from predict_proba (max abs diff {compiled_diff:.3g})")
+
+    # Drift baseline: fixed-edge histograms of the training population (features + predicted risk)
+    train_risk = compiled.predict_proba(X_train)
+    base_cols = {c: X_train[c].to_numpy(dtype=float) for c in num}
+    base_cols["churn_risk"] = train_risk
+    baseline = sketch(base_cols, {c: fit_edges(v) for c, v in base_cols.items()})
+
     auc = float(roc_auc_score(y_test, proba))
     acc = float(accuracy_score(y_test, pred))
 
@@ -52,10 +139,19 @@ def main() -> None:
         "n_test": int(len(X_test)),
         "feature_columns": list(X.columns),
         "categoricals": cat,
-        "numerics": num
+        "numerics": num,
+        "compiled_model_path": cfg["compiled_model_path"],
+        "compiled_max_abs_diff": compiled_diff,
+        "drift_baseline_path": cfg["drift_baseline_path"],
+        "params": {k: pipe.named_steps["clf"].get_params()[k] for k in ("C", "class_weight", "max_iter")}
     }
+    if search_meta:
+        artifact["search"] = search_meta
 
     joblib.dump({"model": pipe, "metadata": artifact}, model_path)
+    compiled.save(Path(cfg["compiled_model_path"]))
+    write_sketch(Path(cfg["drift_baseline_path"]), baseline, created_at=artifact["trained_at"],
+                 rows=int(len(X_train)))
 
     print(json.dumps(artifact, indent=2))
 
@@ -0,0 +1,50 @@
+import sys
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from sklearn.compose import ColumnTransformer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+from compiled_scorer import CompiledScorer, compile_pipeline  # noqa: E402
+
+CAT = ["plan", "country"]
+NUM = ["tenure_end", "mrr_usd", "sessions_30", "usage_30"]
+
+def frame(n: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "user_id": np.arange(n),
+        "plan": rng.choice(["basic", "pro", "enterprise"], size=n),
+        "country": rng.choice(["US", "CA", "GB", "DE"], size=n),
+        "tenure_end": rng.integers(1, 900, size=n),
+        "mrr_usd": rng.choice([19.0, 49.0, 199.0], size=n),
+        "sessions_30": rng.poisson(40, size=n),
+        "usage_30": rng.normal(600, 150, size=n),
+    })
+
+def fitted() -> Pipeline:
+    X = frame(2000, 0)
+    y = (X["usage_30"] + np.random.default_rng(1).normal(0, 150, size=len(X)) < 550).astype(int)
+    pre = ColumnTransformer([("cat", OneHotEncoder(handle_unknown="ignore"), CAT),
+                             ("num", "passthrough", NUM)])
+    return Pipeline([("pre", pre), ("clf", LogisticRegression(max_iter=5000))]).fit(X, y)
+
+def test_compiled_matches_predict_proba():
+    pipe = fitted()
+    X = frame(500, 2)
+    X.loc[:9, "country"] = "JP"  # unseen at training: contributes nothing, like handle_unknown="ignore"
+    expected = pipe.predict_proba(X)[:, 1]
+    scorer = CompiledScorer(compile_pipeline(pipe, CAT, NUM))
+    assert np.abs(scorer.predict_proba(X) - expected).max() <= 1e-9
+    assert np.abs(scorer.predict_proba(pa.Table.from_pandas(X)) - expected).max() <= 1e-9
+
+def test_compiled_roundtrip(tmp_path):
+    pipe = fitted()
+    X = frame(100, 3)
+    path = tmp_path / "model_compiled.json"
+    CompiledScorer(compile_pipeline(pipe, CAT, NUM)).save(path)
+    assert np.abs(CompiledScorer.load(path).predict_proba(X) - pipe.predict_proba(X)[:, 1]).max() <= 1e-9
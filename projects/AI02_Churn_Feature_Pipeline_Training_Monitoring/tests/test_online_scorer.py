@@ -0,0 +1,61 @@
+import sys
+from pathlib import Path
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+from compiled_scorer import CompiledScorer, compile_pipeline  # noqa: E402
+from online_scorer import OnlineScorer  # noqa: E402
+from online_store import write_online_store  # noqa: E402
+
+CAT = ["plan", "country"]
+NUM = ["tenure_end", "mrr_usd", "usage_30"]
+
+def features(n: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "user_id": np.arange(n) * 3,
+        "plan": rng.choice(["basic", "pro", "enterprise"], size=n),
+        "country": rng.choice(["US", "CA", "GB"], size=n),
+        "tenure_end": rng.integers(1, 900, size=n),
+        "mrr_usd": rng.choice([19.0, 49.0, 199.0], size=n),
+        "usage_30": rng.normal(600, 150, size=n),
+        "churn_30d": rng.integers(0, 2, size=n),
+    })
+
+def scorer(tmp_path: Path, df: pd.DataFrame, num: list[str],
+           store: pd.DataFrame | None = None) -> tuple[OnlineScorer, Pipeline]:
+    pre = ColumnTransformer([("cat", OneHotEncoder(handle_unknown="ignore"), CAT),
+                             ("num", "passthrough", num)])
+    pipe = Pipeline([("pre", pre), ("clf", LogisticRegression(max_iter=5000))])
+    pipe.fit(df[CAT + num], df["churn_30d"])
+    CompiledScorer(compile_pipeline(pipe, CAT, num)).save(tmp_path / "model_compiled.json")
+    con = duckdb.connect()
+    con.register("features", df if store is None else store)
+    write_online_store(con, "features", tmp_path / "online", CAT)
+    cfg = {"online_store_path": str(tmp_path / "online"),
+           "compiled_model_path": str(tmp_path / "model_compiled.json")}
+    return OnlineScorer(cfg), pipe
+
+def test_score_many_matches_predict_proba(tmp_path):
+    df = features(300)
+    online, pipe = scorer(tmp_path, df, NUM)
+    ids = np.r_[df["user_id"].to_numpy()[::7], 1]  # 1 is not in the store
+    risk = online.score_many(ids)
+    assert np.isnan(risk[-1])
+    assert np.abs(risk[:-1] - pipe.predict_proba(df[CAT + NUM].iloc[::7])[:, 1]).max() <= 1e-9
+
+def test_store_must_match_the_model_columns(tmp_path):
+    df = features(50)
+    # the model uses a column the store lacks: refuse rather than score it as 0
+    with pytest.raises(ValueError, match=r"model only \['mrr_usd'\]"):
+        scorer(tmp_path, df, NUM, store=df.drop(columns="mrr_usd"))
+    # the store carries a column the model never saw
+    with pytest.raises(ValueError, match=r"store only \['mrr_usd'\]"):
+        scorer(tmp_path, df, ["tenure_end", "usage_30"])
@@ -0,0 +1,98 @@
+import json, shutil, sys
+from datetime import date
+from pathlib import Path
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+import pyarrow.parquet as pq
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+import batch_score  # noqa: E402
+import build_features  # noqa: E402
+import generate_raw_usage_data  # noqa: E402
+import train_model  # noqa: E402
+from generate_raw_usage_data import write_day, write_labels  # noqa: E402
+from online_scorer import OnlineScorer  # noqa: E402
+
+CONFIG = {"raw_path": "data/raw_usage", "labels_path": "data/churn_labels.parquet",
+          "feature_store_path": "data/feature_store.duckdb", "features_path": "data/features.parquet",
+          "online_store_path": "data/online_store", "model_path": "artifacts/model.joblib",
+          "compiled_model_path": "artifacts/model_compiled.json",
+          "drift_baseline_path": "artifacts/drift_baseline.json", "predictions_path": "outputs/predictions",
+          "top_risk_path": "outputs/top_risk_users.csv", "top_n": 25, "sketch_dir": "outputs/drift_sketches"}
+DAYS = 45
+
+def run(module, monkeypatch, capsys, *args: str) -> dict:
+    monkeypatch.setattr(sys, "argv", [f"{module.__name__}.py", *args])
+    module.main()
+    return json.loads(capsys.readouterr().out)
+
+def incremental_build(root: Path, monkeypatch, capsys, users: int = 300) -> list[dict]:
+    # All days are generated up front, then published into raw_path a few days per build_features.py run
+    monkeypatch.chdir(root)
+    (root / "config").mkdir()
+    (root / "config" / "config.json").write_text(json.dumps(CONFIG))
+    source, raw = root / "generated", root / CONFIG["raw_path"]
+    for d in range(DAYS):
+        write_day(source, 7, date(2025, 7, 1), d, users)
+    (root / "data").mkdir(exist_ok=True)
+    write_labels(source, root / CONFIG["labels_path"], date(2025, 7, 1), DAYS)
+    runs, days = [], sorted(source.iterdir())
+    for lo, hi in ((0, 10), (10, 11), (11, 25), (25, 38), (38, DAYS)):
+        for part in days[lo:hi]:
+            shutil.copytree(part, raw / part.name)
+        runs.append(run(build_features, monkeypatch, capsys))
+    return runs
+
+@pytest.mark.parametrize("flag", ["--users", "--days"])
+def test_generator_rejects_empty_runs(flag, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "config").mkdir()
+    (tmp_path / "config" / "config.json").write_text(json.dumps(CONFIG))
+    monkeypatch.setattr(sys, "argv", ["generate_raw_usage_data.py", flag, "0"])
+    with pytest.raises(SystemExit) as exc:
+        generate_raw_usage_data.main()
+    assert exc.value.code == 2 and "must be >= 1" in capsys.readouterr().err
+
+def test_incremental_window_equals_full_refresh(tmp_path, monkeypatch, capsys):
+    runs = incremental_build(tmp_path, monkeypatch, capsys)
+    assert not any(r["full_refresh"] for r in runs)
+    assert sum(r["expired_user_days"] for r in runs) > 0  # the window slid past day 30
+    assert runs[-1]["window"] == ["2025-07-16", "2025-08-14"]
+    incremental = pd.read_parquet(tmp_path / CONFIG["features_path"])
+
+    full = run(build_features, monkeypatch, capsys, "--full-refresh")
+    assert full["full_refresh"] and full["window"] == runs[-1]["window"]
+    expected = pd.read_parquet(tmp_path / CONFIG["features_path"])
+    pd.testing.assert_frame_equal(incremental, expected)
+    assert len(expected) == 300 and expected["user_id"].is_monotonic_increasing
+
+def test_online_scores_match_predict_proba(tmp_path, monkeypatch, capsys):
+    incremental_build(tmp_path, monkeypatch, capsys)
+    run(train_model, monkeypatch, capsys)
+    features = pd.read_parquet(tmp_path / CONFIG["features_path"])
+    pipe = joblib.load(CONFIG["model_path"])["model"]
+    expected = pipe.predict_proba(features.drop(columns="churn_30d"))[:, 1]
+    ids = np.r_[features["user_id"].to_numpy(), 10_000]  # the last id is not in the store
+    for cfg in (CONFIG, {**CONFIG, "compiled_model_path": ""}):  # compiled lookup, then the sklearn fallback
+        risk = OnlineScorer(cfg).score_many(ids)
+        assert np.isnan(risk[-1]) and np.abs(risk[:-1] - expected).max() <= 1e-9
+
+def test_batch_scores_match_predict_proba(tmp_path, monkeypatch, capsys):
+    incremental_build(tmp_path, monkeypatch, capsys)
+    run(train_model, monkeypatch, capsys)
+    # 64-row groups, packed two per task: the scorer splits the file into three tasks across the pool
+    pq.write_table(pq.read_table(CONFIG["features_path"]), CONFIG["features_path"], row_group_size=64)
+    report = run(batch_score, monkeypatch, capsys, "--workers", "2", "--batch-rows", "128")
+    assert (report["rows"], report["tasks"]) == (300, 3)
+
+    features = pd.read_parquet(CONFIG["features_path"])
+    pipe = joblib.load(CONFIG["model_path"])["model"]
+    risk = pipe.predict_proba(features.drop(columns="churn_30d"))[:, 1]
+    expected = pd.Series(risk, index=features["user_id"])
+    scored = pd.read_parquet(report["predictions"]).set_index("user_id")["churn_risk"]
+    assert sorted(scored.index) == sorted(expected.index)
+    assert np.abs(scored - expected.loc[scored.index]).max() <= 1e-9
+    top = pd.read_csv(CONFIG["top_risk_path"])
+    assert list(top["user_id"]) == list(expected.sort_values(ascending=False, kind="stable").index[:25])
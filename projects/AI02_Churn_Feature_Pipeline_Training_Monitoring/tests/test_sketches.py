@@ -0,0 +1,34 @@
+import sys
+from pathlib import Path
+import numpy as np
+from scipy.stats import ks_2samp
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+from sketches import Histogram, fit_edges, ks, merge, psi, read_sketch, sketch, write_sketch  # noqa: E402
+
+def test_merge_equals_single_pass(tmp_path):
+    rng = np.random.default_rng(0)
+    x = rng.gamma(2.0, 100.0, size=30_000)
+    x[::97] = np.nan
+    edges = {"x": fit_edges(x)}
+    parts = [sketch({"x": chunk}, edges) for chunk in np.array_split(x, 7)]
+    whole = sketch({"x": x}, edges)["x"]
+    merged = merge(parts)["x"]
+    assert np.array_equal(merged.counts, whole.counts)
+    assert (merged.nulls, merged.lo, merged.hi) == (whole.nulls, whole.lo, whole.hi)
+    write_sketch(tmp_path / "s.json", {"x": merged}, rows=len(x))
+    meta, back = read_sketch(tmp_path / "s.json")
+    assert meta["rows"] == len(x) and np.array_equal(back["x"].counts, whole.counts)
+
+def test_ks_and_psi_from_sketches():
+    rng = np.random.default_rng(1)
+    a = rng.normal(500, 100, size=50_000)
+    b = a[:40_000] * rng.normal(0.96, 0.05, size=40_000)
+    edges = fit_edges(a)
+    ha, hb = Histogram(edges).update(a), Histogram(edges).update(b)
+    exact = ks_2samp(a, b).statistic
+    stat, p = ks(ha, hb)
+    assert exact - 0.01 <= stat <= exact + 1e-12  # bin-edge CDF gap never exceeds the exact statistic
+    assert p < 1e-6
+    assert psi(ha, Histogram(edges).update(a[::-1])) < 1e-9
+    assert psi(ha, hb) > 0.01
@@ -0,0 +1,20 @@
+import json, sys
+from pathlib import Path
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+import train_model  # noqa: E402
+
+@pytest.mark.parametrize("value", ["0", "-2"])
+def test_n_jobs_rejected_before_training(value, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "config").mkdir()
+    (tmp_path / "config" / "config.json").write_text(json.dumps({"features_path": "missing.parquet",
+                                                                 "model_path": "artifacts/model.joblib"}))
+    monkeypatch.setattr(sys, "argv", ["train_model.py", "--search", "--n-jobs", value])
+    with pytest.raises(SystemExit) as exc:
+        train_model.main()
+    assert exc.value.code == 2 and "must be >= 1 or -1" in capsys.readouterr().err
+
+def test_n_jobs_accepts_positive_and_all_cores():
+    assert [train_model.n_jobs_arg(v) for v in ("1", "4", "-1")] == [1, 4, -1]
@@ -0,0 +1,80 @@
+from __future__ import annotations
+import argparse, json, time, tracemalloc
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from shared.utils import ensure_dir, utcnow_iso
+from calibration import anomaly_score, fit_calibration
+from encoders import ENCODERS
+from forest import FlatForest
+from storage import read_table, table_path
+from train_anomaly_model import LABELS, build_pipeline, fit_pipeline
+
+# One-hot vs compact encoding: fit/score time, peak traced memory, encoded width and recall on the injected
+# anomalies (is_anomaly). --merchants re-draws merchant_id over N ids to mimic production cardinality. Fit and
+# score time are the paths train_anomaly_model.py and score_transactions.py take (fit_pipeline, FlatForest).
+
+def measure(fn) -> tuple[object, float, float]:
+    t0 = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - t0
+    tracemalloc.start()
+    result = fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak / 2**20
+
+def run(df: pd.DataFrame, encoder: str, threshold: float) -> dict:
+    X = df.drop(columns=LABELS, errors="ignore")
+    truth = df["is_anomaly"].to_numpy() == 1
+    pipe = build_pipeline(encoder)
+    _, fit_s, fit_mb = measure(lambda: fit_pipeline(pipe, X))
+    normality, score_s, score_mb = measure(
+        lambda: FlatForest(pipe.named_steps["model"]).decision_function(pipe.named_steps["pre"].transform(X)))
+    score = anomaly_score(normality, fit_calibration(normality))
+    alerts = score >= threshold
+    top = np.argsort(-score, kind="stable")[:truth.sum()]
+    return {
+        "encoder": encoder,
+        "encoded_features": int(len(pipe.named_steps["pre"].get_feature_names_out())),
+        "fit_seconds": round(fit_s, 3), "fit_peak_mb": round(fit_mb, 1),
+        "score_seconds": round(score_s, 3), "score_peak_mb": round(score_mb, 1),
+        "alerts": int(alerts.sum()),
+        "recall_at_threshold": round(float(alerts[truth].mean()), 4),
+        "precision_at_threshold": round(float(truth[alerts].mean()), 4) if alerts.any() else None,
+        "recall_at_k": round(float(truth[top].mean()), 4),
+    }
+
+def main() -> None:
+    cfg = json.loads(Path("config/config.json").read_text())
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--merchants", type=int, nargs="+", default=[0, 20000],
+                    help="merchant cardinalities to test (0 = as generated)")
+    args = ap.parse_args()
+
+    out_dir = ensure_dir(Path("outputs"))
+    fmt = cfg.get("storage_format", "csv")
+    base = read_table(table_path(cfg["transactions_path"], fmt), fmt)
+    if "is_anomaly" not in base:
+        raise SystemExit("transactions have no is_anomaly labels; re-run generate_transactions.py.")
+
+    results = []
+    for merchants in args.merchants:
+        df = base
+        if merchants:
+            df = base.copy()
+            ids = np.random.default_rng(merchants).integers(1, merchants + 1, size=len(df))
+            df["merchant_id"] = pd.Series(ids).map("m_{:05d}".format)
+        for encoder in ENCODERS:
+            res = {"merchants": int(df["merchant_id"].nunique()),
+                   **run(df, encoder, float(cfg["alert_threshold"]))}
+            print(json.dumps(res))
+            results.append(res)
+
+    report = {"run_at": utcnow_iso(), "rows": int(len(base)),
+              "injected_anomalies": int(base["is_anomaly"].sum()),
+              "alert_threshold": float(cfg["alert_threshold"]), "results": results}
+    (out_dir / "encoder_benchmark.json").write_text(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
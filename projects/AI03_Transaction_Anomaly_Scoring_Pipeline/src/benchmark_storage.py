@@ -0,0 +1,74 @@
+from __future__ import annotations
+import argparse, json, multiprocessing, shutil, time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from shared.utils import ensure_dir, utcnow_iso
+from storage import CATEGORY_COLUMNS, FORMATS, read_table, table_path, write_table
+
+# CSV vs day-partitioned Parquet for the transactions table: size on disk, and per stage projection the read
+# time, peak RSS (and its growth during the read) and in-memory frame size. Each read runs in a fresh process
+# with its RSS high-water mark reset first (Linux /proc). The projections are the columns each stage reads.
+
+PROJECTIONS = {
+    "all": None,
+    "train": CATEGORY_COLUMNS + ["amount_usd"],
+    "score": ["txn_id", "txn_ts"] + CATEGORY_COLUMNS + ["amount_usd"],
+    "monitor": ["txn_ts", "amount_usd"],
+}
+
+def disk_mb(path: Path) -> float:
+    files = [path] if path.is_file() else [p for p in path.rglob("*") if p.is_file()]
+    return sum(p.stat().st_size for p in files) / 2**20
+
+def rss_mb(field: str) -> float:
+    # VmRSS (current) or VmHWM (peak since the last reset) of this process
+    line = next(x for x in Path("/proc/self/status").read_text().splitlines() if x.startswith(field + ":"))
+    return int(line.split()[1]) / 1024
+
+def read_once(path: str, fmt: str, columns: list[str] | None) -> dict:
+    Path("/proc/self/clear_refs").write_text("5")  # reset VmHWM to the current RSS
+    before = rss_mb("VmRSS")
+    t0 = time.perf_counter()
+    df = read_table(Path(path), fmt, columns)
+    seconds = time.perf_counter() - t0
+    peak = rss_mb("VmHWM")
+    return {"rows": int(len(df)), "seconds": round(seconds, 3), "peak_rss_mb": round(peak, 1),
+            "peak_rss_growth_mb": round(peak - before, 1),
+            "frame_mb": round(float(df.memory_usage(deep=True).sum()) / 2**20, 1)}
+
+def main() -> None:
+    cfg = json.loads(Path("config/config.json").read_text())
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeats", type=int, default=3, help="reads per case; the fastest is reported")
+    args = ap.parse_args()
+
+    out_dir = ensure_dir(Path("outputs"))
+    work = ensure_dir(out_dir / "storage_benchmark")
+    fmt = cfg.get("storage_format", "csv")
+    df = read_table(table_path(cfg["transactions_path"], fmt), fmt)
+    paths = {f: table_path(work / "transactions.csv", f) for f in FORMATS}
+    for f, path in paths.items():
+        write_table(df, path, f)
+    del df
+
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for name, columns in PROJECTIONS.items():
+        for f, path in paths.items():
+            runs = []
+            for _ in range(args.repeats):
+                with ProcessPoolExecutor(1, mp_context=ctx) as pool:
+                    runs.append(pool.submit(read_once, str(path), f, columns).result())
+            res = {"projection": name, "format": f, **min(runs, key=lambda r: r["seconds"])}
+            print(json.dumps(res))
+            results.append(res)
+
+    report = {"run_at": utcnow_iso(), "rows": results[0]["rows"],
+              "disk_mb": {f: round(disk_mb(p), 1) for f, p in paths.items()},
+              "projections": {k: v or "all columns" for k, v in PROJECTIONS.items()}, "results": results}
+    (out_dir / "storage_benchmark.json").write_text(json.dumps(report, indent=2))
+    shutil.rmtree(work)
+    print(json.dumps(report["disk_mb"]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+from __future__ import annotations
+import numpy as np
+
+# Batch-independent anomaly score: the training distribution of IsolationForest decision_function values is
+# stored as quantiles, and a row's score is the share of training rows that looked more normal than it
+# (1 - empirical CDF). Depends only on the row and the artifact, so any chunking gives identical scores.
+
+LEVELS = 2001
+
+def fit_calibration(normality: np.ndarray, levels: int = LEVELS) -> dict:
+    probs = np.linspace(0.0, 1.0, levels)
+    return {"probs": probs.tolist(), "quantiles": np.quantile(normality, probs).tolist()}
+
+def anomaly_score(normality: np.ndarray, calibration: dict) -> np.ndarray:
+    # Below the training minimum -> 1.0, above the maximum -> 0.0
+    q = np.maximum.accumulate(np.asarray(calibration["quantiles"], dtype=np.float64))
+    return 1.0 - np.interp(normality, q, np.asarray(calibration["probs"], dtype=np.float64))
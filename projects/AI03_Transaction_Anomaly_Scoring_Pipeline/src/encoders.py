@@ -0,0 +1,89 @@
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import OneHotEncoder
+
+CATEGORICALS = ["merchant_id", "country", "payment_method", "device"]
+NUMERICS = ["amount_usd"]
+ENCODERS = ("onehot", "compact")
+
+class CompactEncoder(BaseEstimator, TransformerMixin):
+    # Fixed-width alternative to one-hot, no labels used. Per categorical: frequency rank (0 = most common)
+    # and frequency share. Per merchant: historical txn count, mean/std amount and amount / merchant mean.
+    # Width no longer grows with cardinality; the lookup tables are plain arrays saved with the pipeline.
+    def __init__(self, categoricals: list[str] = CATEGORICALS, key: str = "merchant_id",
+                 amount: str = "amount_usd"):
+        self.categoricals = categoricals
+        self.key = key
+        self.amount = amount
+
+    def fit(self, X: pd.DataFrame, y=None) -> "CompactEncoder":
+        self.tables_ = {}
+        for c in self.categoricals:
+            counts = X[c].astype(str).value_counts()
+            self.tables_[c] = {"categories": counts.index.to_numpy(dtype=object),
+                               "freq": (counts.to_numpy() / len(X)).astype(np.float64)}
+        stats = X.groupby(X[self.key].astype(str), sort=False)[self.amount].agg(["count", "mean", "std"])
+        stats = stats.reindex(self.tables_[self.key]["categories"])
+        self.key_stats_ = {"count": stats["count"].to_numpy(np.float64),
+                           "mean": stats["mean"].to_numpy(np.float64),
+                           "std": stats["std"].fillna(0.0).to_numpy(np.float64)}
+        self.global_mean_ = float(X[self.amount].mean())
+        return self
+
+    def _index(self, c: str) -> pd.Index:
+        # Built once per column and kept (the hash table behind get_indexer), not per transform call
+        cache = self.__dict__.setdefault("_indexes", {})
+        if c not in cache:
+            cache[c] = pd.Index(self.tables_[c]["categories"])
+        return cache[c]
+
+    def _codes(self, values: pd.Series, c: str) -> np.ndarray:
+        # Unknown categories -> -1. Categorical input: look up each category once, then map the integer codes
+        index = self._index(c)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            lut = np.append(index.get_indexer(values.cat.categories.astype(str)), -1)  # code -1 = missing
+            return lut[values.cat.codes.to_numpy()].astype(np.int64)
+        return index.get_indexer(values.astype(str)).astype(np.int64)
+
+    def transform(self, X: pd.DataFrame) -> np.ndarray:
+        cols, codes_by_column = [], {}
+        for c in self.categoricals:
+            codes = codes_by_column[c] = self._codes(X[c], c)
+            known = codes >= 0
+            freq = np.where(known, self.tables_[c]["freq"][codes.clip(0)], 0.0)
+            rank = np.where(known, codes, len(self.tables_[c]["categories"]))  # unseen = rarer than any seen
+            cols += [rank.astype(np.float64), freq]
+        codes = codes_by_column.get(self.key)
+        codes = self._codes(X[self.key], self.key) if codes is None else codes
+        known = codes >= 0
+        idx = codes.clip(0)
+        count = np.where(known, self.key_stats_["count"][idx], 0.0)
+        mean = np.where(known, self.key_stats_["mean"][idx], self.global_mean_)
+        std = np.where(known, self.key_stats_["std"][idx], 0.0)
+        amount = X[self.amount].to_numpy(np.float64)
+        cols += [count, mean, std, amount / np.maximum(mean, 1e-9), amount]
+        return np.column_stack(cols)
+
+    def get_feature_names_out(self, input_features=None) -> np.ndarray:
+        names = [f"{c}_{k}" for c in self.categoricals for k in ("rank", "freq")]
+        return np.asarray(names + [f"{self.key}_count", f"{self.key}_amount_mean", f"{self.key}_amount_std",
+                                   f"{self.amount}_to_{self.key}_mean", self.amount], dtype=object)
+
+def make_preprocessor(mode: str, extra_numerics: list[str] = ()):
+    # extra_numerics (e.g. streaming velocity features) are passed through next to the encoded columns
+    if mode == "onehot":
+        return ColumnTransformer([
+            ("cat", OneHotEncoder(handle_unknown="ignore"), CATEGORICALS),
+            ("num", "passthrough", NUMERICS + list(extra_numerics))
+        ])
+    if mode == "compact":
+        if not extra_numerics:
+            return CompactEncoder()
+        return ColumnTransformer([
+            ("compact", CompactEncoder(), CATEGORICALS + NUMERICS),
+            ("extra", "passthrough", list(extra_numerics))
+        ])
+    raise ValueError(f"unknown encoder {mode!r}; expected one of {ENCODERS}")
@@ -1,46 +1,148 @@
 from __future__ import annotations
-import json
+import argparse, json, math, os, shutil
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
-from datetime import datetime, timedelta
 import numpy as np
-import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from shared.utils import ensure_dir
+from storage import replace_dir, table_path, write_csv, write_parquet
 
-def main() -> None:
-    cfg = json.loads(Path("config/config.json").read_text())
-    path = Path(cfg["transactions_path"])
-    ensure_dir(path.parent)
+# Sharded generator: rows are split into fixed-size shards, each with its own seed spawned from --seed, so the
+# output depends on --rows/--shard-rows/--seed but not on --workers. Shards are built as Arrow columns (ids,
+# timestamps and categoricals from integer arrays, no per-row Python) and written as their own part files.
+
+START = np.datetime64("2025-12-01T00:00:00", "s")
+MERCHANTS = [f"m_{i:04d}" for i in range(1, 250)]
+COUNTRIES = ["US", "CA", "GB", "AU", "DE", "FR", "BR", "IN", "NG", "MX"]
+COUNTRY_P = [0.52, 0.08, 0.07, 0.05, 0.06, 0.05, 0.04, 0.06, 0.03, 0.04]
+METHODS = ["card", "paypal", "apple_pay", "google_pay"]
+METHOD_P = [0.72, 0.12, 0.10, 0.06]
+DEVICES = ["ios", "android", "web"]
+DEVICE_P = [0.34, 0.36, 0.30]
+RARE_COUNTRIES = ["NG", "BR", "MX"]
+MAX_SHARD_ROWS = 50_000_000  # keeps a shard's txn_id buffer under 2 GiB
 
-    rng = np.random.default_rng(404)
-    n = 25000
+def txn_ids(first: int, n: int, width: int) -> pa.Array:
+    # "TXN-" + zero-padded number, assembled as one byte buffer
+    ids = np.arange(first, first + n, dtype=np.int64)
+    chars = np.empty((n, 4 + width), dtype=np.uint8)
+    chars[:, :4] = np.frombuffer(b"TXN-", dtype=np.uint8)
+    chars[:, 4:] = ids[:, None] // 10 ** np.arange(width - 1, -1, -1, dtype=np.int64) % 10 + ord("0")
+    offsets = np.arange(n + 1, dtype=np.int32) * (4 + width)
+    return pa.StringArray.from_buffers(n, pa.py_buffer(offsets), pa.py_buffer(chars.ravel()))
 
-    merchants = [f"m_{i:04d}" for i in range(1, 250)]
-    countries = ["US","CA","GB","AU","DE","FR","BR","IN","NG","MX"]
-    methods = ["card","paypal","apple_pay","google_pay"]
-    devices = ["ios","android","web"]
+def categorical(codes: np.ndarray, values: list[str]) -> pa.DictionaryArray:
+    return pa.DictionaryArray.from_arrays(pa.array(codes.astype(np.int32)), pa.array(values))
+
+def make_shard(first: int, n: int, total: int, seed: np.random.SeedSequence, anomaly_rate: float,
+               seconds: int) -> pa.Table:
+    # Rows first .. first+n-1 of total, timestamps evenly spaced over `seconds`
+    rng = np.random.default_rng(seed)
+    ids = np.arange(first, first + n, dtype=np.int64)
 
     # Normal behavior
     amount = rng.lognormal(mean=3.4, sigma=0.55, size=n).round(2)  # mostly small/medium
-    txn_time = pd.date_range("2025-12-01", periods=n, freq="min")
-    df = pd.DataFrame({
-        "txn_id": [f"TXN-{i:06d}" for i in range(1, n+1)],
-        "txn_ts": txn_time.astype(str),
-        "merchant_id": rng.choice(merchants, size=n),
-        "country": rng.choice(countries, p=[0.52,0.08,0.07,0.05,0.06,0.05,0.04,0.06,0.03,0.04], size=n),
-        "payment_method": rng.choice(methods, p=[0.72,0.12,0.10,0.06], size=n),
-        "device": rng.choice(devices, p=[0.34,0.36,0.30], size=n),
+    merchant = rng.integers(0, len(MERCHANTS), size=n)
+    country = rng.choice(len(COUNTRIES), p=COUNTRY_P, size=n)
+    method = rng.choice(len(METHODS), p=METHOD_P, size=n)
+    device = rng.choice(len(DEVICES), p=DEVICE_P, size=n)
+    chargeback = np.zeros(n, dtype=np.int64)
+    anomaly = np.zeros(n, dtype=np.int64)
+
+    # Inject anomalies: very high amounts, rare countries (32% of them) and chargebacks (48%)
+    idx = rng.choice(n, size=round(n * anomaly_rate), replace=False)
+    amount[idx] = (amount[idx] * rng.uniform(10, 40, size=len(idx))).round(2)
+    rare = idx[:round(len(idx) * 0.32)]
+    country[rare] = rng.choice([COUNTRIES.index(c) for c in RARE_COUNTRIES], size=len(rare))
+    chargeback[idx[:round(len(idx) * 0.48)]] = 1
+    anomaly[idx] = 1  # ground truth for recall checks
+
+    return pa.table({
+        "txn_id": txn_ids(first, n, max(6, len(str(total)))),
+        "txn_ts": pa.array(START + ((ids - 1) * (seconds / total)).astype(np.int64)),
+        "merchant_id": categorical(merchant, MERCHANTS),
+        "country": categorical(country, COUNTRIES),
+        "payment_method": categorical(method, METHODS),
+        "device": categorical(device, DEVICES),
         "amount_usd": amount,
-        "is_chargeback": 0
+        "is_chargeback": chargeback,
+        "is_anomaly": anomaly,
     })
 
-    # Inject anomalies: very high amounts, rare countries, and chargebacks
-    idx = rng.choice(df.index, size=250, replace=False)
-    df.loc[idx, "amount_usd"] = (df.loc[idx, "amount_usd"] * rng.uniform(10, 40, size=len(idx))).round(2)
-    df.loc[idx[:80], "country"] = rng.choice(["NG","BR","MX"], size=80)
-    df.loc[idx[:120], "is_chargeback"] = 1
+def write_shard(shard: int, first: int, n: int, total: int, seed: np.random.SeedSequence, anomaly_rate: float,
+                seconds: int, fmt: str, out: str) -> tuple[int, int]:
+    table = make_shard(first, n, total, seed, anomaly_rate, seconds)
+    if fmt == "parquet":
+        write_parquet(table, Path(out), name=f"shard-{shard:05d}")
+    else:
+        write_csv(table, Path(out) / f"part-{shard:05d}.csv" if Path(out).is_dir() else Path(out))
+    return n, int(pc.sum(table["is_anomaly"]).as_py())
+
+def main() -> None:
+    cfg = json.loads(Path("config/config.json").read_text())
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=int(cfg.get("generate_rows", 25_000)))
+    ap.add_argument("--shard-rows", type=int, default=int(cfg.get("generate_shard_rows", 1_000_000)),
+                    help="rows per shard / part file")
+    ap.add_argument("--workers", type=int, default=int(cfg.get("generate_workers", 0)),
+                    help="generator processes (0 = one per CPU, 1 = in-process)")
+    ap.add_argument("--anomaly-rate", type=float, default=float(cfg.get("anomaly_rate", 0.01)))
+    ap.add_argument("--days", type=float, default=float(cfg.get("generate_days", 0)),
+                    help="spread rows evenly over this many days (0 = one transaction per minute)")
+    ap.add_argument("--seed", type=int, default=404)
+    args = ap.parse_args()
+    if not 0 < args.shard_rows <= MAX_SHARD_ROWS:
+        raise SystemExit(f"--shard-rows must be in 1..{MAX_SHARD_ROWS:,}")
+
+    fmt = cfg.get("storage_format", "csv")
+    path = table_path(cfg["transactions_path"], fmt)
+    ensure_dir(path.parent)
+    shards = math.ceil(args.rows / args.shard_rows)
+    seeds = np.random.SeedSequence(args.seed).spawn(shards)
+    seconds = round(args.days * 86_400) if args.days else args.rows * 60
+
+    # Parquet, or CSV with several shards, is a directory of part files; one CSV shard is the file itself
+    tmp = path.with_name(path.name + ".tmp")
+    if tmp.is_dir():
+        shutil.rmtree(tmp)
+    else:
+        tmp.unlink(missing_ok=True)
+    if fmt == "parquet" or shards > 1:
+        tmp.mkdir()
+
+    workers = min(args.workers or os.cpu_count() or 1, shards)
+    in_flight: deque[Future] = deque()
+    rows = anomalies = 0
+
+    def drain(limit: int) -> None:
+        nonlocal rows, anomalies
+        while len(in_flight) > limit:
+            n, k = in_flight.popleft().result()
+            rows += n
+            anomalies += k
 
-    df.to_csv(path, index=False)
-    print(f"Wrote transactions: {path.resolve()} ({len(df):,} rows, injected anomalies={len(idx)})")
+    pool = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        for shard, seed in enumerate(seeds):
+            first = shard * args.shard_rows + 1
+            job = (shard, first, min(args.shard_rows, args.rows - first + 1), args.rows, seed,
+                   args.anomaly_rate, seconds, fmt, str(tmp))
+            if pool is None:
+                fut = Future()
+                fut.set_result(write_shard(*job))
+            else:
+                fut = pool.submit(write_shard, *job)
+            in_flight.append(fut)
+            drain(2 * workers - 1)
+        drain(0)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    replace_dir(tmp, path)
+    print(f"Wrote transactions: {path.resolve()} ({rows:,} rows in {shards} shards, "
+          f"injected anomalies={anomalies})")
 
 if __name__ == "__main__":
     main()
@@ -1,31 +1,102 @@
 from __future__ import annotations
-import json
+import argparse, json, math
 from pathlib import Path
-import pandas as pd
-import numpy as np
+import duckdb
 from shared.utils import ensure_dir, utcnow_iso
+from storage import duckdb_scan, table_path
+from window_metrics import QuantileSketch, empty_window, merge_window, summarize
+from window_metrics import latest_run, read_snapshots, write_snapshots
+
+# Guardrails over the hourly metric snapshots that score_transactions.py writes as a by-product, so a check
+# over any date range only merges stored sketches. --rebuild (or no snapshots yet) recomputes them in one
+# DuckDB pass: transactions joined to the scores side table on txn_id, aggregated per hour and sketch bucket.
+# Each stored hour records the run that wrote it; by default only the latest run's hours are checked, so hours
+# left behind by an earlier, larger run are not mixed into the report.
+
+REBUILD_SQL = """
+WITH tx AS (
+  SELECT txn_id, strftime(date_trunc('hour', CAST(txn_ts AS TIMESTAMP)), '%Y-%m-%dT%H') AS hour, amount_usd
+  FROM {tx}
+), j AS ({joined})
+SELECT hour,
+  CASE WHEN amount_usd > 0 THEN CAST(ceil(ln(amount_usd) / ?) AS BIGINT) END AS bucket,
+  amount_usd IS NULL AS missing,
+  count(*) AS n,
+  coalesce(sum(amount_usd), 0) AS amount_sum,
+  count(alert) AS scored,
+  coalesce(sum(alert), 0) AS alerts
+FROM j
+GROUP BY ALL
+"""
+
+def rebuild(cfg: dict) -> str:
+    fmt = cfg.get("storage_format", "csv")
+    tx_path, scores_path = table_path(cfg["transactions_path"], fmt), table_path(cfg["scores_path"], fmt)
+    tx_sql, tx_param = duckdb_scan(tx_path, fmt)
+    params, source = [tx_param], tx_path
+    if scores_path.exists():
+        scores_sql, scores_param = duckdb_scan(scores_path, fmt)
+        joined = f"SELECT tx.hour, tx.amount_usd, s.alert FROM tx LEFT JOIN {scores_sql} s USING (txn_id)"
+        params.append(scores_param)
+        source = scores_path
+    else:
+        joined = "SELECT hour, amount_usd, CAST(NULL AS INTEGER) AS alert FROM tx"
+    sketch = QuantileSketch()
+    rows = duckdb.connect().execute(REBUILD_SQL.format(tx=tx_sql, joined=joined),
+                                    params + [math.log(sketch.gamma)]).df()
+
+    windows = {}
+    for hour, g in rows.groupby("hour", sort=True):
+        bucketed = g["bucket"].notna()
+        counts = dict(zip(g["bucket"][bucketed].astype(int), g["n"][bucketed]))
+        windows[hour] = {"count": int(g["n"].sum()), "amount_sum": float(g["amount_sum"].sum()),
+                         "scored": int(g["scored"].sum()), "alerts": int(g["alerts"].sum()),
+                         "amount": QuantileSketch(sketch.alpha, counts,
+                                                  int(g["n"][~bucketed & ~g["missing"]].sum()))}
+    write_snapshots(Path(cfg["metrics_dir"]), windows, utcnow_iso(), source=str(source))
+    return str(source)
 
 def main() -> None:
     cfg = json.loads(Path("config/config.json").read_text())
-    tx_path = Path(cfg["transactions_path"])
-    scores_path = Path(cfg["scores_path"])
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--start", help="first day to check (YYYY-MM-DD, default: earliest snapshot)")
+    ap.add_argument("--end", help="last day to check (YYYY-MM-DD, default: latest snapshot)")
+    ap.add_argument("--rebuild", action="store_true", help="recompute snapshots from the scores/transactions")
+    ap.add_argument("--all-runs", action="store_true",
+                    help="merge hours from every run, not only the latest scoring run")
+    args = ap.parse_args()
+
+    metrics_dir = Path(cfg["metrics_dir"])
     report_path = Path(cfg["monitor_report_path"])
     ensure_dir(report_path.parent)
 
-    df = pd.read_csv(tx_path)
-    scored = pd.read_csv(scores_path) if scores_path.exists() else None
+    rebuilt_from = None
+    if args.rebuild or not any(metrics_dir.glob("date=*.json")):
+        rebuilt_from = rebuild(cfg)
+    run = None if args.all_runs else latest_run(metrics_dir)
+    windows = read_snapshots(metrics_dir, args.start, args.end, run)
+    if not windows:
+        raise SystemExit(f"No metric snapshots in {metrics_dir} for the requested range"
+                         + (f" from run {run}." if run else "."))
 
-    volume = int(len(df))
-    amount_mean = float(df["amount_usd"].mean())
-    amount_p99 = float(df["amount_usd"].quantile(0.99))
+    total, days = empty_window(), {}
+    for key, w in sorted(windows.items()):
+        merge_window(total, w)
+        merge_window(days.setdefault(key[:10], empty_window()), w)
+    summary = summarize(total)
+    scored = total["scored"] > 0
 
     report = {
         "run_at": utcnow_iso(),
-        "volume": volume,
-        "amount_mean": amount_mean,
-        "amount_p99": amount_p99,
-        "alerts": int(scored["alert"].sum()) if scored is not None else 0,
-        "alert_rate": float(scored["alert"].mean()) if scored is not None else 0.0,
+        "window": {"start": min(days), "end": max(days), "hours": len(windows)},
+        "run": run or "all",
+        "rebuilt_from": rebuilt_from,
+        "volume": summary["volume"],
+        "amount_mean": summary["amount_mean"],
+        "amount_p99": summary["amount_p99"],
+        "alerts": summary["alerts"],
+        "alert_rate": summary["alert_rate"] if scored else 0.0,
+        "daily": [{"date": day, **summarize(w)} for day, w in days.items()],
         "rules": {
             "min_volume": 20000,
             "max_alert_rate": 0.02,
@@ -34,11 +105,11 @@ def main() -> None:
         "violations": []
     }
 
-    if volume < report["rules"]["min_volume"]:
+    if report["volume"] < report["rules"]["min_volume"]:
         report["violations"].append("volume_below_min")
-    if scored is not None and report["alert_rate"] > report["rules"]["max_alert_rate"]:
+    if scored and report["alert_rate"] > report["rules"]["max_alert_rate"]:
         report["violations"].append("alert_rate_too_high")
-    if amount_p99 > report["rules"]["p99_amount_upper_guardrail"]:
+    if report["amount_p99"] > report["rules"]["p99_amount_upper_guardrail"]:
         report["violations"].append("p99_amount_guardrail_breached")
 
     report_path.write_text(json.dumps(report, indent=2))
@@ -1,34 +1,104 @@
 from __future__ import annotations
-import json
+import argparse, json, os, shutil
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 import pandas as pd
-import numpy as np
 import joblib
 from shared.utils import ensure_dir, utcnow_iso
+from calibration import anomaly_score
+from forest import FlatForest
+from storage import iter_chunks, replace_dir, table_path, write_parquet
+from window_metrics import hourly, merge_hourly, write_snapshots
+
+# Scoring is a pure per-row function (decision_function mapped through the training quantiles stored in the
+# artifact), so the input is read in row chunks, scored across a process pool and appended in input order.
+# Each chunk also returns its hourly monitoring metrics, written as snapshots for monitor_pipeline.py.
+# Only the model's input columns are read, and the output is a narrow side table keyed by txn_id.
+
+@lru_cache(maxsize=1)
+def load_artifact(path: str) -> dict:
+    return joblib.load(path)
+
+@lru_cache(maxsize=1)
+def load_forest(path: str) -> FlatForest:
+    return FlatForest(load_artifact(path)["model"].named_steps["model"])
+
+def score_chunk(df: pd.DataFrame, model_path: str, threshold: float,
+                scored_at: str) -> tuple[pd.DataFrame, dict]:
+    artifact = load_artifact(model_path)
+    # IsolationForest: decision_function higher means more normal; calibrated to an anomaly score in [0,1]
+    encoded = artifact["model"].named_steps["pre"].transform(df[artifact["metadata"]["columns"]])
+    normality = load_forest(model_path).decision_function(encoded)
+    out = pd.DataFrame({"txn_id": df["txn_id"], "scored_at": scored_at,
+                        "anomaly_score": anomaly_score(normality, artifact["calibration"]).round(4)})
+    out["alert"] = (out["anomaly_score"] >= threshold).astype(int)
+    return out, hourly(df["txn_ts"], df["amount_usd"], out["alert"])
 
 def main() -> None:
     cfg = json.loads(Path("config/config.json").read_text())
-    tx_path = Path(cfg["transactions_path"])
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=int(cfg.get("score_workers", 0)),
+                    help="scoring processes (0 = one per CPU, 1 = in-process)")
+    ap.add_argument("--chunk-rows", type=int, default=int(cfg.get("score_chunk_rows", 100_000)))
+    args = ap.parse_args()
+
+    fmt = cfg.get("storage_format", "csv")
+    tx_path = table_path(cfg["transactions_path"], fmt)
     model_path = Path(cfg["model_path"])
-    scores_path = Path(cfg["scores_path"])
+    scores_path = table_path(cfg["scores_path"], fmt)
     ensure_dir(scores_path.parent)
+    artifact = load_artifact(str(model_path))
+    if "calibration" not in artifact:
+        raise SystemExit(f"{model_path} has no calibration; re-run train_anomaly_model.py.")
+    columns = list(dict.fromkeys(["txn_id", "txn_ts", "amount_usd", *artifact["metadata"]["columns"]]))
 
-    df = pd.read_csv(tx_path)
-    artifact = joblib.load(model_path)
-    model = artifact["model"]
-
-    X = df.drop(columns=["is_chargeback"])
-    # IsolationForest: decision_function higher means more normal; we invert to anomaly score [0,1]
-    normality = model.decision_function(X)
-    anomaly_score = (1 - (normality - normality.min()) / (normality.max() - normality.min() + 1e-9))
+    workers = args.workers or os.cpu_count() or 1
+    scored_at = utcnow_iso()
+    tmp_path = scores_path.with_name(scores_path.name + ".tmp")
+    in_flight: deque[Future] = deque()
+    rows = alerts = parts = 0
+    windows: dict[str, dict] = {}
 
-    out = df.copy()
-    out["scored_at"] = utcnow_iso()
-    out["anomaly_score"] = anomaly_score.round(4)
-    out["alert"] = (out["anomaly_score"] >= float(cfg["alert_threshold"])).astype(int)
+    def drain(limit: int) -> None:
+        nonlocal rows, alerts, parts
+        while len(in_flight) > limit:
+            out, metrics = in_flight.popleft().result()
+            merge_hourly(windows, metrics)
+            if fmt == "parquet":
+                write_parquet(out, tmp_path, name=f"part-{parts:05d}")
+            else:
+                out.to_csv(tmp_path, mode="a", header=rows == 0, index=False)
+            parts += 1
+            rows += len(out)
+            alerts += int(out["alert"].sum())
 
-    out.sort_values("anomaly_score", ascending=False).to_csv(scores_path, index=False)
-    print(f"Wrote scores: {scores_path.resolve()} alerts={(out['alert']==1).sum()}")
+    if tmp_path.is_dir():
+        shutil.rmtree(tmp_path)
+    else:
+        tmp_path.unlink(missing_ok=True)
+    if fmt == "parquet":
+        tmp_path.mkdir()
+    pool = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        for chunk in iter_chunks(tx_path, fmt, args.chunk_rows, columns):
+            job = (chunk, str(model_path), float(cfg["alert_threshold"]), scored_at)
+            if pool is None:
+                fut = Future()
+                fut.set_result(score_chunk(*job))
+            else:
+                fut = pool.submit(score_chunk, *job)
+            in_flight.append(fut)
+            drain(2 * workers - 1)
+        drain(0)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    replace_dir(tmp_path, scores_path)
+    snapshots = write_snapshots(Path(cfg["metrics_dir"]), windows, scored_at, source=str(scores_path))
+    print(f"Wrote scores: {scores_path.resolve()} rows={rows:,} alerts={alerts} workers={workers}")
+    print(f"Wrote metric snapshots: {len(windows)} hours in {len(snapshots)} days -> {cfg['metrics_dir']}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,115 @@
+from __future__ import annotations
+import shutil
+from pathlib import Path
+from typing import Iterator
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+
+# Tables passed between stages, as CSV or as Parquet partitioned by day ("storage_format" in the config).
+# Both formats yield the same frames: categoricals as pandas categoricals (dictionary-encoded in Parquet) and
+# txn_ts as a timestamp, and both take a column projection, which Parquet applies without reading the rest.
+# A CSV table is one file, or a directory of part files at the same path (sharded writers).
+
+FORMATS = ("csv", "parquet")
+CATEGORY_COLUMNS = ["merchant_id", "country", "payment_method", "device"]
+PARTITION = "txn_date"
+
+def table_path(path: str | Path, fmt: str) -> Path:
+    # Config paths name the CSV file; the Parquet table is the directory next to it without the suffix
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown storage format {fmt!r}; expected one of {FORMATS}")
+    p = Path(path)
+    return p.with_suffix("") if fmt == "parquet" else p
+
+def _csv_options(columns: list[str] | None) -> dict:
+    keep = (lambda c: True) if columns is None else (lambda c: c in columns)
+    return {"usecols": columns, "dtype": {c: "category" for c in CATEGORY_COLUMNS if keep(c)},
+            "parse_dates": ["txn_ts"] if keep("txn_ts") else None}
+
+def _csv_files(path: Path) -> list[Path]:
+    return sorted(path.glob("*.csv")) if path.is_dir() else [path]
+
+def _dataset(path: Path) -> ds.Dataset:
+    return ds.dataset(path, format="parquet", partitioning="hive")
+
+def _columns(dataset: ds.Dataset, columns: list[str] | None) -> list[str]:
+    return [c for c in dataset.schema.names if c != PARTITION] if columns is None else columns
+
+def read_table(path: Path, fmt: str, columns: list[str] | None = None) -> pd.DataFrame:
+    if fmt == "csv":
+        files = _csv_files(path)
+        if len(files) == 1:
+            return pd.read_csv(files[0], **_csv_options(columns))
+        df = pd.concat([pd.read_csv(f, **_csv_options(columns)) for f in files], ignore_index=True)
+        return df.astype({c: "category" for c in CATEGORY_COLUMNS if c in df})  # parts' categories differ
+    dataset = _dataset(path)
+    return dataset.to_table(columns=_columns(dataset, columns)).to_pandas()
+
+def iter_chunks(path: Path, fmt: str, rows: int, columns: list[str] | None = None) -> Iterator[pd.DataFrame]:
+    if fmt == "csv":
+        for f in _csv_files(path):
+            yield from pd.read_csv(f, chunksize=rows, **_csv_options(columns))
+        return
+    # Day files are small: batches are coalesced up to `rows` before conversion
+    dataset = _dataset(path)
+    buf, n = [], 0
+    for batch in dataset.to_batches(columns=_columns(dataset, columns), batch_size=rows):
+        buf.append(batch)
+        n += batch.num_rows
+        if n >= rows:
+            yield pa.Table.from_batches(buf).to_pandas()
+            buf, n = [], 0
+    if buf:
+        yield pa.Table.from_batches(buf).to_pandas()
+
+def to_arrow(df: pd.DataFrame) -> pa.Table:
+    df = df.copy()
+    for c in CATEGORY_COLUMNS:
+        if c in df:
+            df[c] = df[c].astype("category")
+    if "txn_ts" in df:
+        df["txn_ts"] = pd.to_datetime(df["txn_ts"])
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+def write_parquet(df: pd.DataFrame | pa.Table, out_dir: Path, name: str = "part") -> None:
+    # Adds files named <name>-<i>.parquet under out_dir (txn_date=YYYY-MM-DD/ when there is a txn_ts)
+    table = df if isinstance(df, pa.Table) else to_arrow(df)
+    partitioning = None
+    if "txn_ts" in table.column_names:
+        table = table.append_column(PARTITION, pc.cast(pc.cast(table["txn_ts"], pa.date32()), pa.string()))
+        partitioning = ds.partitioning(pa.schema([(PARTITION, pa.string())]), flavor="hive")
+    ds.write_dataset(table, out_dir, format="parquet", partitioning=partitioning,
+                     basename_template=f"{name}-{{i}}.parquet", existing_data_behavior="overwrite_or_ignore")
+
+def write_csv(table: pa.Table, path: Path) -> None:
+    # Arrow's writer without quoting (values never contain separators; it raises if one does)
+    with pa.OSFile(str(path), "wb") as f:
+        f.write((",".join(table.column_names) + "\n").encode())
+        pacsv.write_csv(table, f, pacsv.WriteOptions(include_header=False, quoting_style="none"))
+
+def replace_dir(tmp: Path, final: Path) -> None:
+    if final.exists():
+        if final.is_dir():
+            shutil.rmtree(final)
+        else:
+            final.unlink()
+    tmp.rename(final)
+
+def write_table(df: pd.DataFrame, path: Path, fmt: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+        return
+    tmp = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    write_parquet(df, tmp)
+    replace_dir(tmp, path)
+
+def duckdb_scan(path: Path, fmt: str) -> tuple[str, str]:
+    # (table function SQL, path parameter) for reading a table_path() from DuckDB
+    if fmt == "parquet":
+        return "read_parquet(?, hive_partitioning = true)", f"{path}/**/*.parquet"
+    return "read_csv(?)", f"{path}/*.csv" if path.is_dir() else str(path)
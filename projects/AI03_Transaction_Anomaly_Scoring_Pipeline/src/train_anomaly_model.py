@@ -1,50 +1,77 @@
 from __future__ import annotations
-import json
+import argparse, json
 from pathlib import Path
 import pandas as pd
 import numpy as np
-from sklearn.compose import ColumnTransformer
-from sklearn.preprocessing import OneHotEncoder
 from sklearn.pipeline import Pipeline
 from sklearn.ensemble import IsolationForest
 import joblib
 from shared.utils import ensure_dir, utcnow_iso
+from calibration import fit_calibration
+from encoders import CATEGORICALS, ENCODERS, NUMERICS, make_preprocessor
+from forest import fit_offset
+from storage import read_table, table_path
+from velocity import FEATURES as VELOCITY_FEATURES, VelocityState, replay
 
-def main() -> None:
-    cfg = json.loads(Path("config/config.json").read_text())
-    tx_path = Path(cfg["transactions_path"])
-    model_path = Path(cfg["model_path"])
-    ensure_dir(model_path.parent)
-
-    df = pd.read_csv(tx_path)
-
-    y = df["is_chargeback"].astype(int)
-    X = df.drop(columns=["is_chargeback"])
-
-    cat = ["merchant_id","country","payment_method","device"]
-    num = ["amount_usd"]
-
-    pre = ColumnTransformer([
-        ("cat", OneHotEncoder(handle_unknown="ignore"), cat),
-        ("num", "passthrough", num)
-    ])
+LABELS = ["is_chargeback", "is_anomaly"]
+CONTAMINATION = 0.01
 
+def build_pipeline(encoder: str, n_estimators: int = 300, extra_numerics: list[str] = ()) -> Pipeline:
     model = IsolationForest(
-        n_estimators=300,
-        contamination=0.01,
+        n_estimators=n_estimators,
+        contamination="auto",  # offset_ for CONTAMINATION is placed by fit_pipeline
         random_state=42
     )
+    return Pipeline([("pre", make_preprocessor(encoder, extra_numerics)), ("model", model)])
 
-    pipe = Pipeline([("pre", pre), ("model", model)])
+def fit_pipeline(pipe: Pipeline, X: pd.DataFrame) -> np.ndarray:
+    # Same model as fitting with contamination=CONTAMINATION, with one scoring pass over the training rows
+    # instead of two: their decision_function places offset_ and is returned for the calibration
     pipe.fit(X)
+    return fit_offset(pipe.named_steps["model"], pipe.named_steps["pre"].transform(X), CONTAMINATION)
+
+def main() -> None:
+    cfg = json.loads(Path("config/config.json").read_text())
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--encoder", choices=ENCODERS, default=None,
+                    help="onehot (wide sparse) or compact (frequency rank/share + per-merchant aggregates); "
+                         "default: config encoder, compact with --stream")
+    ap.add_argument("--stream", action="store_true",
+                    help="train the stream_score.py model: velocity features replayed in txn_ts order")
+    args = ap.parse_args()
+    fmt = cfg.get("storage_format", "csv")
+    tx_path = table_path(cfg["transactions_path"], fmt)
+    model_path = Path(cfg["stream_model_path"] if args.stream else cfg["model_path"])
+    ensure_dir(model_path.parent)
+
+    # Only the model's inputs are read (plus txn_ts to replay velocity); scoring passes the same columns
+    model_columns = CATEGORICALS + NUMERICS
+    df = read_table(tx_path, fmt, model_columns + (["txn_ts"] if args.stream else []))
+    X = df[model_columns]
+
+    extra, velocity = [], None
+    if args.stream:
+        velocity = VelocityState(**cfg.get("velocity", {}))
+        X = X.join(replay(df, velocity))
+        extra = VELOCITY_FEATURES
+    encoder = args.encoder or ("compact" if args.stream else cfg.get("encoder", "onehot"))
+    n_estimators = int(cfg.get("stream_n_estimators", 100)) if args.stream else 300
+    pipe = build_pipeline(encoder, n_estimators, extra)
+    # Training score quantiles: scoring maps decision_function through these instead of batch min/max
+    calibration = fit_calibration(fit_pipeline(pipe, X))
 
     artifact = {
         "trained_at": utcnow_iso(),
         "rows": int(len(df)),
-        "contamination": 0.01,
-        "columns": list(X.columns)
+        "contamination": CONTAMINATION,
+        "columns": list(X.columns),
+        "encoder": encoder,
+        "n_estimators": n_estimators,
+        "velocity": velocity.params() if velocity else None,
+        "encoded_features": int(len(pipe.named_steps["pre"].get_feature_names_out())),
+        "calibration_levels": len(calibration["probs"])
     }
-    joblib.dump({"model": pipe, "metadata": artifact}, model_path)
+    joblib.dump({"model": pipe, "calibration": calibration, "metadata": artifact}, model_path)
     print(json.dumps(artifact, indent=2))
 
 if __name__ == "__main__":
@@ -0,0 +1,125 @@
+from __future__ import annotations
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# Per-key velocity state for streaming scoring, as exponentially decayed counters (no per-event history):
+#   <key>_rate_5m       decayed transaction count, time constant rate_tau seconds (includes this event)
+#   <key>_amount_ratio  amount / the key's decayed mean amount before this event (time constant mean_tau)
+# Events are processed a batch at a time: within a batch each key's counters follow x_i = a_i * x_{i-1} + b_i
+# (a = decay since the key's previous event), solved for all keys at once by a log-step scan, so the Python
+# work is per key seen, not per event. Keys are kept in last-seen order, so the overflow beyond max_keys and
+# (after the batch that passes every SWEEP_EVERY events) keys idle for more than idle_seconds are evicted
+# from the front in O(1). Events must arrive in txn_ts order.
+
+KEYS = ("merchant_id", "country")
+FEATURES = [f"{k}_{f}" for k in KEYS for f in ("rate_5m", "amount_ratio")]
+
+class VelocityState:
+    SWEEP_EVERY = 4096  # events between idle-key sweeps
+
+    def __init__(self, rate_tau: float = 300.0, mean_tau: float = 86_400.0,
+                 idle_seconds: float = 7 * 86_400.0, max_keys: int = 1_000_000):
+        self.rate_tau, self.mean_tau = float(rate_tau), float(mean_tau)
+        self.idle_seconds, self.max_keys = float(idle_seconds), int(max_keys)
+        self.state: dict[str, OrderedDict] = {k: OrderedDict() for k in KEYS}
+        self.evicted = 0
+        self._events = 0
+        self._inv_rate, self._inv_mean = 1.0 / self.rate_tau, 1.0 / self.mean_tau
+
+    def params(self) -> dict:
+        return {"rate_tau": self.rate_tau, "mean_tau": self.mean_tau, "idle_seconds": self.idle_seconds,
+                "max_keys": self.max_keys}
+
+    def keys(self) -> int:
+        return sum(len(s) for s in self.state.values())
+
+    def update(self, table: OrderedDict, keys: np.ndarray, ts: np.ndarray,
+               amount: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # st = [last_ts, decayed count, decayed weight, decayed amount]; the mean is amount / weight.
+        # Returns (rate, ratio) per event.
+        codes, uniques = pd.factorize(keys, use_na_sentinel=False)
+        order = np.argsort(codes, kind="stable")  # events grouped by key, in arrival order within a key
+        c, t, a = codes[order], ts[order], amount[order]
+        first = np.ones(c.size, dtype=bool)
+        first[1:] = c[1:] != c[:-1]
+        prev = np.array([table.get(k) or [np.nan, 0.0, 0.0, 0.0] for k in uniques.tolist()], dtype=np.float64)
+        prev = prev.reshape(-1, 4)[c]
+        prev_ts = np.where(first, prev[:, 0], np.roll(t, 1))
+        dt = np.where(prev_ts < t, t - prev_ts, 0.0)  # out of order (or new key): no decay
+        rate_decay, mean_decay = np.exp(-dt * self._inv_rate), np.exp(-dt * self._inv_mean)
+
+        # Counters after each event; a group's first event folds in the stored state (and cuts the scan)
+        rate = _scan(np.where(first, 0.0, rate_decay), np.where(first, prev[:, 1] * rate_decay + 1.0, 1.0))
+        ones = np.ones(c.size)
+        wm = _scan(np.where(first, 0.0, mean_decay),
+                   np.column_stack([np.where(first, prev[:, 2] * mean_decay + 1.0, ones),
+                                    np.where(first, prev[:, 3] * mean_decay + a, a)]))
+        # The ratio uses the mean before the event (weight and amount decay alike, so undecayed is fine)
+        before = np.where(first[:, None], prev[:, 2:], np.roll(wm, 1, axis=0))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(before[:, 1] > 0, a * before[:, 0] / before[:, 1], 1.0)
+
+        # Store each key's last state, keys in order of their last event
+        last = np.flatnonzero(np.append(first[1:], True))
+        for i in last[np.argsort(order[last], kind="stable")].tolist():
+            k = uniques[c[i]]
+            table[k] = [float(t[i]), float(rate[i]), float(wm[i, 0]), float(wm[i, 1])]
+            table.move_to_end(k)
+        while len(table) > self.max_keys:
+            table.popitem(last=False)
+            self.evicted += 1
+        out_rate, out_ratio = np.empty(c.size), np.empty(c.size)
+        out_rate[order], out_ratio[order] = rate, ratio
+        return out_rate, out_ratio
+
+    def sweep(self, now: float) -> None:
+        # Tables are in last-seen order: idle keys are all at the front
+        for table in self.state.values():
+            while table and now - next(iter(table.values()))[0] > self.idle_seconds:
+                table.popitem(last=False)
+                self.evicted += 1
+
+    def features_batch(self, ts: np.ndarray, merchant: np.ndarray, country: np.ndarray,
+                       amount: np.ndarray) -> np.ndarray:
+        # (n, len(FEATURES)) for n events in arrival order
+        ts, amount = np.asarray(ts, dtype=np.float64), np.asarray(amount, dtype=np.float64)
+        out = np.empty((ts.size, len(FEATURES)))
+        if not ts.size:
+            return out
+        for j, (key, values) in enumerate((("merchant_id", merchant), ("country", country))):
+            out[:, 2 * j], out[:, 2 * j + 1] = self.update(self.state[key], np.asarray(values, dtype=object),
+                                                           ts, amount)
+        before, self._events = self._events, self._events + ts.size
+        if before // self.SWEEP_EVERY != self._events // self.SWEEP_EVERY:
+            self.sweep(float(ts[-1]))
+        return out
+
+    def features(self, ts: float, merchant: str, country: str,
+                 amount: float) -> tuple[float, float, float, float]:
+        return tuple(self.features_batch([ts], [merchant], [country], [amount])[0].tolist())
+
+def _scan(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # x_i = a_i * x_{i-1} + b_i (x_{-1} = 0) for all i: log2(n) doubling steps composing the affine maps.
+    # b may have extra columns sharing the same a.
+    a, b = a.copy(), b.copy()
+    s = 1
+    while s < a.size:
+        b[s:] += (a[s:] if b.ndim == 1 else a[s:, None]) * b[:-s]
+        a[s:] *= a[:-s]
+        s *= 2
+    return b
+
+def to_epoch(ts: pd.Series) -> np.ndarray:
+    return pd.to_datetime(ts).to_numpy("datetime64[ns]").astype(np.int64) / 1e9
+
+def replay(df: pd.DataFrame, state: VelocityState | None = None) -> pd.DataFrame:
+    # Offline features from the same state code the stream scorer uses: events replayed in txn_ts order
+    state = state or VelocityState()
+    ts = to_epoch(df["txn_ts"])
+    order = np.argsort(ts, kind="stable")
+    out = np.empty((len(df), len(FEATURES)))
+    out[order] = state.features_batch(ts[order], df["merchant_id"].to_numpy(object)[order],
+                                      df["country"].to_numpy(object)[order],
+                                      df["amount_usd"].to_numpy(np.float64)[order])
+    return pd.DataFrame(out, columns=FEATURES, index=df.index)
@@ -0,0 +1,138 @@
+from __future__ import annotations
+import json, math
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# Mergeable per-hour pipeline metrics. Each hour keeps counts, sums and a log-bucketed quantile sketch of
+# amount_usd (DDSketch-style: any quantile within ALPHA relative error, merge = add bucket counts). Hours are
+# persisted as one JSON snapshot per day, so monitoring a long range only merges stored snapshots.
+
+ALPHA = 0.005
+
+class QuantileSketch:
+    def __init__(self, alpha: float = ALPHA, counts: dict[int, int] | None = None, zeros: int = 0):
+        self.alpha = float(alpha)
+        self.gamma = (1 + self.alpha) / (1 - self.alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.counts: dict[int, int] = dict(counts or {})
+        self.zeros = int(zeros)  # values <= 0
+
+    @property
+    def n(self) -> int:
+        return self.zeros + sum(self.counts.values())
+
+    def update(self, values: np.ndarray) -> "QuantileSketch":
+        x = np.asarray(values, dtype=np.float64)
+        x = x[~np.isnan(x)]
+        pos = x[x > 0]
+        self.zeros += int(x.size - pos.size)
+        keys, n = np.unique(np.ceil(np.log(pos) / self._log_gamma).astype(np.int64), return_counts=True)
+        for k, c in zip(keys.tolist(), n.tolist()):
+            self.counts[k] = self.counts.get(k, 0) + c
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        if other.alpha != self.alpha:
+            raise ValueError(f"cannot merge sketches with alpha {self.alpha} and {other.alpha}")
+        for k, c in other.counts.items():
+            self.counts[k] = self.counts.get(k, 0) + c
+        self.zeros += other.zeros
+        return self
+
+    def quantile(self, q: float) -> float:
+        n = self.n
+        if not n:
+            return float("nan")
+        rank, seen = q * (n - 1), self.zeros
+        if rank < seen:
+            return 0.0
+        for k in sorted(self.counts):
+            seen += self.counts[k]
+            if seen > rank:
+                return 2 * self.gamma ** k / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.counts) / (self.gamma + 1)
+
+    def to_dict(self) -> dict:
+        return {"alpha": self.alpha, "zeros": self.zeros,
+                "counts": {str(k): c for k, c in sorted(self.counts.items())}}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "QuantileSketch":
+        return cls(d["alpha"], {int(k): c for k, c in d["counts"].items()}, d["zeros"])
+
+def empty_window() -> dict:
+    return {"count": 0, "amount_sum": 0.0, "scored": 0, "alerts": 0, "amount": QuantileSketch()}
+
+def merge_window(acc: dict, w: dict) -> dict:
+    for k in ("count", "amount_sum", "scored", "alerts"):
+        acc[k] += w[k]
+    acc["amount"].merge(w["amount"])
+    return acc
+
+def hourly(ts: pd.Series, amount: pd.Series, alert: pd.Series | None = None) -> dict[str, dict]:
+    # {"YYYY-MM-DDTHH": window} for one chunk of rows
+    hours = pd.to_datetime(ts).to_numpy("datetime64[h]")
+    keys, inv = np.unique(hours, return_inverse=True)
+    amt = amount.to_numpy(np.float64)
+    counts = np.bincount(inv, minlength=keys.size)
+    sums = np.bincount(inv, weights=np.nan_to_num(amt), minlength=keys.size)
+    alerts = np.bincount(inv, weights=alert.to_numpy(), minlength=keys.size) if alert is not None else None
+    order = np.argsort(inv, kind="stable")
+    groups = np.split(amt[order], np.cumsum(counts)[:-1])
+    out = {}
+    for i, key in enumerate(np.datetime_as_string(keys, unit="h").tolist()):
+        out[key] = {"count": int(counts[i]), "amount_sum": float(sums[i]),
+                    "scored": int(counts[i]) if alerts is not None else 0,
+                    "alerts": int(alerts[i]) if alerts is not None else 0,
+                    "amount": QuantileSketch().update(groups[i])}
+    return out
+
+def merge_hourly(acc: dict[str, dict], part: dict[str, dict]) -> dict[str, dict]:
+    for key, w in part.items():
+        merge_window(acc.setdefault(key, empty_window()), w)
+    return acc
+
+def summarize(w: dict) -> dict:
+    return {"volume": w["count"],
+            "amount_mean": w["amount_sum"] / w["count"] if w["count"] else None,
+            "amount_p99": w["amount"].quantile(0.99) if w["count"] else None,
+            "alerts": w["alerts"],
+            "alert_rate": w["alerts"] / w["scored"] if w["scored"] else None}
+
+def write_snapshots(out_dir: Path, windows: dict[str, dict], run: str, **meta) -> list[Path]:
+    # A run owns the hours it saw: those are replaced (and tagged with the run id), other hours already in the
+    # day's file are kept, so re-running a day is idempotent and incremental inputs accumulate.
+    out_dir.mkdir(parents=True, exist_ok=True)
+    days: dict[str, dict[str, dict]] = {}
+    for key, w in windows.items():
+        days.setdefault(key[:10], {})[key[11:]] = w
+    written = []
+    for day, hours in sorted(days.items()):
+        path = out_dir / f"date={day}.json"
+        stored = json.loads(path.read_text())["hours"] if path.exists() else {}
+        stored.update({h: {**{k: w[k] for k in ("count", "amount_sum", "scored", "alerts")}, "run": run,
+                           "amount": w["amount"].to_dict()} for h, w in hours.items()})
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps({"date": day, "run": run, **meta, "hours": dict(sorted(stored.items()))}))
+        tmp.replace(path)
+        written.append(path)
+    return written
+
+def read_snapshots(out_dir: Path, start: str | None = None, end: str | None = None,
+                   run: str | None = None) -> dict[str, dict]:
+    # Hours of days in [start, end] (YYYY-MM-DD, inclusive), only those written by `run` if given
+    windows = {}
+    for path in sorted(out_dir.glob("date=*.json")):
+        day = path.stem.split("=", 1)[1]
+        if (start and day < start) or (end and day > end):
+            continue
+        for h, w in json.loads(path.read_text())["hours"].items():
+            if run is None or w.get("run") == run:
+                windows[f"{day}T{h}"] = {**w, "amount": QuantileSketch.from_dict(w["amount"])}
+    return windows
+
+def latest_run(out_dir: Path) -> str | None:
+    # Run ids are UTC ISO timestamps, so the latest is the largest
+    runs = [json.loads(p.read_text()).get("run") for p in out_dir.glob("date=*.json")]
+    return max((r for r in runs if r), default=None)
@@ -0,0 +1,26 @@
+import sys
+from pathlib import Path
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+from calibration import anomaly_score, fit_calibration  # noqa: E402
+
+def test_scores_do_not_depend_on_batch():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(3000, 3))
+    model = IsolationForest(n_estimators=50, random_state=0).fit(X)
+    cal = fit_calibration(model.decision_function(X))
+    new = np.vstack([rng.normal(size=(500, 3)), rng.normal(8, 1, size=(5, 3))])
+    full = anomaly_score(model.decision_function(new), cal)
+    chunks = np.array_split(new, 13)
+    chunked = np.concatenate([anomaly_score(model.decision_function(c), cal) for c in chunks])
+    assert np.array_equal(full, chunked)
+    assert ((0 <= full) & (full <= 1)).all()
+    assert full[-5:].min() > 0.99  # far outliers land in the training tail
+
+def test_score_is_training_tail_share():
+    normality = np.random.default_rng(1).normal(size=100_000)
+    cal = fit_calibration(normality)
+    score = anomaly_score(np.array([-10.0, np.quantile(normality, 0.01), np.median(normality), 10.0]), cal)
+    assert np.allclose(score, [1.0, 0.99, 0.5, 0.0], atol=1e-6)
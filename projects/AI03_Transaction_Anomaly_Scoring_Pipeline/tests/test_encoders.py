@@ -0,0 +1,41 @@
+import sys
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+from encoders import CompactEncoder  # noqa: E402
+
+def frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "merchant_id": ["m1", "m1", "m1", "m2"],
+        "country": ["US", "US", "GB", "US"],
+        "payment_method": ["card"] * 4,
+        "device": ["ios", "web", "ios", "ios"],
+        "amount_usd": [10.0, 20.0, 30.0, 100.0],
+    })
+
+def test_compact_encoder_lookup_tables():
+    enc = CompactEncoder().fit(frame())
+    Z = enc.transform(frame())
+    names = list(enc.get_feature_names_out())
+    assert Z.shape == (4, len(names))
+    col = dict(zip(names, Z.T))
+    assert col["merchant_id_rank"].tolist() == [0, 0, 0, 1]  # most frequent first
+    assert np.allclose(col["country_freq"], [0.75, 0.75, 0.25, 0.75])
+    assert np.allclose(col["merchant_id_amount_mean"], [20, 20, 20, 100])
+    assert np.allclose(col["amount_usd_to_merchant_id_mean"], [0.5, 1.0, 1.5, 1.0])
+
+def test_compact_encoder_unknown_categories():
+    enc = CompactEncoder().fit(frame())
+    new = frame().iloc[:1].assign(merchant_id="m9", country="NG")
+    col = dict(zip(enc.get_feature_names_out(), enc.transform(new)[0]))
+    assert col["merchant_id_rank"] == 2 and col["merchant_id_count"] == 0
+    assert col["country_freq"] == 0
+    assert col["merchant_id_amount_mean"] == 40.0  # global mean
+
+def test_compact_encoder_categorical_input():
+    enc = CompactEncoder().fit(frame())
+    new = frame().assign(merchant_id=["m2", "m9", None, "m1"])
+    as_category = new.astype({c: "category" for c in ["merchant_id", "country", "payment_method", "device"]})
+    assert np.array_equal(enc.transform(as_category), enc.transform(new.fillna("m9")))
@@ -0,0 +1,20 @@
+import sys
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+from generate_transactions import make_shard, txn_ids  # noqa: E402
+
+def test_txn_ids_vectorized():
+    assert txn_ids(99, 3, 6).to_pylist() == ["TXN-000099", "TXN-000100", "TXN-000101"]
+    assert txn_ids(1, 1, 9).to_pylist() == ["TXN-000000001"]
+
+def test_shard_is_deterministic_and_labelled():
+    seed = np.random.SeedSequence(404).spawn(2)[1]
+    a = make_shard(1001, 1000, 2000, seed, 0.02, 2000 * 60)
+    assert a.equals(make_shard(1001, 1000, 2000, seed, 0.02, 2000 * 60))
+    assert a["txn_id"][0].as_py() == "TXN-001001"
+    ts = a["txn_ts"].to_numpy()
+    assert str(ts[0]) == "2025-12-01T16:40:00" and (np.diff(ts) == np.timedelta64(60, "s")).all()
+    anomaly = a["is_anomaly"].to_numpy()
+    assert anomaly.sum() == 20 and a["is_chargeback"].to_numpy()[anomaly == 0].sum() == 0
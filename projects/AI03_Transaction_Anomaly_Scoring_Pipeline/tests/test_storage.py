@@ -0,0 +1,44 @@
+import sys
+from pathlib import Path
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+from storage import iter_chunks, read_table, table_path, write_table  # noqa: E402
+
+def frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "txn_id": [f"TXN-{i}" for i in range(6)],
+        "txn_ts": ["2025-12-01 10:00:00", "2025-12-01 23:59:00", "2025-12-02 00:00:00"] * 2,
+        "merchant_id": ["m1", "m2", "m1", "m3", "m1", "m2"],
+        "country": ["US"] * 6, "payment_method": ["card"] * 6, "device": ["ios", "web"] * 3,
+        "amount_usd": [1.0, 2.5, 3.0, 4.0, 5.0, 6.0],
+    })
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_round_trip_with_projection(tmp_path, fmt):
+    path = table_path(tmp_path / "transactions.csv", fmt)
+    write_table(frame(), path, fmt)
+    df = read_table(path, fmt, ["txn_id", "merchant_id", "amount_usd"])
+    assert list(df.columns) == ["txn_id", "merchant_id", "amount_usd"]
+    assert isinstance(df["merchant_id"].dtype, pd.CategoricalDtype)
+    got = df.sort_values("txn_id").reset_index(drop=True)
+    assert got["merchant_id"].astype(str).tolist() == frame()["merchant_id"].tolist()
+    assert got["amount_usd"].tolist() == frame()["amount_usd"].tolist()
+    assert sum(len(c) for c in iter_chunks(path, fmt, 4, ["txn_ts"])) == 6
+
+def test_parquet_partitioned_by_day(tmp_path):
+    path = table_path(tmp_path / "transactions.csv", "parquet")
+    write_table(frame(), path, "parquet")
+    assert sorted(p.name for p in path.iterdir()) == ["txn_date=2025-12-01", "txn_date=2025-12-02"]
+    assert pd.api.types.is_datetime64_any_dtype(read_table(path, "parquet")["txn_ts"])
+
+def test_csv_part_directory(tmp_path):
+    path = tmp_path / "transactions.csv"
+    path.mkdir()
+    frame().iloc[:4].to_csv(path / "part-00000.csv", index=False)
+    frame().iloc[4:].assign(merchant_id="m9").to_csv(path / "part-00001.csv", index=False)
+    df = read_table(path, "csv", ["txn_id", "merchant_id"])
+    assert len(df) == 6 and isinstance(df["merchant_id"].dtype, pd.CategoricalDtype)
+    assert sorted(df["merchant_id"].cat.categories) == ["m1", "m2", "m3", "m9"]
+    assert [len(c) for c in iter_chunks(path, "csv", 10)] == [4, 2]
@@ -0,0 +1,68 @@
+import sys
+from pathlib import Path
+import numpy as np
+import scipy.sparse as sp
+from sklearn.ensemble import IsolationForest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+from forest import FlatForest, fit_offset  # noqa: E402
+from stream_score import read_batches  # noqa: E402
+from velocity import VelocityState  # noqa: E402
+
+def test_flat_forest_matches_sklearn():
+    X = np.random.default_rng(0).normal(size=(2000, 6))
+    model = IsolationForest(n_estimators=20, max_features=0.5, random_state=0).fit(X)
+    assert np.allclose(FlatForest(model).decision_function(X), model.decision_function(X), atol=1e-12)
+
+def test_fit_offset_matches_sklearn_contamination():
+    X = np.random.default_rng(1).normal(size=(3000, 4))
+    X[:, 0] = X[:, 0] > 1  # binary column: ties for the row ordering
+    for data in (X, sp.csr_matrix(X)):
+        ref = IsolationForest(n_estimators=30, contamination=0.01, random_state=0).fit(data)
+        model = IsolationForest(n_estimators=30, contamination="auto", random_state=0).fit(data)
+        train = fit_offset(model, data, 0.01)
+        assert np.isclose(model.offset_, ref.offset_, rtol=0, atol=1e-12)
+        assert np.allclose(train, ref.decision_function(data), atol=1e-12)
+        assert np.allclose(FlatForest(model).decision_function(data), train, atol=1e-12)
+
+def test_velocity_decay_and_ratio():
+    state = VelocityState(rate_tau=300, mean_tau=86_400)
+    assert state.features(0.0, "m1", "US", 10.0) == (1.0, 1.0, 1.0, 1.0)
+    rate, ratio, *_ = state.features(300.0, "m1", "US", 30.0)
+    assert np.isclose(rate, 1 + np.exp(-1))
+    assert np.isclose(ratio, 3.0)
+
+def test_velocity_eviction():
+    state = VelocityState(idle_seconds=100, max_keys=2)
+    for i, m in enumerate(["a", "b", "c"]):
+        state.features(float(i), m, "US", 1.0)
+    assert list(state.state["merchant_id"]) == ["b", "c"] and state.evicted == 1
+    state.sweep(101.5)  # b idle 100.5 s, c 99.5 s
+    assert list(state.state["merchant_id"]) == ["c"]
+
+def test_velocity_batch_matches_event_by_event():
+    rng = np.random.default_rng(2)
+    n = 3000
+    ts = np.cumsum(rng.exponential(30.0, size=n))
+    ts[rng.choice(n, size=50, replace=False)] -= 500.0  # some out-of-order events
+    merchants = rng.choice([f"m{i}" for i in range(40)], size=n).astype(object)
+    countries = rng.choice(["US", "GB", "NG"], size=n).astype(object)
+    amounts = rng.lognormal(3.4, 0.55, size=n)
+    one = VelocityState(rate_tau=300, mean_tau=3600)
+    expected = np.array([one.features(*e) for e in zip(ts.tolist(), merchants, countries, amounts.tolist())])
+    batched = VelocityState(rate_tau=300, mean_tau=3600)
+    got = np.vstack([batched.features_batch(ts[i:i + 512], merchants[i:i + 512], countries[i:i + 512],
+                                            amounts[i:i + 512]) for i in range(0, n, 512)])
+    assert np.allclose(got, expected, rtol=1e-9)
+    assert list(batched.state["merchant_id"]) == list(one.state["merchant_id"])  # same last-seen order
+
+def test_read_batches_holds_back_partial_line(tmp_path):
+    path = tmp_path / "tx.csv"
+    path.write_text('a,b\n1,"x,y"\n2,z')
+    with path.open() as src:
+        batches = read_batches(src, follow=True, poll=0.0, size=10)
+        assert next(batches) == ["a,b\n", '1,"x,y"\n']
+        assert next(batches) == []  # "2,z" is incomplete
+        with path.open("a") as f:
+            f.write("z\n")
+        assert next(batches) == ["2,zz\n"]
@@ -0,0 +1,35 @@
+import sys
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+from window_metrics import ALPHA, QuantileSketch, hourly, merge_hourly  # noqa: E402
+from window_metrics import latest_run, read_snapshots, write_snapshots  # noqa: E402
+
+def test_sketch_quantile_relative_error_and_merge():
+    x = np.random.default_rng(0).lognormal(3.4, 0.55, size=50_000)
+    whole = QuantileSketch().update(x)
+    halves = QuantileSketch().update(x[:20_000]).merge(QuantileSketch().update(x[20_000:]))
+    assert halves.counts == whole.counts
+    for q in (0.5, 0.9, 0.99):
+        assert abs(whole.quantile(q) / np.quantile(x, q) - 1) <= 2 * ALPHA
+    assert QuantileSketch.from_dict(whole.to_dict()).counts == whole.counts
+
+def test_hourly_windows_and_snapshots(tmp_path):
+    df = pd.DataFrame({"txn_ts": ["2025-12-01 00:10:00", "2025-12-01 00:50:00", "2025-12-01 01:00:00",
+                                  "2025-12-02 23:59:00"],
+                       "amount_usd": [10.0, 30.0, 5.0, 0.0], "alert": [0, 1, 0, 1]})
+    windows = merge_hourly(hourly(df["txn_ts"][:2], df["amount_usd"][:2], df["alert"][:2]),
+                           hourly(df["txn_ts"][2:], df["amount_usd"][2:], df["alert"][2:]))
+    assert sorted(windows) == ["2025-12-01T00", "2025-12-01T01", "2025-12-02T23"]
+    assert windows["2025-12-01T00"]["count"] == 2 and windows["2025-12-01T00"]["alerts"] == 1
+    write_snapshots(tmp_path, windows, "2025-12-03T00:00:00+00:00")
+    # re-run of one hour: replaced
+    write_snapshots(tmp_path, {"2025-12-01T01": windows["2025-12-01T01"]}, "2025-12-04T00:00:00+00:00")
+    stored = read_snapshots(tmp_path, start="2025-12-01", end="2025-12-01")
+    assert sorted(stored) == ["2025-12-01T00", "2025-12-01T01"]
+    assert stored["2025-12-01T01"]["count"] == 1 and stored["2025-12-01T00"]["amount_sum"] == 40.0
+    # hours left by the earlier run are excluded when reading only the latest run
+    assert latest_run(tmp_path) == "2025-12-04T00:00:00+00:00"
+    assert sorted(read_snapshots(tmp_path, run=latest_run(tmp_path))) == ["2025-12-01T01"]
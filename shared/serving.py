@@ -0,0 +1,110 @@
+from __future__ import annotations
+import asyncio, json, time
+from collections import deque
+from typing import Any, Awaitable, Callable
+import numpy as np
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
+
+class MicroBatcher:
+    # Coalesces concurrent submit() calls: a batch closes after max_batch items or linger_ms after its
+    # first item, whichever comes first. handler(items) runs in a worker thread, one result per item.
+    def __init__(self, handler: Callable[[list], list], max_batch: int = 64, linger_ms: float = 2.0,
+                 window: int = 10_000):
+        self.handler = handler
+        self.max_batch = max(1, int(max_batch))
+        self.linger = max(0.0, float(linger_ms)) / 1000.0
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.latencies_ms: deque = deque(maxlen=window)
+        self.batch_sizes: deque = deque(maxlen=window)
+        self.done_at: deque = deque(maxlen=window)
+        self.requests = 0
+
+    async def submit(self, item: Any) -> Any:
+        fut = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, fut, time.perf_counter()))
+        return await fut
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.linger
+            while len(batch) < self.max_batch:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                results = await loop.run_in_executor(None, self.handler, [item for item, _, _ in batch])
+            except Exception as exc:
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(exc)
+                continue
+            now = time.perf_counter()
+            self.batch_sizes.append(len(batch))
+            for (_, fut, t0), res in zip(batch, results):
+                self.requests += 1
+                self.latencies_ms.append((now - t0) * 1000)
+                self.done_at.append(now)
+                if not fut.done():
+                    fut.set_result(res)
+
+    def metrics(self) -> dict:
+        lat = np.asarray(self.latencies_ms, dtype=float)
+        sizes = np.asarray(self.batch_sizes, dtype=float)
+        # Throughput over the recent window (first submit -> last completion), not wall time since start
+        elapsed = (self.done_at[-1] - self.done_at[0] + self.latencies_ms[0] / 1000) if self.done_at else 0.0
+        return {
+            "requests": self.requests,
+            "batches": int(sizes.size),
+            "max_batch": self.max_batch,
+            "linger_ms": self.linger * 1000,
+            "avg_batch_size": round(float(sizes.mean()), 3) if sizes.size else 0.0,
+            "throughput_rps": round(len(self.done_at) / elapsed, 2) if elapsed > 0 else 0.0,
+            "latency_ms_p50": round(float(np.percentile(lat, 50)), 3) if lat.size else None,
+            "latency_ms_p99": round(float(np.percentile(lat, 99)), 3) if lat.size else None,
+        }
+
+Route = Callable[[dict], Awaitable[dict]]
+
+async def serve_json(routes: dict[tuple[str, str], Route], host: str = "127.0.0.1", port: int = 8765,
+                     unix_path: str | None = None) -> asyncio.AbstractServer:
+    # Minimal HTTP/1.1 JSON endpoint (one request per connection), TCP or Unix socket
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            method, path, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0))
+            body = await reader.readexactly(length) if length else b""
+            route = routes.get((method.upper(), path.split("?", 1)[0]))
+            if route is None:
+                status, payload = 404, {"error": f"no route for {method} {path}"}
+            else:
+                try:
+                    status, payload = 200, await route(json.loads(body) if body else {})
+                except (ValueError, KeyError, TypeError) as exc:
+                    status, payload = 400, {"error": str(exc)}
+        except Exception as exc:
+            status, payload = 500, {"error": repr(exc)}
+        data = json.dumps(payload).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode("latin-1") + data)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    if unix_path:
+        return await asyncio.start_unix_server(handle, path=unix_path)
+    return await asyncio.start_server(handle, host, port)